@@ -1,10 +1,40 @@
 import streamlit as st
+from streamlit import runtime
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, date
+import argparse
+import csv
+import functools
+import hashlib
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet es opcional
+    pa = None
+    pq = None
+
+try:
+    import duckdb
+except ImportError:  # El motor analítico embebido es opcional
+    duckdb = None
+
+logger = logging.getLogger(__name__)
 
 # Configuración de la página
 st.set_page_config(
@@ -13,22 +43,74 @@ st.set_page_config(
     layout="wide"
 )
 
+# ==================== CONEXIÓN A LA BASE DE DATOS ====================
+# Se puede sobrescribir con variables de entorno (p. ej. para apuntar las pruebas a otra base)
+DB_CONFIG = {
+    "host": os.environ.get("KPI_DB_HOST", "localhost"),
+    "port": os.environ.get("KPI_DB_PORT", "5432"),
+    "database": os.environ.get("KPI_DB_NAME", "kpi"),
+    "user": os.environ.get("KPI_DB_USER", "postgres"),
+    "password": os.environ.get("KPI_DB_PASSWORD", "postgres")
+}
+
+# Conexiones que el pool mantiene abiertas en reposo y máximo de conexiones simultáneas
+POOL_MIN_CONEXIONES = 5
+POOL_MAX_CONEXIONES = 60
+# Segundos que una sesión espera por una conexión libre antes de fallar
+POOL_TIMEOUT_SEGUNDOS = 30
+
+@st.cache_resource
+def get_pool():
+    return ThreadedConnectionPool(POOL_MIN_CONEXIONES, POOL_MAX_CONEXIONES, **DB_CONFIG)
+
 @st.cache_resource
+def get_semaforo_pool():
+    # ThreadedConnectionPool falla en lugar de esperar cuando se agota; el semáforo encola
+    return threading.BoundedSemaphore(POOL_MAX_CONEXIONES)
+
+def _obtener_conexion_sana(pool):
+    # Descarta conexiones muertas (p.ej. tras reiniciar el servidor) y reintenta con una nueva
+    for _ in range(POOL_MAX_CONEXIONES + 1):
+        conn = pool.getconn()
+        try:
+            if conn.closed:
+                raise psycopg2.InterfaceError("conexión cerrada")
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            return conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            pool.putconn(conn, close=True)
+    raise psycopg2.OperationalError("No se pudo obtener una conexión válida a la base de datos")
+
+@contextmanager
+def conexion_del_pool(pool, semaforo):
+    # Toma una conexión del pool para una operación y la devuelve al terminar:
+    # commit si todo salió bien, rollback si hubo error (nunca queda una transacción abortada)
+    if not semaforo.acquire(timeout=POOL_TIMEOUT_SEGUNDOS):
+        raise PoolError("Tiempo de espera agotado esperando una conexión libre")
+    try:
+        conn = _obtener_conexion_sana(pool)
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        semaforo.release()
+
 def get_connection():
-    return psycopg2.connect(
-        host="localhost",
-        database="kpi",
-        user="postgres",
-        password="postgres"
-    )
+    return conexion_del_pool(get_pool(), get_semaforo_pool())
 
-# Inicializar la base de datos
-def init_db():
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    # Tabla de equipos
-    cur.execute("""
+# ==================== MIGRACIONES DE ESQUEMA ====================
+# Cada migración es (versión, descripción, sentencias) y se aplica una sola vez, en orden.
+# Para cambiar el esquema se agrega una migración nueva al final; nunca se edita una ya publicada.
+MIGRACIONES = [
+    (1, "Esquema inicial: equipos, integrantes, kpis y evaluaciones", [
+        """
         CREATE TABLE IF NOT EXISTS equipos (
             id SERIAL PRIMARY KEY,
             nombre VARCHAR(100) NOT NULL,
@@ -36,10 +118,8 @@ def init_db():
             activo BOOLEAN DEFAULT TRUE,
             fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    """)
-    
-    # Tabla de integrantes
-    cur.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS integrantes (
             id SERIAL PRIMARY KEY,
             nombre VARCHAR(100) NOT NULL,
@@ -49,10 +129,8 @@ def init_db():
             activo BOOLEAN DEFAULT TRUE,
             fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    """)
-    
-    # Tabla de KPIs con tipo
-    cur.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS kpis (
             id SERIAL PRIMARY KEY,
             nombre VARCHAR(200) NOT NULL,
@@ -61,10 +139,8 @@ def init_db():
             activo BOOLEAN DEFAULT TRUE,
             fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    """)
-    
-    # Tabla de evaluaciones
-    cur.execute("""
+        """,
+        """
         CREATE TABLE IF NOT EXISTS evaluaciones (
             id SERIAL PRIMARY KEY,
             integrante_id INTEGER REFERENCES integrantes(id),
@@ -76,192 +152,2544 @@ def init_db():
             evaluador VARCHAR(100),
             fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    """)
+        """,
+    ]),
+    (2, "Índices para la consulta de reportes de evaluaciones", [
+        "CREATE INDEX IF NOT EXISTS idx_evaluaciones_fecha ON evaluaciones (fecha_evaluacion)",
+        "CREATE INDEX IF NOT EXISTS idx_evaluaciones_integrante_fecha ON evaluaciones (integrante_id, fecha_evaluacion)",
+        "CREATE INDEX IF NOT EXISTS idx_evaluaciones_kpi_fecha ON evaluaciones (kpi_id, fecha_evaluacion)",
+        "CREATE INDEX IF NOT EXISTS idx_integrantes_equipo ON integrantes (equipo_id)",
+    ]),
+    (3, "Índices para paginación por clave de evaluaciones e integrantes", [
+        "CREATE INDEX IF NOT EXISTS idx_evaluaciones_fecha_id ON evaluaciones (fecha_evaluacion, id)",
+        "DROP INDEX IF EXISTS idx_evaluaciones_fecha",
+        "CREATE INDEX IF NOT EXISTS idx_integrantes_nombre_id ON integrantes (nombre, id)",
+    ]),
+    (4, "Tablas de resumen diario y mensual de evaluaciones", [
+        """
+        CREATE TABLE IF NOT EXISTS evaluaciones_diarias (
+            fecha_evaluacion DATE NOT NULL,
+            integrante_id INTEGER NOT NULL REFERENCES integrantes(id),
+            kpi_id INTEGER NOT NULL REFERENCES kpis(id),
+            calificacion SMALLINT NOT NULL,
+            cantidad INTEGER NOT NULL,
+            suma_valor DECIMAL(16,2) NOT NULL DEFAULT 0,
+            cantidad_valor INTEGER NOT NULL DEFAULT 0,
+            valor_bajo_75 INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (fecha_evaluacion, integrante_id, kpi_id, calificacion)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS evaluaciones_mensuales (
+            mes DATE NOT NULL,
+            integrante_id INTEGER NOT NULL REFERENCES integrantes(id),
+            kpi_id INTEGER NOT NULL REFERENCES kpis(id),
+            calificacion SMALLINT NOT NULL,
+            cantidad INTEGER NOT NULL,
+            suma_valor DECIMAL(16,2) NOT NULL DEFAULT 0,
+            cantidad_valor INTEGER NOT NULL DEFAULT 0,
+            valor_bajo_75 INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (mes, integrante_id, kpi_id, calificacion)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_evaluaciones_diarias_integrante ON evaluaciones_diarias (integrante_id, fecha_evaluacion)",
+        "CREATE INDEX IF NOT EXISTS idx_evaluaciones_mensuales_integrante ON evaluaciones_mensuales (integrante_id, mes)",
+        """
+        INSERT INTO evaluaciones_diarias
+        SELECT fecha_evaluacion, integrante_id, kpi_id, calificacion,
+               COUNT(*), COALESCE(SUM(valor_cuantitativo), 0), COUNT(valor_cuantitativo),
+               COUNT(*) FILTER (WHERE valor_cuantitativo < 75)
+        FROM evaluaciones
+        WHERE integrante_id IS NOT NULL AND kpi_id IS NOT NULL AND calificacion IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+        """,
+        """
+        INSERT INTO evaluaciones_mensuales
+        SELECT date_trunc('month', fecha_evaluacion)::date, integrante_id, kpi_id, calificacion,
+               SUM(cantidad), SUM(suma_valor), SUM(cantidad_valor), SUM(valor_bajo_75)
+        FROM evaluaciones_diarias
+        GROUP BY 1, 2, 3, 4
+        """,
+    ]),
+    (5, "Registro de snapshots Parquet de meses cerrados", [
+        """
+        CREATE TABLE IF NOT EXISTS snapshots_evaluaciones (
+            mes DATE PRIMARY KEY,
+            filas INTEGER NOT NULL,
+            generado TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (6, "Reglas de riesgo configurables y alertas precalculadas", [
+        """
+        CREATE TABLE IF NOT EXISTS reglas_riesgo (
+            id SERIAL PRIMARY KEY,
+            descripcion VARCHAR(200) NOT NULL,
+            nivel VARCHAR(20) NOT NULL CHECK (nivel IN ('evaluacion', 'integrante', 'equipo', 'kpi')),
+            metrica VARCHAR(30) NOT NULL CHECK (metrica IN ('calificacion', 'valor_cuantitativo', 'puntuacion_invertida', 'valor_promedio')),
+            comparacion VARCHAR(2) NOT NULL CHECK (comparacion IN ('<', '<=', '>', '>=')),
+            umbral DECIMAL(10,2) NOT NULL,
+            ventana_dias INTEGER NOT NULL DEFAULT 90 CHECK (ventana_dias > 0),
+            activa BOOLEAN DEFAULT TRUE,
+            ultimo_evaluacion_id INTEGER NOT NULL DEFAULT 0,
+            CHECK ((nivel = 'evaluacion') = (metrica IN ('calificacion', 'valor_cuantitativo')))
+        )
+        """,
+        """
+        INSERT INTO reglas_riesgo (descripcion, nivel, metrica, comparacion, umbral) VALUES
+            ('Equipo con puntuación baja', 'equipo', 'puntuacion_invertida', '<', 2.5),
+            ('Integrante con puntuación baja', 'integrante', 'puntuacion_invertida', '<', 2.0),
+            ('KPI con puntuación baja', 'kpi', 'puntuacion_invertida', '<', 2.5),
+            ('Evaluación con calificación baja', 'evaluacion', 'calificacion', '>=', 3),
+            ('Objetivo no cumplido', 'evaluacion', 'valor_cuantitativo', '<', 75)
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS alertas (
+            id SERIAL PRIMARY KEY,
+            regla_id INTEGER NOT NULL REFERENCES reglas_riesgo(id),
+            entidad_id INTEGER NOT NULL,
+            evaluacion_id INTEGER REFERENCES evaluaciones(id) ON DELETE CASCADE,
+            valor DECIMAL(10,2),
+            fecha_evaluacion DATE,
+            detectada TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_alertas_regla_entidad ON alertas (regla_id, entidad_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_alertas_regla_evaluacion ON alertas (regla_id, evaluacion_id) WHERE evaluacion_id IS NOT NULL",
+    ]),
+    (7, "Alertas agregadas únicas por entidad y fecha de la última evaluación de cada regla", [
+        "ALTER TABLE reglas_riesgo ADD COLUMN IF NOT EXISTS evaluada_el DATE",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_alertas_regla_entidad_agregada ON alertas (regla_id, entidad_id) WHERE evaluacion_id IS NULL",
+    ]),
+]
+
+# Clave del advisory lock que serializa las migraciones entre procesos de la app
+MIGRACIONES_LOCK_ID = 724001
+
+def aplicar_migraciones():
+    # Todas las migraciones pendientes se aplican en una única transacción:
+    # si alguna falla no queda el esquema a medio migrar
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRACIONES_LOCK_ID,))
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                descripcion TEXT,
+                fecha_aplicacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        version_actual = cur.fetchone()[0]
+        
+        aplicadas = []
+        for version, descripcion, sentencias in sorted(MIGRACIONES, key=lambda m: m[0]):
+            if version <= version_actual:
+                continue
+            for sentencia in sentencias:
+                cur.execute(sentencia)
+            cur.execute(
+                "INSERT INTO schema_version (version, descripcion) VALUES (%s, %s)",
+                (version, descripcion)
+            )
+            aplicadas.append(version)
+        
+        cur.close()
+        return aplicadas
+
+# Inicializar la base de datos (una sola vez por proceso, no en cada rerun)
+@st.cache_resource
+def init_db():
+    return aplicar_migraciones()
+
+# ==================== CACHÉ DE CONSULTAS ====================
+# Resultados de las funciones obtener_* compartidos entre sesiones. Cada entrada recuerda qué
+# tablas leyó; las funciones que escriben invalidan esas tablas al confirmar la transacción.
+# El TTL acota la desactualización frente a escrituras hechas por otros procesos.
+CACHE_TTL_SEGUNDOS = 300
+CACHE_MAX_ENTRADAS = 256
+
+class CacheConsultas:
+    def __init__(self, ttl, max_entradas):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()  # clave -> (expira, tablas, valor)
+        self._versiones = {}  # tabla -> contador de escrituras
+        self._lock = threading.Lock()
     
-    conn.commit()
-    cur.close()
+    def version(self, tablas):
+        with self._lock:
+            return tuple(self._versiones.get(t, 0) for t in tablas)
+    
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return False, None
+            expira, _, valor = entrada
+            if expira < time.monotonic():
+                del self._entradas[clave]
+                return False, None
+            self._entradas.move_to_end(clave)
+            return True, valor
+    
+    def guardar(self, clave, tablas, valor, version):
+        with self._lock:
+            # Si hubo una escritura mientras se leía, el resultado puede estar viejo: no se guarda
+            if tuple(self._versiones.get(t, 0) for t in tablas) != version:
+                return
+            self._entradas[clave] = (time.monotonic() + self.ttl, tablas, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+    
+    def invalidar(self, tablas):
+        with self._lock:
+            for tabla in tablas:
+                self._versiones[tabla] = self._versiones.get(tabla, 0) + 1
+            obsoletas = [c for c, (_, t, _) in self._entradas.items() if set(t) & set(tablas)]
+            for clave in obsoletas:
+                del self._entradas[clave]
+
+@st.cache_resource
+def get_cache_consultas():
+    return CacheConsultas(CACHE_TTL_SEGUNDOS, CACHE_MAX_ENTRADAS)
+
+def _clave_hashable(valor):
+    if isinstance(valor, (list, tuple, set)):
+        return tuple(_clave_hashable(v) for v in valor)
+    return valor
+
+def cache_consulta(*tablas):
+    # Los resultados cacheados se comparten: quien los use no debe modificarlos
+    def decorador(func):
+        @functools.wraps(func)
+        def envoltura(*args, **kwargs):
+            cache = get_cache_consultas()
+            clave = (func.__name__, _clave_hashable(args), _clave_hashable(sorted(kwargs.items())))
+            encontrado, valor = cache.obtener(clave)
+            if encontrado:
+                return valor
+            version = cache.version(tablas)
+            valor = func(*args, **kwargs)
+            cache.guardar(clave, tablas, valor, version)
+            return valor
+        return envoltura
+    return decorador
+
+def invalidar_cache(*tablas):
+    get_cache_consultas().invalidar(tablas)
 
 # ==================== FUNCIONES CRUD EQUIPOS ====================
 def agregar_equipo(nombre, descripcion):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO equipos (nombre, descripcion) VALUES (%s, %s)",
-        (nombre, descripcion)
-    )
-    conn.commit()
-    cur.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO equipos (nombre, descripcion) VALUES (%s, %s)",
+            (nombre, descripcion)
+        )
+        cur.close()
+    invalidar_cache('equipos')
 
+@cache_consulta('equipos')
 def obtener_equipos(solo_activos=True):
-    conn = get_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    if solo_activos:
-        cur.execute("SELECT * FROM equipos WHERE activo = TRUE ORDER BY nombre")
-    else:
-        cur.execute("SELECT * FROM equipos ORDER BY nombre")
-    result = cur.fetchall()
-    cur.close()
-    return result
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        if solo_activos:
+            cur.execute("SELECT * FROM equipos WHERE activo = TRUE ORDER BY nombre")
+        else:
+            cur.execute("SELECT * FROM equipos ORDER BY nombre")
+        result = cur.fetchall()
+        cur.close()
+        return result
+
+# Equipos con su cantidad de integrantes activos y nombres de líderes, en una sola consulta
+@cache_consulta('equipos', 'integrantes')
+def obtener_resumen_equipos(solo_activos=True):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        query = """
+            SELECT e.*,
+                   COUNT(i.id) as total_integrantes,
+                   COALESCE(ARRAY_AGG(i.nombre ORDER BY i.nombre) FILTER (WHERE i.es_lider), '{}') as lideres
+            FROM equipos e
+            LEFT JOIN integrantes i ON i.equipo_id = e.id AND i.activo = TRUE
+        """
+        if solo_activos:
+            query += " WHERE e.activo = TRUE"
+        query += " GROUP BY e.id ORDER BY e.nombre"
+        
+        cur.execute(query)
+        result = cur.fetchall()
+        cur.close()
+        return result
 
 def desactivar_equipo(equipo_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE equipos SET activo = FALSE WHERE id = %s", (equipo_id,))
-    conn.commit()
-    cur.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE equipos SET activo = FALSE WHERE id = %s", (equipo_id,))
+        cur.close()
+    invalidar_cache('equipos')
 
 # ==================== FUNCIONES CRUD INTEGRANTES ====================
 def agregar_integrante(nombre, rol, equipo_id, es_lider):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO integrantes (nombre, rol, equipo_id, es_lider) VALUES (%s, %s, %s, %s)",
-        (nombre, rol, equipo_id, es_lider)
-    )
-    conn.commit()
-    cur.close()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO integrantes (nombre, rol, equipo_id, es_lider) VALUES (%s, %s, %s, %s)",
+            (nombre, rol, equipo_id, es_lider)
+        )
+        cur.close()
+    invalidar_cache('integrantes')
 
+@cache_consulta('integrantes', 'equipos')
 def obtener_integrantes(solo_activos=True, equipo_id=None):
-    conn = get_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        query = """
+            SELECT i.*, e.nombre as equipo_nombre 
+            FROM integrantes i
+            LEFT JOIN equipos e ON i.equipo_id = e.id
+            WHERE 1=1
+        """
+        params = []
+        
+        if solo_activos:
+            query += " AND i.activo = TRUE"
+        if equipo_id:
+            query += " AND i.equipo_id = %s"
+            params.append(equipo_id)
+        
+        query += " ORDER BY i.nombre"
+        
+        cur.execute(query, params)
+        result = cur.fetchall()
+        cur.close()
+        return result
+
+@cache_consulta('integrantes', 'equipos')
+def obtener_integrantes_pagina(solo_activos=True, equipo_id=None, despues_de=None, tamano=50):
+    # Igual que obtener_evaluaciones_pagina, en orden (nombre, id)
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        query = """
+            SELECT i.*, e.nombre as equipo_nombre 
+            FROM integrantes i
+            LEFT JOIN equipos e ON i.equipo_id = e.id
+            WHERE 1=1
+        """
+        params = []
+        
+        if solo_activos:
+            query += " AND i.activo = TRUE"
+        if equipo_id:
+            query += " AND i.equipo_id = %s"
+            params.append(equipo_id)
+        if despues_de:
+            query += " AND (i.nombre, i.id) > (%s, %s)"
+            params.extend(despues_de)
+        
+        query += " ORDER BY i.nombre, i.id LIMIT %s"
+        params.append(tamano + 1)
+        
+        cur.execute(query, params)
+        filas = cur.fetchall()
+        cur.close()
     
-    query = """
-        SELECT i.*, e.nombre as equipo_nombre 
-        FROM integrantes i
-        LEFT JOIN equipos e ON i.equipo_id = e.id
-        WHERE 1=1
+    if len(filas) > tamano:
+        filas = filas[:tamano]
+        return filas, (filas[-1]['nombre'], filas[-1]['id'])
+    return filas, None
+
+# Integrantes activos cuyo nombre contiene el texto (para selectores independientes de la paginación)
+BUSQUEDA_MAX_RESULTADOS = 50
+
+@cache_consulta('integrantes', 'equipos')
+def buscar_integrantes(texto="", equipo_id=None, limite=BUSQUEDA_MAX_RESULTADOS):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        query = """
+            SELECT i.id, i.nombre, e.nombre as equipo_nombre
+            FROM integrantes i
+            LEFT JOIN equipos e ON i.equipo_id = e.id
+            WHERE i.activo = TRUE AND i.nombre ILIKE %s
+        """
+        params = [f"%{texto.strip()}%"]
+        if equipo_id:
+            query += " AND i.equipo_id = %s"
+            params.append(equipo_id)
+        query += " ORDER BY i.nombre, i.id LIMIT %s"
+        params.append(limite)
+        
+        cur.execute(query, params)
+        result = cur.fetchall()
+        cur.close()
+        return result
+
+def desactivar_integrante(integrante_id):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE integrantes SET activo = FALSE WHERE id = %s", (integrante_id,))
+        cur.close()
+    invalidar_cache('integrantes')
+
+# ==================== FUNCIONES CRUD KPIS ====================
+def agregar_kpi(nombre, descripcion, tipo):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO kpis (nombre, descripcion, tipo) VALUES (%s, %s, %s)",
+            (nombre, descripcion, tipo)
+        )
+        cur.close()
+    invalidar_cache('kpis')
+
+@cache_consulta('kpis')
+def obtener_kpis(solo_activos=True, tipo=None):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        query = "SELECT * FROM kpis WHERE 1=1"
+        params = []
+        
+        if solo_activos:
+            query += " AND activo = TRUE"
+        if tipo:
+            query += " AND tipo = %s"
+            params.append(tipo)
+        
+        query += " ORDER BY tipo, nombre"
+        
+        cur.execute(query, params)
+        result = cur.fetchall()
+        cur.close()
+        return result
+
+def desactivar_kpi(kpi_id):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE kpis SET activo = FALSE WHERE id = %s", (kpi_id,))
+        cur.close()
+    invalidar_cache('kpis')
+
+# ==================== FUNCIONES EVALUACIONES ====================
+def agregar_evaluacion(integrante_id, kpi_id, calificacion, fecha, evaluador, comentario="", valor_cuantitativo=None):
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """INSERT INTO evaluaciones 
+               (integrante_id, kpi_id, calificacion, fecha_evaluacion, evaluador, comentario, valor_cuantitativo) 
+               VALUES (%s, %s, %s, %s, %s, %s, %s)
+               RETURNING id""",
+            (integrante_id, kpi_id, calificacion, fecha, evaluador, comentario, valor_cuantitativo)
+        )
+        acumular_en_resumenes(cur, [cur.fetchone()[0]])
+        cur.close()
+    invalidar_cache('evaluaciones')
+
+# Guarda todos los KPIs de una evaluación en una sola transacción (todo o nada)
+def agregar_evaluaciones(integrante_id, fecha, evaluador, evaluaciones):
+    filas = [
+        (integrante_id, kpi_id, datos['calificacion'], fecha, evaluador, datos['comentario'], datos['valor_cuantitativo'])
+        for kpi_id, datos in evaluaciones.items()
+    ]
+    if not filas:
+        return
+    
+    with get_connection() as conn:
+        cur = conn.cursor()
+        ids = execute_values(
+            cur,
+            """INSERT INTO evaluaciones 
+               (integrante_id, kpi_id, calificacion, fecha_evaluacion, evaluador, comentario, valor_cuantitativo) 
+               VALUES %s
+               RETURNING id""",
+            filas,
+            page_size=1000,
+            fetch=True
+        )
+        acumular_en_resumenes(cur, [r[0] for r in ids])
+        cur.close()
+    invalidar_cache('evaluaciones')
+
+# ==================== TABLAS DE RESUMEN ====================
+# evaluaciones_diarias y evaluaciones_mensuales guardan, por período × integrante × KPI × calificación,
+# la cantidad de evaluaciones y las sumas de valor_cuantitativo. La puntuación invertida se deriva
+# como cantidad * (5 - calificacion). Se actualizan en la misma transacción que cada inserción y
+# se pueden recalcular completas con refrescar_resumenes().
+TABLAS_RESUMEN = [
+    # (tabla, columna de período, expresión sobre evaluaciones)
+    ('evaluaciones_diarias', 'fecha_evaluacion', 'fecha_evaluacion'),
+    ('evaluaciones_mensuales', 'mes', "date_trunc('month', fecha_evaluacion)::date"),
+]
+
+# Clave del advisory lock que serializa los recálculos completos
+RESUMENES_LOCK_ID = 724002
+
+def _select_resumen(expresion_periodo, condiciones=""):
+    return f"""
+        SELECT {expresion_periodo}, integrante_id, kpi_id, calificacion,
+               COUNT(*), COALESCE(SUM(valor_cuantitativo), 0), COUNT(valor_cuantitativo),
+               COUNT(*) FILTER (WHERE valor_cuantitativo < 75)
+        FROM evaluaciones
+        WHERE integrante_id IS NOT NULL AND kpi_id IS NOT NULL AND calificacion IS NOT NULL {condiciones}
+        GROUP BY 1, 2, 3, 4
     """
+
+def acumular_en_resumenes(cur, evaluacion_ids):
+    # Suma las evaluaciones recién insertadas a los resúmenes (dentro de la transacción del llamador)
+    if not evaluacion_ids:
+        return
+    for tabla, periodo, expresion in TABLAS_RESUMEN:
+        cur.execute(f"""
+            INSERT INTO {tabla} AS r
+                ({periodo}, integrante_id, kpi_id, calificacion, cantidad, suma_valor, cantidad_valor, valor_bajo_75)
+            {_select_resumen(expresion, "AND id = ANY(%s)")}
+            ON CONFLICT ({periodo}, integrante_id, kpi_id, calificacion) DO UPDATE SET
+                cantidad = r.cantidad + EXCLUDED.cantidad,
+                suma_valor = r.suma_valor + EXCLUDED.suma_valor,
+                cantidad_valor = r.cantidad_valor + EXCLUDED.cantidad_valor,
+                valor_bajo_75 = r.valor_bajo_75 + EXCLUDED.valor_bajo_75
+        """, (list(evaluacion_ids),))
+    
+    # Los meses tocados dejan de tener snapshot vigente (ver SNAPSHOTS DE MESES CERRADOS)
+    cur.execute("SELECT pg_advisory_xact_lock_shared(%s)", (SNAPSHOTS_LOCK_ID,))
+    cur.execute("""
+        DELETE FROM snapshots_evaluaciones WHERE mes IN (
+            SELECT DISTINCT date_trunc('month', fecha_evaluacion)::date FROM evaluaciones WHERE id = ANY(%s)
+        )
+    """, (list(evaluacion_ids),))
+
+def _primer_dia_mes_siguiente(fecha):
+    return (fecha.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def refrescar_resumenes(fecha_inicio=None, fecha_fin=None):
+    # Recalcula los resúmenes desde evaluaciones; el resumen mensual se extiende a meses completos
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (RESUMENES_LOCK_ID,))
+        
+        for tabla, periodo, expresion in TABLAS_RESUMEN:
+            desde, hasta = fecha_inicio, fecha_fin
+            if periodo == 'mes':
+                desde = desde.replace(day=1) if desde else None
+                hasta = _primer_dia_mes_siguiente(hasta) - timedelta(days=1) if hasta else None
+            
+            condiciones_resumen, condiciones_origen, params = "", "", []
+            if desde:
+                condiciones_resumen += f" AND {periodo} >= %s"
+                condiciones_origen += " AND fecha_evaluacion >= %s"
+                params.append(desde)
+            if hasta:
+                condiciones_resumen += f" AND {periodo} <= %s"
+                condiciones_origen += " AND fecha_evaluacion <= %s"
+                params.append(hasta)
+            
+            cur.execute(f"DELETE FROM {tabla} WHERE TRUE {condiciones_resumen}", params)
+            cur.execute(f"INSERT INTO {tabla} {_select_resumen(expresion, condiciones_origen)}", params)
+        cur.close()
+    invalidar_cache('evaluaciones')
+
+# Filtros comunes del reporte; asumen los alias e (evaluaciones), i (integrantes) y k (kpis)
+def _filtros_evaluaciones(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None, integrante_ids=None):
+    condiciones = ""
     params = []
     
-    if solo_activos:
-        query += " AND i.activo = TRUE"
+    if fecha_inicio:
+        condiciones += " AND e.fecha_evaluacion >= %s"
+        params.append(fecha_inicio)
+    if fecha_fin:
+        condiciones += " AND e.fecha_evaluacion <= %s"
+        params.append(fecha_fin)
     if equipo_id:
-        query += " AND i.equipo_id = %s"
+        condiciones += " AND i.equipo_id = %s"
         params.append(equipo_id)
+    if tipo_kpi:
+        condiciones += " AND k.tipo = %s"
+        params.append(tipo_kpi)
+    if integrante_ids:
+        # Enteros: un float (p. ej. de una columna de pandas con NULLs) llegaría como numeric[]
+        # y la comparación ya no podría usar el índice por integrante_id
+        condiciones += " AND e.integrante_id = ANY(%s)"
+        params.append([int(i) for i in integrante_ids])
     
-    query += " ORDER BY i.nombre"
-    
+    return condiciones, params
+
+def _consulta_evaluaciones(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None, integrante_ids=None, limite=None, antes_de=None, columnas=None, excluir_meses=None):
+    # columnas: lista opcional de (alias, expresión SQL); por defecto todas las de la evaluación y los nombres
+    if columnas:
+        seleccion = ", ".join(f"{expresion} as {alias}" for alias, expresion, *_ in columnas)
+    else:
+        seleccion = """e.*, 
+               i.nombre as integrante, 
+               i.equipo_id,
+               eq.nombre as equipo_nombre,
+               k.nombre as kpi_nombre,
+               k.tipo as kpi_tipo"""
+    query = f"""
+        SELECT {seleccion}
+        FROM evaluaciones e
+        JOIN integrantes i ON e.integrante_id = i.id
+        JOIN kpis k ON e.kpi_id = k.id
+        JOIN equipos eq ON i.equipo_id = eq.id
+        WHERE 1=1
+    """
+    condiciones, params = _filtros_evaluaciones(fecha_inicio, fecha_fin, equipo_id, tipo_kpi, integrante_ids)
+    query += condiciones
+    if excluir_meses:
+        query += " AND date_trunc('month', e.fecha_evaluacion)::date <> ALL(%s)"
+        params.append(list(excluir_meses))
+    if antes_de:
+        query += " AND (e.fecha_evaluacion, e.id) < (%s, %s)"
+        params.extend(antes_de)
+    query += " ORDER BY e.fecha_evaluacion DESC, e.id DESC"
+    if limite:
+        query += " LIMIT %s"
+        params.append(limite)
+    return query, params
+
+@cache_consulta('evaluaciones', 'integrantes', 'kpis', 'equipos')
+def obtener_evaluaciones(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None, integrante_ids=None, limite=None, antes_de=None):
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        
+        query, params = _consulta_evaluaciones(fecha_inicio, fecha_fin, equipo_id, tipo_kpi, integrante_ids, limite, antes_de)
+        
+        cur.execute(query, params)
+        result = cur.fetchall()
+        cur.close()
+        return result
+
+# ==================== CARGA TIPADA DE EVALUACIONES ====================
+# Las evaluaciones individuales se leen del cursor por lotes y se guardan en columnas tipadas
+# (nombres categóricos, calificación Int8, valor float32) en lugar de un dict por fila.
+# El comentario, texto libre y la columna más pesada, no se carga: se pide aparte con
+# obtener_comentarios() solo para las filas que se muestran.
+COLUMNAS_EVALUACION_DF = [
+    # (alias, expresión SQL, dtype)
+    ('id', 'e.id', 'int32'),
+    ('integrante_id', 'e.integrante_id', 'int32'),
+    ('kpi_id', 'e.kpi_id', 'int32'),
+    ('equipo_id', 'i.equipo_id', 'int32'),
+    ('calificacion', 'e.calificacion', 'Int8'),
+    ('valor_cuantitativo', 'e.valor_cuantitativo::float8', 'float32'),
+    ('fecha_evaluacion', 'e.fecha_evaluacion', 'datetime64[ns]'),
+    ('integrante', 'i.nombre', 'category'),
+    ('equipo_nombre', 'eq.nombre', 'category'),
+    ('kpi_nombre', 'k.nombre', 'category'),
+    ('kpi_tipo', 'k.tipo', 'category'),
+    ('evaluador', 'e.evaluador', 'category'),
+]
+CARGA_TAMANO_LOTE = 50000
+
+def _tipar_lote(filas):
+    lote = pd.DataFrame.from_records(filas, columns=[alias for alias, _, _ in COLUMNAS_EVALUACION_DF])
+    for alias, _, dtype in COLUMNAS_EVALUACION_DF:
+        if dtype.startswith('datetime'):
+            lote[alias] = pd.to_datetime(lote[alias])
+        else:
+            lote[alias] = lote[alias].astype(dtype)
+    return lote
+
+def _unir_lotes(lotes):
+    # Las categorías difieren entre lotes; se unen columna por columna para no pasar por object
+    if not lotes:
+        return _tipar_lote([])
+    if len(lotes) == 1:
+        return lotes[0]
+    columnas = {}
+    for alias, _, dtype in COLUMNAS_EVALUACION_DF:
+        partes = [lote[alias] for lote in lotes]
+        if dtype == 'category':
+            columnas[alias] = union_categoricals(partes, ignore_order=True)
+        else:
+            columnas[alias] = pd.concat(partes, ignore_index=True)
+    return pd.DataFrame(columnas)
+
+def _leer_evaluaciones(conn, fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None, integrante_ids=None, limite=None, antes_de=None, excluir_meses=None):
+    query, params = _consulta_evaluaciones(
+        fecha_inicio, fecha_fin, equipo_id, tipo_kpi, integrante_ids, limite, antes_de,
+        columnas=COLUMNAS_EVALUACION_DF, excluir_meses=excluir_meses
+    )
+    lotes = []
+    cur = conn.cursor(name='carga_evaluaciones')
     cur.execute(query, params)
-    result = cur.fetchall()
+    while True:
+        filas = cur.fetchmany(CARGA_TAMANO_LOTE)
+        if not filas:
+            break
+        lotes.append(_tipar_lote(filas))
     cur.close()
-    return result
+    return _unir_lotes(lotes)
 
-def desactivar_integrante(integrante_id):
-    conn = get_connection()
+@cache_consulta('evaluaciones', 'integrantes', 'kpis', 'equipos')
+def cargar_evaluaciones_df(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None, integrante_ids=None, limite=None, antes_de=None):
+    # Las páginas (LIMIT/keyset) usan el índice de Postgres; las lecturas completas toman los
+    # meses cerrados de los snapshots y solo piden a Postgres el resto.
+    meses = []
+    if limite is None and antes_de is None:
+        meses = _meses_en_rango(obtener_meses_snapshot(), fecha_inicio, fecha_fin)
+    
+    with get_connection() as conn:
+        df = _leer_evaluaciones(
+            conn, fecha_inicio, fecha_fin, equipo_id, tipo_kpi, integrante_ids, limite, antes_de,
+            excluir_meses=meses
+        )
+    if meses:
+        df_snapshot = _leer_snapshots(meses, fecha_inicio, fecha_fin, equipo_id, tipo_kpi, integrante_ids)
+        df = _unir_lotes([df_snapshot, df]).sort_values(
+            ['fecha_evaluacion', 'id'], ascending=False, ignore_index=True
+        )
+    return df
+
+@cache_consulta('evaluaciones')
+def obtener_comentarios(evaluacion_ids):
+    # Devuelve {id: comentario} solo para las evaluaciones con comentario
+    if not evaluacion_ids:
+        return {}
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, comentario FROM evaluaciones WHERE id = ANY(%s) AND comentario IS NOT NULL AND comentario <> ''",
+            (list(evaluacion_ids),)
+        )
+        comentarios = dict(cur.fetchall())
+        cur.close()
+    return comentarios
+
+# Paginación por clave (keyset): cada página filtra a partir de la clave de la última fila vista,
+# así su costo no crece con el número de página. Devuelve (DataFrame, clave de la siguiente página o None).
+def obtener_evaluaciones_pagina(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None, antes_de=None, tamano=30):
+    df = cargar_evaluaciones_df(
+        fecha_inicio, fecha_fin, equipo_id, tipo_kpi, limite=tamano + 1, antes_de=antes_de
+    )
+    if len(df) > tamano:
+        df = df.iloc[:tamano]
+        ultima = df.iloc[-1]
+        return df, (ultima['fecha_evaluacion'].date(), int(ultima['id']))
+    return df, None
+
+# ==================== AGREGACIONES DEL REPORTE ====================
+# Columnas por las que se puede agrupar y conjuntos de agrupación que usa cada pestaña del reporte.
+# La consulta devuelve sumas y conteos (no promedios) para poder combinar resultados parciales
+# y se resuelve sobre las tablas de resumen, no sobre las evaluaciones individuales.
+COLUMNAS_AGREGACION = [
+    'integrante_id', 'integrante', 'equipo_id', 'equipo_nombre',
+    'kpi_id', 'kpi_nombre', 'kpi_tipo', 'calificacion', 'fecha_evaluacion'
+]
+
+CONJUNTOS_AGREGACION = {
+    'total': [],
+    'calificacion': ['calificacion'],
+    'tipo': ['kpi_tipo'],
+    'integrante': ['integrante_id', 'integrante', 'equipo_id', 'equipo_nombre'],
+    'integrante_tipo': ['integrante_id', 'integrante', 'kpi_tipo'],
+    'integrante_calificacion': ['integrante_id', 'integrante', 'calificacion'],
+    'equipo': ['equipo_id', 'equipo_nombre'],
+    'equipo_tipo': ['equipo_id', 'equipo_nombre', 'kpi_tipo'],
+    'kpi': ['kpi_id', 'kpi_nombre', 'kpi_tipo'],
+    'kpi_integrante': ['kpi_id', 'kpi_nombre', 'integrante_id', 'integrante', 'equipo_id', 'equipo_nombre'],
+    'kpi_equipo': ['kpi_id', 'kpi_nombre', 'equipo_id', 'equipo_nombre'],
+    'fecha': ['fecha_evaluacion'],
+    'fecha_equipo': ['fecha_evaluacion', 'equipo_id', 'equipo_nombre'],
+    'fecha_integrante': ['fecha_evaluacion', 'integrante_id', 'integrante'],
+    'fecha_tipo': ['fecha_evaluacion', 'kpi_tipo'],
+}
+
+COLUMNAS_ENTERAS_AGREGACION = ['integrante_id', 'equipo_id', 'kpi_id', 'calificacion']
+
+METRICAS_AGREGACION = ['cantidad', 'suma_puntuacion', 'bajas', 'suma_valor', 'cantidad_valor', 'valor_bajo_75']
+CONTEOS_AGREGACION = ['cantidad', 'bajas', 'cantidad_valor', 'valor_bajo_75']
+
+def _mascara_grouping(columnas, columnas_grouping):
+    # Valor de GROUPING(columnas_grouping) para un conjunto: bit en 1 por cada columna que NO agrupa
+    n = len(columnas_grouping)
+    return sum(1 << (n - 1 - idx) for idx, col in enumerate(columnas_grouping) if col not in columnas)
+
+def agregar_promedios(df):
+    # Promedios a partir de sumas y conteos (sirve también para agregados combinados)
+    df = df.copy()
+    df['puntuacion_invertida'] = df['suma_puntuacion'] / df['cantidad']
+    df['valor_promedio'] = df['suma_valor'] / df['cantidad_valor'].where(df['cantidad_valor'] > 0)
+    return df
+
+def _rangos_resumen(fecha_inicio, fecha_fin):
+    # Divide el rango en meses completos (leídos del resumen mensual) y bordes parciales
+    # (leídos del resumen diario). Devuelve (condición mensual, params, condición diaria, params).
+    inicio_meses = fecha_inicio if fecha_inicio is None or fecha_inicio.day == 1 else _primer_dia_mes_siguiente(fecha_inicio)
+    fin_meses = _primer_dia_mes_siguiente(fecha_fin) if fecha_fin else None
+    if fecha_fin and fin_meses - timedelta(days=1) != fecha_fin:
+        fin_meses = fecha_fin.replace(day=1)
+    
+    if inicio_meses and fin_meses and inicio_meses >= fin_meses:
+        # El rango no contiene ningún mes completo
+        condicion_diaria, params_diaria = "TRUE", []
+        if fecha_inicio:
+            condicion_diaria += " AND fecha_evaluacion >= %s"
+            params_diaria.append(fecha_inicio)
+        if fecha_fin:
+            condicion_diaria += " AND fecha_evaluacion <= %s"
+            params_diaria.append(fecha_fin)
+        return "FALSE", [], condicion_diaria, params_diaria
+    
+    condicion_mensual, params_mensual = "TRUE", []
+    if inicio_meses:
+        condicion_mensual += " AND mes >= %s"
+        params_mensual.append(inicio_meses)
+    if fin_meses:
+        condicion_mensual += " AND mes < %s"
+        params_mensual.append(fin_meses)
+    
+    bordes, params_diaria = [], []
+    if fecha_inicio and inicio_meses != fecha_inicio:
+        bordes.append("(fecha_evaluacion >= %s AND fecha_evaluacion < %s)")
+        params_diaria.extend([fecha_inicio, inicio_meses])
+    if fecha_fin and fin_meses <= fecha_fin:
+        bordes.append("(fecha_evaluacion >= %s AND fecha_evaluacion <= %s)")
+        params_diaria.extend([fin_meses, fecha_fin])
+    condicion_diaria = " OR ".join(bordes) if bordes else "FALSE"
+    return condicion_mensual, params_mensual, condicion_diaria, params_diaria
+
+def _select_agregados(conjuntos, origen):
+    # conjuntos: {nombre: columnas}. GROUPING() solo admite columnas que agrupan en algún conjunto de
+    # esta consulta, así que la máscara se calcula sobre esas; las demás columnas salen en NULL.
+    # 'conjunto' devuelve el nombre del conjunto de cada fila.
+    usadas = [col for col in COLUMNAS_AGREGACION if any(col in cols for cols in conjuntos.values())]
+    columnas = ", ".join(col if col in usadas else f"NULL as {col}" for col in COLUMNAS_AGREGACION)
+    casos = " ".join(
+        f"WHEN {_mascara_grouping(cols, usadas)} THEN '{nombre}'" for nombre, cols in conjuntos.items()
+    )
+    grouping_sets = ", ".join(f"({', '.join(cols)})" for cols in conjuntos.values())
+    return f"""
+        SELECT CASE GROUPING({', '.join(usadas)}) {casos} END as conjunto,
+               {columnas},
+               SUM(cantidad) as cantidad,
+               SUM(cantidad * (5 - calificacion)) as suma_puntuacion,
+               COALESCE(SUM(cantidad) FILTER (WHERE calificacion >= 3), 0) as bajas,
+               SUM(suma_valor)::float8 as suma_valor,
+               SUM(cantidad_valor) as cantidad_valor,
+               SUM(valor_bajo_75) as valor_bajo_75
+        FROM base
+        WHERE origen = '{origen}'
+        GROUP BY GROUPING SETS ({grouping_sets})
+    """
+
+def _agregados_postgres(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None):
+    # Los conjuntos sin fecha salen de meses completos + bordes diarios; las tendencias (por fecha)
+    # necesitan el detalle diario de todo el rango.
+    condicion_mensual, params_mensual, condicion_diaria, params_diaria = _rangos_resumen(fecha_inicio, fecha_fin)
+    condicion_tendencia, params_tendencia = "TRUE", []
+    if fecha_inicio:
+        condicion_tendencia += " AND fecha_evaluacion >= %s"
+        params_tendencia.append(fecha_inicio)
+    if fecha_fin:
+        condicion_tendencia += " AND fecha_evaluacion <= %s"
+        params_tendencia.append(fecha_fin)
+    condiciones, params_filtros = _filtros_evaluaciones(equipo_id=equipo_id, tipo_kpi=tipo_kpi)
+    
+    conjuntos_resumen = {nombre: cols for nombre, cols in CONJUNTOS_AGREGACION.items() if 'fecha_evaluacion' not in cols}
+    conjuntos_tendencia = {nombre: cols for nombre, cols in CONJUNTOS_AGREGACION.items() if 'fecha_evaluacion' in cols}
+    columnas_resumen = "integrante_id, kpi_id, calificacion, cantidad, suma_valor, cantidad_valor, valor_bajo_75"
+    
+    query = f"""
+        WITH resumen AS (
+            SELECT 'resumen' as origen, mes as fecha_evaluacion, {columnas_resumen}
+            FROM evaluaciones_mensuales WHERE {condicion_mensual}
+            UNION ALL
+            SELECT 'resumen', fecha_evaluacion, {columnas_resumen}
+            FROM evaluaciones_diarias WHERE {condicion_diaria}
+            UNION ALL
+            SELECT 'tendencia', fecha_evaluacion, {columnas_resumen}
+            FROM evaluaciones_diarias WHERE {condicion_tendencia}
+        ),
+        base AS (
+            SELECT e.origen,
+                   e.integrante_id,
+                   i.nombre as integrante,
+                   i.equipo_id,
+                   eq.nombre as equipo_nombre,
+                   e.kpi_id,
+                   k.nombre as kpi_nombre,
+                   k.tipo as kpi_tipo,
+                   e.calificacion,
+                   e.fecha_evaluacion,
+                   e.cantidad,
+                   e.suma_valor,
+                   e.cantidad_valor,
+                   e.valor_bajo_75
+            FROM resumen e
+            JOIN integrantes i ON e.integrante_id = i.id
+            JOIN kpis k ON e.kpi_id = k.id
+            JOIN equipos eq ON i.equipo_id = eq.id
+            WHERE 1=1 {condiciones}
+        )
+        {_select_agregados(conjuntos_resumen, 'resumen')}
+        UNION ALL
+        {_select_agregados(conjuntos_tendencia, 'tendencia')}
+    """
+    params = params_mensual + params_diaria + params_tendencia + params_filtros
+    
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(query, params)
+        filas = cur.fetchall()
+        cur.close()
+    return pd.DataFrame(filas, columns=['conjunto'] + COLUMNAS_AGREGACION + METRICAS_AGREGACION)
+
+def _leer_resumen_diario(conn, fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None, excluir_meses=None):
+    # Filas de evaluaciones_diarias ya filtradas y con nombres: una por día × integrante × KPI ×
+    # calificación, no una por evaluación
+    condiciones, params = _filtros_evaluaciones(fecha_inicio, fecha_fin, equipo_id, tipo_kpi)
+    if excluir_meses:
+        condiciones += " AND date_trunc('month', e.fecha_evaluacion)::date <> ALL(%s)"
+        params.append(list(excluir_meses))
+    
     cur = conn.cursor()
-    cur.execute("UPDATE integrantes SET activo = FALSE WHERE id = %s", (integrante_id,))
-    conn.commit()
+    cur.execute(f"""
+        SELECT e.integrante_id, i.nombre, i.equipo_id, eq.nombre, e.kpi_id, k.nombre, k.tipo,
+               e.calificacion, e.fecha_evaluacion, e.cantidad, e.suma_valor::float8, e.cantidad_valor, e.valor_bajo_75
+        FROM evaluaciones_diarias e
+        JOIN integrantes i ON e.integrante_id = i.id
+        JOIN kpis k ON e.kpi_id = k.id
+        JOIN equipos eq ON i.equipo_id = eq.id
+        WHERE 1=1 {condiciones}
+    """, params)
+    filas = cur.fetchall()
     cur.close()
+    return pd.DataFrame(filas, columns=[
+        'integrante_id', 'integrante', 'equipo_id', 'equipo_nombre', 'kpi_id', 'kpi_nombre', 'kpi_tipo',
+        'calificacion', 'fecha_evaluacion', 'cantidad', 'suma_valor', 'cantidad_valor', 'valor_bajo_75'
+    ])
 
-# ==================== FUNCIONES CRUD KPIS ====================
-def agregar_kpi(nombre, descripcion, tipo):
-    conn = get_connection()
-    cur = conn.cursor()
+def _agregados_duckdb(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None):
+    # Misma consulta GROUPING SETS, ejecutada en DuckDB (en paralelo, en proceso). Los meses con
+    # snapshot se leen del Parquet dentro de DuckDB (que aplica los filtros al leer); el resto llega
+    # de Postgres ya agregado por día desde evaluaciones_diarias.
+    meses = _meses_en_rango(obtener_meses_snapshot(), fecha_inicio, fecha_fin)
+    with get_connection() as conn:
+        vivas = _leer_resumen_diario(conn, fecha_inicio, fecha_fin, equipo_id, tipo_kpi, excluir_meses=meses)
+    
+    # Tipos explícitos: el DataFrame de Postgres puede llegar vacío (columnas object)
+    columnas = """integrante_id::INTEGER as integrante_id, integrante::VARCHAR as integrante,
+                  equipo_id::INTEGER as equipo_id, equipo_nombre::VARCHAR as equipo_nombre,
+                  kpi_id::INTEGER as kpi_id, kpi_nombre::VARCHAR as kpi_nombre, kpi_tipo::VARCHAR as kpi_tipo,
+                  calificacion::INTEGER as calificacion, fecha_evaluacion::DATE as fecha_evaluacion"""
+    origenes = [f"""
+        SELECT {columnas}, cantidad::BIGINT as cantidad, suma_valor::DOUBLE as suma_valor,
+               cantidad_valor::BIGINT as cantidad_valor, valor_bajo_75::BIGINT as valor_bajo_75
+        FROM vivas
+    """]
+    params = []
+    if meses:
+        condiciones = ""
+        if fecha_inicio:
+            condiciones += " AND fecha_evaluacion >= ?"
+            params.append(fecha_inicio)
+        if fecha_fin:
+            condiciones += " AND fecha_evaluacion <= ?"
+            params.append(fecha_fin)
+        if equipo_id:
+            condiciones += " AND equipo_id = ?"
+            params.append(equipo_id)
+        if tipo_kpi:
+            condiciones += " AND kpi_tipo = ?"
+            params.append(tipo_kpi)
+        archivos = ", ".join(f"'{_ruta_snapshot(mes)}'" for mes in meses)
+        origenes.append(f"""
+            SELECT {columnas},
+                   1 as cantidad,
+                   COALESCE(valor_cuantitativo, 0)::DOUBLE as suma_valor,
+                   CASE WHEN valor_cuantitativo IS NOT NULL THEN 1 ELSE 0 END as cantidad_valor,
+                   CASE WHEN valor_cuantitativo < 75 THEN 1 ELSE 0 END as valor_bajo_75
+            FROM read_parquet([{archivos}])
+            WHERE calificacion IS NOT NULL {condiciones}
+        """)
+    
+    query = f"""
+        WITH base AS (
+            SELECT 'detalle' as origen, * FROM ({" UNION ALL ".join(origenes)}) detalle
+        )
+        {_select_agregados(CONJUNTOS_AGREGACION, 'detalle')}
+    """
+    con = duckdb.connect()
+    try:
+        con.register('vivas', vivas)
+        df = con.execute(query, params).df()
+    finally:
+        con.close()
+    return df[['conjunto'] + COLUMNAS_AGREGACION + METRICAS_AGREGACION]
+
+# Motores de agregación intercambiables: reciben los filtros del reporte y devuelven una fila por
+# grupo con 'conjunto' (nombre del conjunto de agrupación), COLUMNAS_AGREGACION y METRICAS_AGREGACION.
+# 'postgres' lee las tablas de resumen; 'duckdb' (opcional) agrega en proceso los snapshots Parquet
+# y el resumen diario de los meses abiertos. Se elige con la variable de entorno KPI_MOTOR_ANALITICO.
+MOTORES_AGREGACION = {
+    'postgres': _agregados_postgres,
+    'duckdb': _agregados_duckdb,
+}
+MOTOR_ANALITICO = os.environ.get("KPI_MOTOR_ANALITICO", "postgres").strip().lower()
+
+@functools.lru_cache(maxsize=None)
+def _avisar_motor_no_disponible(motor):
+    # Una sola vez por proceso, no en cada carga del reporte
+    logger.warning("KPI_MOTOR_ANALITICO=%s pero el paquete no está instalado; se usa 'postgres'", motor)
+
+def motor_analitico():
+    if MOTOR_ANALITICO not in MOTORES_AGREGACION:
+        raise ValueError(
+            f"KPI_MOTOR_ANALITICO inválido: '{MOTOR_ANALITICO}' (opciones: {', '.join(MOTORES_AGREGACION)})"
+        )
+    if MOTOR_ANALITICO == 'duckdb' and duckdb is None:
+        _avisar_motor_no_disponible(MOTOR_ANALITICO)
+        return 'postgres'
+    return MOTOR_ANALITICO
+
+@cache_consulta('evaluaciones', 'integrantes', 'kpis', 'equipos')
+def obtener_agregados_reporte(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None):
+    df = MOTORES_AGREGACION[motor_analitico()](fecha_inicio, fecha_fin, equipo_id, tipo_kpi)
+    # Las sumas llegan como Decimal/None (object): a float antes de completar los vacíos, y los
+    # conteos de nuevo a enteros
+    df[METRICAS_AGREGACION] = df[METRICAS_AGREGACION].astype(float).fillna(0)
+    df = df.astype({col: 'int64' for col in CONTEOS_AGREGACION})
+    
+    agregados = {}
+    for nombre, cols in CONJUNTOS_AGREGACION.items():
+        parte = df.loc[df['conjunto'] == nombre, cols + METRICAS_AGREGACION]
+        # En el resultado completo las columnas de id tienen NULLs (float); en cada conjunto no
+        ids = [col for col in cols if col in COLUMNAS_ENTERAS_AGREGACION]
+        parte = parte.astype({col: 'int64' for col in ids})
+        agregados[nombre] = agregar_promedios(parte.reset_index(drop=True))
+    return agregados
+
+# ==================== DIAGNÓSTICO DE ÍNDICES ====================
+def _nodos_plan(nodo):
+    yield nodo
+    for hijo in nodo.get('Plans', []):
+        yield from _nodos_plan(hijo)
+
+def _indice_de_acceso(nodo):
+    # Un Bitmap Heap Scan no nombra el índice: está en sus Bitmap Index Scan hijos (varios si
+    # pasa por BitmapAnd/BitmapOr)
+    if nodo.get('Index Name'):
+        return nodo['Index Name']
+    indices = [
+        hijo['Index Name'] for hijo in _nodos_plan(nodo)
+        if hijo is not nodo and hijo['Node Type'] == 'Bitmap Index Scan'
+    ]
+    return ", ".join(dict.fromkeys(indices)) or None
+
+def _generar_evaluaciones_sinteticas(cur, filas, equipos=50, integrantes_por_equipo=20, kpis=20):
+    # Datos de prueba para medir el plan a escala; se insertan dentro de la transacción del llamador
     cur.execute(
-        "INSERT INTO kpis (nombre, descripcion, tipo) VALUES (%s, %s, %s)",
-        (nombre, descripcion, tipo)
+        "INSERT INTO equipos (nombre) SELECT 'Simulado ' || g FROM generate_series(1, %s) g RETURNING id",
+        (equipos,)
     )
-    conn.commit()
-    cur.close()
+    equipo_ids = [r[0] for r in cur.fetchall()]
+    cur.execute(
+        """INSERT INTO integrantes (nombre, equipo_id)
+           SELECT 'Simulado ' || eq || '-' || g, eq
+           FROM unnest(%s::int[]) eq, generate_series(1, %s) g
+           RETURNING id""",
+        (equipo_ids, integrantes_por_equipo)
+    )
+    integrante_ids = [r[0] for r in cur.fetchall()]
+    cur.execute(
+        """INSERT INTO kpis (nombre, tipo)
+           SELECT 'Simulado ' || g, CASE WHEN g %% 2 = 0 THEN 'cualitativo' ELSE 'cuantitativo' END
+           FROM generate_series(1, %s) g
+           RETURNING id""",
+        (kpis,)
+    )
+    kpi_ids = [r[0] for r in cur.fetchall()]
+    cur.execute(
+        """INSERT INTO evaluaciones (integrante_id, kpi_id, calificacion, fecha_evaluacion, evaluador)
+           SELECT i.ids[1 + g %% cardinality(i.ids)],
+                  k.ids[1 + (g / cardinality(i.ids)) %% cardinality(k.ids)],
+                  1 + g %% 4,
+                  CURRENT_DATE - (g %% 1095),
+                  'simulacion'
+           FROM generate_series(1, %s) g,
+                (SELECT %s::int[] AS ids) i,
+                (SELECT %s::int[] AS ids) k""",
+        (filas, integrante_ids, kpi_ids)
+    )
+    for tabla in ('equipos', 'integrantes', 'kpis', 'evaluaciones'):
+        cur.execute(f"ANALYZE {tabla}")
+    return equipo_ids
 
-def obtener_kpis(solo_activos=True, tipo=None):
-    conn = get_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+def verificar_indices_reporte(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None, simular_filas=0):
+    # Ejecuta EXPLAIN sobre la consulta del reporte (todos los equipos y, si hay, un equipo)
+    # y confirma que evaluaciones se lee por índice y no con Seq Scan.
+    # Con simular_filas se cargan datos sintéticos en una transacción que luego se descarta.
+    resultados = []
+    with get_connection() as conn:
+        cur = conn.cursor()
+        
+        if simular_filas:
+            equipo_ids = _generar_evaluaciones_sinteticas(cur, simular_filas)
+            equipo_id = equipo_id or equipo_ids[0]
+        
+        escenarios = [("Todos los equipos", None, None)]
+        if equipo_id:
+            escenarios.append((f"Equipo {equipo_id}", equipo_id, None))
+        # Detalle de riesgos: evaluaciones de algunas personas por integrante_id
+        cur.execute("SELECT id FROM integrantes ORDER BY id LIMIT %s", (RIESGO_MAX_DETALLE,))
+        integrante_ids = [r[0] for r in cur.fetchall()]
+        if integrante_ids:
+            escenarios.append((f"Detalle de {len(integrante_ids)} integrantes", None, integrante_ids))
+        
+        for nombre, equipo_escenario, integrantes_escenario in escenarios:
+            query, params = _consulta_evaluaciones(
+                fecha_inicio, fecha_fin, equipo_escenario, tipo_kpi, integrante_ids=integrantes_escenario
+            )
+            cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cur.fetchone()[0][0]['Plan']
+            accesos = [
+                (nodo['Node Type'], _indice_de_acceso(nodo))
+                for nodo in _nodos_plan(plan)
+                if nodo.get('Relation Name') == 'evaluaciones'
+            ]
+            usa_indices = bool(accesos) and all(tipo != 'Seq Scan' for tipo, _ in accesos)
+            resultados.append((nombre, usa_indices, accesos))
+        
+        if simular_filas:
+            conn.rollback()
+        cur.close()
+    
+    return resultados
+
+# ==================== SNAPSHOTS DE MESES CERRADOS ====================
+# Cada mes cerrado puede guardarse en Parquet (un archivo por mes, con los nombres ya unidos y las
+# mismas columnas tipadas de la carga). cargar_evaluaciones_df lee esos archivos con memory-map y
+# solo consulta Postgres por los meses sin snapshot. snapshots_evaluaciones registra los meses
+# vigentes: toda inserción borra el registro de su mes (en acumular_en_resumenes), que vuelve a
+# leerse de Postgres hasta regenerarlo. Los nombres quedan como estaban al generar el snapshot.
+# Junto a app.py salvo que se indique KPI_SNAPSHOTS_DIR: la app y el cron de `snapshot` pueden
+# correr con distinto directorio de trabajo y deben ver la misma carpeta
+SNAPSHOTS_DIR = os.environ.get(
+    "KPI_SNAPSHOTS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+)
+
+# Advisory lock: exclusivo al generar un mes, compartido en cada inserción
+SNAPSHOTS_LOCK_ID = 724003
+
+def _ruta_snapshot(mes):
+    return os.path.join(SNAPSHOTS_DIR, f"mes={mes:%Y-%m}", "evaluaciones.parquet")
+
+@cache_consulta('evaluaciones')
+def obtener_meses_snapshot():
+    if pa is None:
+        return ()
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT mes FROM snapshots_evaluaciones ORDER BY mes")
+        meses = [r[0] for r in cur.fetchall()]
+        cur.close()
+    # Un mes registrado sin archivo local (p. ej. otro servidor) se lee de Postgres
+    return tuple(mes for mes in meses if os.path.exists(_ruta_snapshot(mes)))
+
+def _meses_en_rango(meses, fecha_inicio, fecha_fin):
+    return [
+        mes for mes in meses
+        if (fecha_inicio is None or _primer_dia_mes_siguiente(mes) > fecha_inicio)
+        and (fecha_fin is None or mes <= fecha_fin)
+    ]
+
+def _leer_snapshots(meses, fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None, integrante_ids=None):
+    filtros = []
+    if fecha_inicio:
+        filtros.append(('fecha_evaluacion', '>=', pd.Timestamp(fecha_inicio)))
+    if fecha_fin:
+        filtros.append(('fecha_evaluacion', '<=', pd.Timestamp(fecha_fin)))
+    if equipo_id:
+        filtros.append(('equipo_id', '=', equipo_id))
+    if tipo_kpi:
+        filtros.append(('kpi_tipo', '=', tipo_kpi))
+    if integrante_ids:
+        filtros.append(('integrante_id', 'in', list(integrante_ids)))
+    
+    tablas = [
+        pq.read_table(_ruta_snapshot(mes), filters=filtros or None, memory_map=True)
+        for mes in meses
+    ]
+    df = pa.concat_tables(tablas).to_pandas()
+    return df.astype({alias: dtype for alias, _, dtype in COLUMNAS_EVALUACION_DF if not dtype.startswith('datetime')})
+
+def generar_snapshots(hasta=None, forzar=False):
+    # Genera el Parquet de cada mes cerrado (anterior al mes de 'hasta', por defecto el actual)
+    # que no tenga snapshot vigente. Devuelve [(mes, filas)].
+    if pa is None:
+        raise RuntimeError("Los snapshots requieren pyarrow (pip install pyarrow)")
+    limite = (hasta or date.today()).replace(day=1)
+    
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT DISTINCT m.mes FROM evaluaciones_mensuales m
+            WHERE m.mes < %s
+              AND (%s OR NOT EXISTS (SELECT 1 FROM snapshots_evaluaciones s WHERE s.mes = m.mes))
+            ORDER BY m.mes
+        """, (limite, forzar))
+        meses = [r[0] for r in cur.fetchall()]
+        cur.close()
+    
+    generados = []
+    for mes in meses:
+        ruta = _ruta_snapshot(mes)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        # Una transacción por mes: el lock exclusivo espera a las inserciones en curso y
+        # bloquea las nuevas solo mientras se escribe este mes
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (SNAPSHOTS_LOCK_ID,))
+            df = _leer_evaluaciones(
+                conn,
+                fecha_inicio=mes,
+                fecha_fin=_primer_dia_mes_siguiente(mes) - timedelta(days=1)
+            )
+            temporal = ruta + ".tmp"
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), temporal)
+            os.replace(temporal, ruta)
+            cur.execute(
+                """INSERT INTO snapshots_evaluaciones (mes, filas) VALUES (%s, %s)
+                   ON CONFLICT (mes) DO UPDATE SET filas = EXCLUDED.filas, generado = CURRENT_TIMESTAMP""",
+                (mes, len(df))
+            )
+            cur.close()
+        generados.append((mes, len(df)))
+    
+    invalidar_cache('evaluaciones')
+    return generados
+
+# ==================== REGLAS Y ALERTAS DE RIESGO ====================
+# Los umbrales de riesgo viven en reglas_riesgo y se editan desde el reporte. Un evaluador en segundo
+# plano aplica cada regla activa en SQL y guarda las infracciones en alertas:
+# - nivel 'evaluacion': una alerta por evaluación que cumple la condición. Es incremental: cada
+#   regla recuerda el último evaluaciones.id procesado.
+# - niveles 'integrante', 'equipo' y 'kpi': la métrica sobre evaluaciones_diarias de los últimos
+#   ventana_dias, una alerta por entidad. Cada pasada recalcula las entidades con evaluaciones
+#   nuevas y, si cambió el día, las que tenían días que salieron de la ventana; la pasada completa
+#   (periódica, o cuando la regla cambia) recalcula todas.
+# Al modificar una regla se borran sus alertas y vuelve a evaluarse desde cero.
+METRICAS_REGLA = {
+    # métrica: (niveles, expresión SQL)
+    'calificacion': (('evaluacion',), "e.calificacion"),
+    'valor_cuantitativo': (('evaluacion',), "e.valor_cuantitativo"),
+    'puntuacion_invertida': (('integrante', 'equipo', 'kpi'), "SUM(d.cantidad * (5 - d.calificacion))::float8 / SUM(d.cantidad)"),
+    'valor_promedio': (('integrante', 'equipo', 'kpi'), "SUM(d.suma_valor)::float8 / NULLIF(SUM(d.cantidad_valor), 0)"),
+}
+# nivel: (columna en evaluaciones_diarias, columna en evaluaciones); ambas junto a integrantes i
+ENTIDADES_REGLA = {
+    'integrante': ('d.integrante_id', 'e.integrante_id'),
+    'equipo': ('i.equipo_id', 'i.equipo_id'),
+    'kpi': ('d.kpi_id', 'e.kpi_id'),
+}
+COMPARACIONES_REGLA = ['<', '<=', '>', '>=']
+NIVELES_ALERTA = {
+    'evaluacion': '📝 Evaluación',
+    'integrante': '👤 Integrante',
+    'equipo': '🏢 Equipo',
+    'kpi': '📋 KPI',
+}
+
+# Advisory lock: un único evaluador a la vez entre todos los procesos
+ALERTAS_LOCK_ID = 724004
+ALERTAS_INTERVALO_SEGUNDOS = 60
+ALERTAS_PASADA_COMPLETA_SEGUNDOS = 6 * 3600
+
+@cache_consulta('reglas_riesgo')
+def obtener_reglas_riesgo():
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute("""
+            SELECT id, descripcion, nivel, metrica, comparacion, umbral::float8 as umbral, ventana_dias, activa
+            FROM reglas_riesgo ORDER BY id
+        """)
+        result = cur.fetchall()
+        cur.close()
+        return result
+
+def umbral_regla(nivel, metrica):
+    # Umbral más alto entre las reglas activas de ese nivel y métrica (None si no hay ninguna)
+    return max(
+        (r['umbral'] for r in obtener_reglas_riesgo() if r['activa'] and r['nivel'] == nivel and r['metrica'] == metrica),
+        default=None
+    )
+
+def guardar_reglas_riesgo(reglas):
+    # Actualiza las reglas editadas; las que cambian pierden sus alertas y se reevalúan completas
+    modificadas = []
+    with get_connection() as conn:
+        cur = conn.cursor()
+        for regla in reglas:
+            if regla['comparacion'] not in COMPARACIONES_REGLA:
+                raise ValueError(f"Comparación inválida: {regla['comparacion']}")
+            # Las filas pueden venir de un DataFrame (tipos numpy)
+            valores = (regla['comparacion'], float(regla['umbral']), int(regla['ventana_dias']), bool(regla['activa']))
+            cur.execute("""
+                UPDATE reglas_riesgo
+                SET descripcion = %s, comparacion = %s, umbral = %s, ventana_dias = %s, activa = %s,
+                    ultimo_evaluacion_id = 0, evaluada_el = NULL
+                WHERE id = %s
+                  AND (comparacion, umbral, ventana_dias, activa) IS DISTINCT FROM (%s, %s::decimal, %s, %s)
+            """, (regla['descripcion'],) + valores + (int(regla['id']),) + valores)
+            if cur.rowcount:
+                modificadas.append(int(regla['id']))
+            else:
+                cur.execute("UPDATE reglas_riesgo SET descripcion = %s WHERE id = %s", (regla['descripcion'], int(regla['id'])))
+        if modificadas:
+            cur.execute("DELETE FROM alertas WHERE regla_id = ANY(%s)", (modificadas,))
+        cur.close()
+    invalidar_cache('reglas_riesgo', 'alertas')
+    return modificadas
+
+def _evaluar_regla_evaluacion(cur, regla_id, metrica, comparacion, umbral, desde, tope, completo):
+    expresion = METRICAS_REGLA[metrica][1]
+    # La pasada completa recupera evaluaciones con id bajo que se confirmaron después de procesar uno mayor
+    rango = "e.id <= %s" if completo else "e.id > %s AND e.id <= %s"
+    params = [regla_id, tope] if completo else [regla_id, desde, tope]
+    cur.execute(f"""
+        INSERT INTO alertas (regla_id, entidad_id, evaluacion_id, valor, fecha_evaluacion)
+        SELECT %s, e.integrante_id, e.id, {expresion}, e.fecha_evaluacion
+        FROM evaluaciones e
+        WHERE {rango} AND e.integrante_id IS NOT NULL AND {expresion} {comparacion} %s
+        ON CONFLICT (regla_id, evaluacion_id) WHERE evaluacion_id IS NOT NULL DO NOTHING
+    """, params + [umbral])
+    return cur.rowcount
+
+def _evaluar_regla_agregada(cur, regla_id, nivel, metrica, comparacion, umbral, ventana_dias,
+                            desde, tope, evaluada_el, completo):
+    expresion = METRICAS_REGLA[metrica][1]
+    entidad, entidad_evaluacion = ENTIDADES_REGLA[nivel]
+    acotar, params_acotar = "", []
+    if not completo:
+        # Entidades con evaluaciones nuevas y entidades con días que salieron de la ventana
+        # desde la última pasada (la ventana se desliza aunque no lleguen evaluaciones)
+        acotar = f"""IN (
+            SELECT {entidad_evaluacion} FROM evaluaciones e JOIN integrantes i ON i.id = e.integrante_id
+            WHERE e.id > %s AND e.id <= %s
+            UNION
+            SELECT {entidad} FROM evaluaciones_diarias d JOIN integrantes i ON i.id = d.integrante_id
+            WHERE d.fecha_evaluacion > %s::date - %s AND d.fecha_evaluacion <= CURRENT_DATE - %s
+        )"""
+        params_acotar = [desde, tope, evaluada_el, ventana_dias, ventana_dias]
     
-    query = "SELECT * FROM kpis WHERE 1=1"
+    # Upsert: las alertas que siguen vigentes conservan su fecha de detección y solo se cuentan
+    # como nuevas las entidades que no tenían alerta; las que dejaron de cumplir la regla se borran.
+    cur.execute(f"""
+        WITH infracciones AS (
+            SELECT {entidad} as entidad_id, {expresion} as valor
+            FROM evaluaciones_diarias d
+            JOIN integrantes i ON i.id = d.integrante_id
+            WHERE d.fecha_evaluacion > CURRENT_DATE - %s {'AND ' + entidad + ' ' + acotar if acotar else ''}
+            GROUP BY {entidad}
+            HAVING {expresion} {comparacion} %s
+        ),
+        resueltas AS (
+            DELETE FROM alertas a
+            WHERE a.regla_id = %s AND a.evaluacion_id IS NULL {'AND a.entidad_id ' + acotar if acotar else ''}
+              AND a.entidad_id NOT IN (SELECT entidad_id FROM infracciones)
+        ),
+        guardadas AS (
+            INSERT INTO alertas (regla_id, entidad_id, valor)
+            SELECT %s, entidad_id, valor FROM infracciones
+            ON CONFLICT (regla_id, entidad_id) WHERE evaluacion_id IS NULL DO UPDATE SET valor = EXCLUDED.valor
+            RETURNING (xmax = 0) as nueva
+        )
+        SELECT COUNT(*) FILTER (WHERE nueva) FROM guardadas
+    """, [ventana_dias] + params_acotar + [umbral, regla_id] + params_acotar + [regla_id])
+    return cur.fetchone()[0]
+
+def evaluar_reglas_riesgo(completo=False, conectar=None, cache=None):
+    # Aplica las reglas activas a las evaluaciones nuevas. Devuelve {regla_id: alertas nuevas},
+    # o None si otro proceso está evaluando en este momento. El hilo en segundo plano pasa la
+    # conexión y el cache ya resueltos: fuera de una sesión no puede usar st.cache_resource.
+    conectar = conectar or get_connection
+    with conectar() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_try_advisory_xact_lock(%s)", (ALERTAS_LOCK_ID,))
+        if not cur.fetchone()[0]:
+            cur.close()
+            return None
+        cur.execute("SELECT COALESCE(MAX(id), 0), CURRENT_DATE FROM evaluaciones")
+        tope, hoy = cur.fetchone()
+        cur.execute("""
+            SELECT id, nivel, metrica, comparacion, umbral, ventana_dias, ultimo_evaluacion_id, evaluada_el
+            FROM reglas_riesgo WHERE activa = TRUE ORDER BY id
+        """)
+        reglas = cur.fetchall()
+        
+        resultados = {}
+        for regla_id, nivel, metrica, comparacion, umbral, ventana_dias, desde, evaluada_el in reglas:
+            if comparacion not in COMPARACIONES_REGLA or nivel not in METRICAS_REGLA[metrica][0]:
+                continue
+            # Las reglas con ventana se reevalúan también cuando cambia el día, aunque no haya evaluaciones nuevas
+            ventana_al_dia = nivel == 'evaluacion' or evaluada_el == hoy
+            if desde >= tope and ventana_al_dia and not completo:
+                continue
+            if nivel == 'evaluacion':
+                resultados[regla_id] = _evaluar_regla_evaluacion(
+                    cur, regla_id, metrica, comparacion, umbral, desde, tope, completo or desde == 0
+                )
+            else:
+                resultados[regla_id] = _evaluar_regla_agregada(
+                    cur, regla_id, nivel, metrica, comparacion, umbral, ventana_dias, desde, tope, evaluada_el,
+                    completo or desde == 0 or evaluada_el is None
+                )
+            cur.execute(
+                "UPDATE reglas_riesgo SET ultimo_evaluacion_id = %s, evaluada_el = %s WHERE id = %s",
+                (tope, hoy, regla_id)
+            )
+        cur.close()
+    
+    if resultados:
+        (cache or get_cache_consultas()).invalidar(('alertas',))
+    return resultados
+
+def _bucle_evaluador_alertas(conectar, cache):
+    ultima_completa = time.monotonic()
+    while True:
+        completo = time.monotonic() - ultima_completa >= ALERTAS_PASADA_COMPLETA_SEGUNDOS
+        try:
+            if evaluar_reglas_riesgo(completo=completo, conectar=conectar, cache=cache) is not None and completo:
+                ultima_completa = time.monotonic()
+        except Exception:
+            logger.exception("Evaluador de alertas: falló la evaluación de reglas")
+        time.sleep(ALERTAS_INTERVALO_SEGUNDOS)
+
+# Un hilo por proceso de la app; con varios procesos el advisory lock evita evaluar en paralelo
+@st.cache_resource
+def iniciar_evaluador_alertas():
+    # Pool, semáforo y cache se resuelven acá, en el hilo de la sesión; el evaluador solo usa estas referencias
+    conectar = functools.partial(conexion_del_pool, get_pool(), get_semaforo_pool())
+    hilo = threading.Thread(
+        target=_bucle_evaluador_alertas, args=(conectar, get_cache_consultas()),
+        name="evaluador-alertas", daemon=True
+    )
+    hilo.start()
+    return hilo
+
+# Alertas de las reglas activas con nombres y contexto, listas para la tabla del reporte. El equipo
+# y el tipo filtran por la entidad; las fechas solo aplican a las alertas de evaluaciones (las
+# agregadas ya se calculan sobre la ventana de su regla).
+ALERTAS_MAX_FILAS = 10000
+
+@cache_consulta('alertas', 'reglas_riesgo', 'integrantes', 'kpis', 'equipos')
+def obtener_alertas(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None):
+    query = """
+        SELECT r.nivel,
+               CASE r.nivel WHEN 'equipo' THEN eq.nombre WHEN 'kpi' THEN k.nombre ELSE i.nombre END as nombre,
+               CASE r.nivel
+                   WHEN 'integrante' THEN eq.nombre
+                   WHEN 'evaluacion' THEN k.nombre || ' · ' || eq.nombre
+                   WHEN 'kpi' THEN k.tipo
+               END as contexto,
+               r.descripcion as regla,
+               r.metrica || ' ' || r.comparacion || ' ' || r.umbral as condicion,
+               a.valor::float8 as valor,
+               ABS(a.valor - r.umbral)::float8 as desvio,
+               a.fecha_evaluacion,
+               a.detectada
+        FROM alertas a
+        JOIN reglas_riesgo r ON r.id = a.regla_id AND r.activa = TRUE
+        LEFT JOIN evaluaciones e ON e.id = a.evaluacion_id
+        LEFT JOIN integrantes i ON r.nivel IN ('integrante', 'evaluacion') AND i.id = a.entidad_id
+        LEFT JOIN equipos eq ON eq.id = CASE WHEN r.nivel = 'equipo' THEN a.entidad_id ELSE i.equipo_id END
+        LEFT JOIN kpis k ON k.id = CASE WHEN r.nivel = 'kpi' THEN a.entidad_id ELSE e.kpi_id END
+        WHERE (i.id IS NULL OR i.activo) AND (eq.id IS NULL OR eq.activo) AND (k.id IS NULL OR k.activo)
+    """
     params = []
+    if fecha_inicio:
+        query += " AND (a.evaluacion_id IS NULL OR a.fecha_evaluacion >= %s)"
+        params.append(fecha_inicio)
+    if fecha_fin:
+        query += " AND (a.evaluacion_id IS NULL OR a.fecha_evaluacion <= %s)"
+        params.append(fecha_fin)
+    if equipo_id:
+        query += " AND (r.nivel = 'kpi' OR eq.id = %s)"
+        params.append(equipo_id)
+    if tipo_kpi:
+        query += " AND (r.nivel NOT IN ('kpi', 'evaluacion') OR k.tipo = %s)"
+        params.append(tipo_kpi)
+    query += " ORDER BY desvio DESC LIMIT %s"
+    params.append(ALERTAS_MAX_FILAS)
     
-    if solo_activos:
-        query += " AND activo = TRUE"
-    if tipo:
-        query += " AND tipo = %s"
-        params.append(tipo)
+    with get_connection() as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor)
+        cur.execute(query, params)
+        filas = cur.fetchall()
+        cur.close()
+    
+    alertas = pd.DataFrame(filas, columns=[
+        'nivel', 'nombre', 'contexto', 'regla', 'condicion', 'valor', 'desvio', 'fecha_evaluacion', 'detectada'
+    ])
+    alertas['nivel'] = etiquetar_categorias(alertas['nivel'], NIVELES_ALERTA)
+    return alertas
+
+# ==================== EXPORTACIÓN ====================
+# El historial se escribe por lotes directo al destino, sin cargarlo completo en memoria:
+# CSV con COPY TO STDOUT y Parquet leyendo de un cursor del lado del servidor.
+EXPORTACION_TAMANO_LOTE = 50000
+# La descarga desde la página arma el archivo en memoria (st.download_button no admite streaming):
+# por encima de este tamaño se indica usar `python app.py exportar`
+EXPORTACION_MAX_FILAS_PAGINA = 200000
+
+COLUMNAS_EXPORTACION = [
+    ('id', 'e.id'),
+    ('fecha_evaluacion', 'e.fecha_evaluacion'),
+    ('equipo_id', 'i.equipo_id'),
+    ('equipo', 'eq.nombre'),
+    ('integrante_id', 'e.integrante_id'),
+    ('integrante', 'i.nombre'),
+    ('kpi_id', 'e.kpi_id'),
+    ('kpi', 'k.nombre'),
+    ('kpi_tipo', 'k.tipo'),
+    ('calificacion', 'e.calificacion'),
+    ('valor_cuantitativo', 'e.valor_cuantitativo::float8'),
+    ('evaluador', 'e.evaluador'),
+    ('comentario', 'e.comentario'),
+]
+
+def _consulta_exportacion(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None):
+    columnas = ", ".join(f"{expresion} as {nombre}" for nombre, expresion in COLUMNAS_EXPORTACION)
+    query = f"""
+        SELECT {columnas}
+        FROM evaluaciones e
+        JOIN integrantes i ON e.integrante_id = i.id
+        JOIN kpis k ON e.kpi_id = k.id
+        JOIN equipos eq ON i.equipo_id = eq.id
+        WHERE 1=1
+    """
+    condiciones, params = _filtros_evaluaciones(fecha_inicio, fecha_fin, equipo_id, tipo_kpi)
+    query += condiciones + " ORDER BY e.fecha_evaluacion, e.id"
+    return query, params
+
+def _esquema_parquet_exportacion():
+    return pa.schema([
+        ('id', pa.int64()),
+        ('fecha_evaluacion', pa.date32()),
+        ('equipo_id', pa.int32()),
+        ('equipo', pa.string()),
+        ('integrante_id', pa.int32()),
+        ('integrante', pa.string()),
+        ('kpi_id', pa.int32()),
+        ('kpi', pa.string()),
+        ('kpi_tipo', pa.string()),
+        ('calificacion', pa.int8()),
+        ('valor_cuantitativo', pa.float64()),
+        ('evaluador', pa.string()),
+        ('comentario', pa.string()),
+    ])
+
+def exportar_evaluaciones(destino, formato='csv', fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None):
+    # destino: archivo de texto para CSV, ruta o archivo binario para Parquet. Devuelve filas escritas.
+    query, params = _consulta_exportacion(fecha_inicio, fecha_fin, equipo_id, tipo_kpi)
+    
+    with get_connection() as conn:
+        if formato == 'csv':
+            cur = conn.cursor()
+            cur.copy_expert(
+                f"COPY ({cur.mogrify(query, params).decode()}) TO STDOUT WITH (FORMAT csv, HEADER true)",
+                destino
+            )
+            filas = cur.rowcount
+            cur.close()
+            return filas
+        
+        if pa is None:
+            raise RuntimeError("La exportación a Parquet requiere pyarrow (pip install pyarrow)")
+        
+        esquema = _esquema_parquet_exportacion()
+        filas = 0
+        cur = conn.cursor(name='exportacion_evaluaciones')
+        cur.itersize = EXPORTACION_TAMANO_LOTE
+        cur.execute(query, params)
+        with pq.ParquetWriter(destino, esquema) as writer:
+            while True:
+                lote = cur.fetchmany(EXPORTACION_TAMANO_LOTE)
+                if not lote:
+                    break
+                columnas = list(zip(*lote))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(col, type=campo.type) for col, campo in zip(columnas, esquema)],
+                    schema=esquema
+                ))
+                filas += len(lote)
+        cur.close()
+        return filas
+
+# ==================== IMPORTACIÓN MASIVA ====================
+# Los archivos se cargan con COPY a una tabla temporal de staging, se validan y resuelven
+# nombres a IDs con sentencias sobre todo el lote, y solo las filas válidas pasan a las tablas.
+# Cada entidad define: columnas aceptadas, obligatorias, validaciones (condición SQL que marca
+# la fila como errónea), resoluciones de nombres (sentencia, columna resuelta, mensaje si falla)
+# y la inserción final.
+IMPORTACIONES = {
+    'equipos': {
+        'tabla': 'equipos',
+        'columnas': ['nombre', 'descripcion'],
+        'obligatorias': ['nombre'],
+        'resueltas': [],
+        'validaciones': [],
+        'resoluciones': [],
+        'insercion': """
+            INSERT INTO equipos (nombre, descripcion)
+            SELECT trim(nombre), descripcion
+            FROM staging_importacion WHERE error IS NULL ORDER BY fila
+        """,
+    },
+    'integrantes': {
+        'tabla': 'integrantes',
+        'columnas': ['nombre', 'rol', 'equipo', 'es_lider'],
+        'obligatorias': ['nombre', 'equipo'],
+        'resueltas': ['equipo_id'],
+        'validaciones': [
+            (
+                "COALESCE(lower(trim(es_lider)), '') NOT IN ('', 'true', 'false', 't', 'f', '1', '0', 'si', 'sí', 's', 'no', 'n', 'x')",
+                "es_lider debe ser sí/no"
+            ),
+        ],
+        'resoluciones': [
+            (
+                """
+                UPDATE staging_importacion s SET equipo_id = r.id
+                FROM (
+                    SELECT lower(nombre) as nombre, MIN(id) as id, COUNT(*) as coincidencias
+                    FROM equipos WHERE activo = TRUE GROUP BY 1
+                ) r
+                WHERE s.error IS NULL AND r.nombre = lower(trim(s.equipo)) AND r.coincidencias = 1
+                """,
+                'equipo_id',
+                "Equipo inexistente, inactivo o con nombre duplicado"
+            ),
+        ],
+        'insercion': """
+            INSERT INTO integrantes (nombre, rol, equipo_id, es_lider)
+            SELECT trim(nombre), rol, equipo_id,
+                   COALESCE(lower(trim(es_lider)), '') IN ('true', 't', '1', 'si', 'sí', 's', 'x')
+            FROM staging_importacion WHERE error IS NULL ORDER BY fila
+        """,
+    },
+    'kpis': {
+        'tabla': 'kpis',
+        'columnas': ['nombre', 'descripcion', 'tipo'],
+        'obligatorias': ['nombre', 'tipo'],
+        'resueltas': [],
+        'validaciones': [
+            (
+                "lower(trim(tipo)) NOT IN ('cualitativo', 'cuantitativo')",
+                "tipo debe ser 'cualitativo' o 'cuantitativo'"
+            ),
+        ],
+        'resoluciones': [],
+        'insercion': """
+            INSERT INTO kpis (nombre, descripcion, tipo)
+            SELECT trim(nombre), descripcion, lower(trim(tipo))
+            FROM staging_importacion WHERE error IS NULL ORDER BY fila
+        """,
+    },
+    'evaluaciones': {
+        'tabla': 'evaluaciones',
+        'columnas': [
+            'integrante', 'equipo', 'kpi', 'calificacion', 'valor_cuantitativo',
+            'fecha_evaluacion', 'evaluador', 'comentario'
+        ],
+        'obligatorias': ['integrante', 'equipo', 'kpi', 'calificacion', 'fecha_evaluacion'],
+        'resueltas': ['integrante_id', 'kpi_id'],
+        'validaciones': [
+            ("trim(calificacion) !~ '^[1-4]$'", "calificacion debe estar entre 1 y 4"),
+            ("NOT pg_temp.es_fecha(trim(fecha_evaluacion))", "fecha_evaluacion inválida (usar AAAA-MM-DD)"),
+            (
+                "NULLIF(trim(valor_cuantitativo), '') IS NOT NULL AND NOT pg_temp.es_numero(trim(valor_cuantitativo))",
+                "valor_cuantitativo debe ser numérico"
+            ),
+        ],
+        'resoluciones': [
+            (
+                """
+                UPDATE staging_importacion s SET integrante_id = r.id
+                FROM (
+                    SELECT lower(i.nombre) as nombre, lower(eq.nombre) as equipo, MIN(i.id) as id, COUNT(*) as coincidencias
+                    FROM integrantes i
+                    JOIN equipos eq ON i.equipo_id = eq.id
+                    WHERE i.activo = TRUE
+                    GROUP BY 1, 2
+                ) r
+                WHERE s.error IS NULL AND r.nombre = lower(trim(s.integrante))
+                  AND r.equipo = lower(trim(s.equipo)) AND r.coincidencias = 1
+                """,
+                'integrante_id',
+                "Integrante inexistente en el equipo indicado, inactivo o con nombre duplicado"
+            ),
+            (
+                """
+                UPDATE staging_importacion s SET kpi_id = r.id
+                FROM (
+                    SELECT lower(nombre) as nombre, MIN(id) as id, COUNT(*) as coincidencias
+                    FROM kpis WHERE activo = TRUE GROUP BY 1
+                ) r
+                WHERE s.error IS NULL AND r.nombre = lower(trim(s.kpi)) AND r.coincidencias = 1
+                """,
+                'kpi_id',
+                "KPI inexistente, inactivo o con nombre duplicado"
+            ),
+        ],
+        'insercion': """
+            INSERT INTO evaluaciones
+                (integrante_id, kpi_id, calificacion, valor_cuantitativo, fecha_evaluacion, evaluador, comentario)
+            SELECT integrante_id, kpi_id, trim(calificacion)::int,
+                   NULLIF(trim(valor_cuantitativo), '')::numeric, trim(fecha_evaluacion)::date,
+                   evaluador, comentario
+            FROM staging_importacion WHERE error IS NULL ORDER BY fila
+            RETURNING id
+        """,
+        'resumenes': True,
+    },
+}
+
+# Máximo de errores por fila que se devuelven en el resultado (el conteo total es siempre exacto)
+IMPORTACION_MAX_ERRORES = 1000
+
+def _crear_funciones_validacion(cur):
+    # Conversiones seguras: devuelven FALSE en lugar de abortar la transacción
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION pg_temp.es_fecha(valor TEXT) RETURNS BOOLEAN AS $$
+        BEGIN
+            PERFORM valor::date;
+            RETURN TRUE;
+        EXCEPTION WHEN others THEN
+            RETURN FALSE;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    cur.execute("""
+        CREATE OR REPLACE FUNCTION pg_temp.es_numero(valor TEXT) RETURNS BOOLEAN AS $$
+        BEGIN
+            PERFORM valor::numeric(10,2);
+            RETURN TRUE;
+        EXCEPTION WHEN others THEN
+            RETURN FALSE;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+
+def _excel_a_csv(archivo):
+    # COPY solo lee texto: la hoja se convierte a CSV en memoria (requiere openpyxl)
+    df = pd.read_excel(archivo, dtype=str)
+    salida = io.StringIO()
+    df.to_csv(salida, index=False)
+    salida.seek(0)
+    return salida
+
+class _CsvNumerado:
+    # Re-emite el CSV para COPY anteponiendo a cada registro su línea de inicio en el archivo:
+    # un campo entre comillas puede ocupar varias líneas, así que el orden de fila no sirve.
+    # Las filas con otra cantidad de campos que el encabezado se completan o recortan y llevan
+    # ya su error, para que COPY no aborte toda la importación.
+    def __init__(self, archivo, lineas_previas, columnas):
+        self._lector = csv.reader(archivo)
+        self._lineas_previas = lineas_previas
+        self._columnas = columnas
+        self._salida = io.StringIO()
+        self._escritor = csv.writer(self._salida, lineterminator='\n')
+    
+    def read(self, tamano=-1):
+        while tamano is None or tamano < 0 or self._salida.tell() < tamano:
+            linea = self._lineas_previas + self._lector.line_num + 1
+            fila = next(self._lector, None)
+            if fila is None:
+                break
+            if not fila:
+                continue
+            error = None
+            if len(fila) != self._columnas:
+                error = f"La fila tiene {len(fila)} campos y el encabezado {self._columnas}"
+                fila = (fila + [None] * self._columnas)[:self._columnas]
+            self._escritor.writerow([linea, error] + fila)
+        datos = self._salida.getvalue()
+        self._salida.seek(0)
+        self._salida.truncate()
+        return datos
+
+def importar_datos(entidad, archivo, formato='csv', validar_solo=False, estricto=True):
+    # archivo: objeto de texto con CSV (con encabezado) o binario con Excel si formato == 'excel'.
+    # Con estricto=True (por defecto, igual que en la página) no se inserta nada si alguna fila
+    # tiene errores; con estricto=False se insertan las filas válidas.
+    config = IMPORTACIONES[entidad]
+    if formato == 'excel':
+        archivo = _excel_a_csv(archivo)
+    
+    encabezado = [c.strip().lower() for c in next(csv.reader([archivo.readline()]), [])]
+    desconocidas = [c for c in encabezado if c not in config['columnas']]
+    faltantes = [c for c in config['obligatorias'] if c not in encabezado]
+    if desconocidas or faltantes or len(set(encabezado)) != len(encabezado):
+        raise ValueError(
+            f"Encabezado inválido. Columnas aceptadas: {', '.join(config['columnas'])}. "
+            f"Obligatorias: {', '.join(config['obligatorias'])}."
+        )
+    
+    columnas_staging = [f"{c} TEXT" for c in config['columnas']] + [f"{c} INTEGER" for c in config['resueltas']]
+    
+    with get_connection() as conn:
+        cur = conn.cursor()
+        _crear_funciones_validacion(cur)
+        cur.execute(f"""
+            CREATE TEMP TABLE staging_importacion (
+                fila BIGSERIAL,
+                linea INTEGER,
+                {', '.join(columnas_staging)},
+                error TEXT
+            ) ON COMMIT DROP
+        """)
+        cur.copy_expert(
+            f"COPY staging_importacion (linea, error, {', '.join(encabezado)}) FROM STDIN WITH (FORMAT csv)",
+            _CsvNumerado(archivo, lineas_previas=1, columnas=len(encabezado))
+        )
+        
+        for columna in config['obligatorias']:
+            cur.execute(
+                f"UPDATE staging_importacion SET error = %s WHERE error IS NULL AND COALESCE(trim({columna}), '') = ''",
+                (f"{columna} es obligatorio",)
+            )
+        for condicion, mensaje in config['validaciones']:
+            cur.execute(
+                f"UPDATE staging_importacion SET error = %s WHERE error IS NULL AND ({condicion})",
+                (mensaje,)
+            )
+        for sentencia, columna, mensaje in config['resoluciones']:
+            cur.execute(sentencia)
+            cur.execute(
+                f"UPDATE staging_importacion SET error = %s WHERE error IS NULL AND {columna} IS NULL",
+                (mensaje,)
+            )
+        
+        cur.execute("SELECT COUNT(*), COUNT(error) FROM staging_importacion")
+        total, con_error = cur.fetchone()
+        cur.execute(
+            "SELECT linea, error FROM staging_importacion WHERE error IS NOT NULL ORDER BY fila LIMIT %s",
+            (IMPORTACION_MAX_ERRORES,)
+        )
+        errores = cur.fetchall()
+        
+        insertadas = 0
+        if not validar_solo and not (estricto and con_error):
+            cur.execute(config['insercion'])
+            insertadas = cur.rowcount
+            if config.get('resumenes'):
+                acumular_en_resumenes(cur, [r[0] for r in cur.fetchall()])
+        cur.close()
+    
+    if insertadas:
+        invalidar_cache(config['tabla'])
+    
+    return {
+        'total': total,
+        'insertadas': insertadas,
+        'con_error': con_error,
+        'errores': errores
+    }
+
+# Mapeo de calificaciones (de MEJOR a PEOR)
+CALIFICACIONES = {
+    1: "⭐ Excelente",
+    2: "👍 Bueno", 
+    3: "⚠️ Regular",
+    4: "❌ Deficiente"
+}
+
+TIPOS_KPI = {
+    'cualitativo': '🎭 Cualitativo (Soft Skills)',
+    'cuantitativo': '📊 Cuantitativo (Objetivos)'
+}
+
+# ==================== PUNTUACIÓN Y ETIQUETAS ====================
+# Todas las funciones operan sobre columnas completas (Series/arrays), sin callbacks por fila.
+
+# Etiquetas cortas de tipo de KPI usadas en los gráficos
+TIPOS_KPI_CORTO = {'cualitativo': 'Soft Skills', 'cuantitativo': 'Objetivos'}
+TIPOS_KPI_PLURAL = {'cualitativo': 'Cualitativos', 'cuantitativo': 'Cuantitativos'}
+TIPOS_KPI_ICONO = {'cualitativo': '🎭 Cualitativo', 'cuantitativo': '📊 Cuantitativo'}
+
+# Bandas de desempeño sobre la puntuación invertida: (mínimo, etiqueta, color)
+BANDAS_DESEMPENO = [
+    (3.5, '⭐ Excelente', 'green'),
+    (2.5, '👍 Bueno', 'lightgreen'),
+    (1.5, '⚠️ Regular', 'orange'),
+]
+DESEMPENO_DEFECTO = ('❌ Deficiente', 'red')
+
+# Función para calcular puntuación invertida (mayor = mejor)
+def calcular_puntuacion_invertida(calificacion):
+    return 5 - calificacion
+
+def _condiciones_desempeno(puntuaciones):
+    valores = np.asarray(puntuaciones, dtype=float)
+    return [valores >= minimo for minimo, _, _ in BANDAS_DESEMPENO]
+
+def etiquetar_desempeno(puntuaciones):
+    return np.select(
+        _condiciones_desempeno(puntuaciones),
+        [etiqueta for _, etiqueta, _ in BANDAS_DESEMPENO],
+        default=DESEMPENO_DEFECTO[0]
+    )
+
+def colores_desempeno(puntuaciones):
+    return np.select(
+        _condiciones_desempeno(puntuaciones),
+        [color for _, _, color in BANDAS_DESEMPENO],
+        default=DESEMPENO_DEFECTO[1]
+    )
+
+def etiquetar_categorias(serie, etiquetas):
+    # Mapea sobre las categorías únicas en lugar de sobre cada fila
+    return serie.astype('category').cat.rename_categories(
+        lambda valor: etiquetas.get(valor, valor)
+    ).astype(object)
+
+def formatear_numeros(serie, formato, vacio="-"):
+    # formato estilo printf, p. ej. '%.2f' o '%.1f%%'
+    valores = pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float)
+    texto = np.char.mod(formato, np.nan_to_num(valores))
+    return pd.Series(np.where(np.isnan(valores), vacio, texto), index=serie.index)
+
+def etiquetar_booleano(serie, si, no):
+    return np.where(serie.fillna(False).astype(bool), si, no)
+
+# ==================== VISTAS DEL REPORTE ====================
+# Tablas derivadas listas para graficar (rankings, matriz, tendencias, riesgos). Se calculan una vez
+# por combinación de filtros y las comparten todas las pestañas, así que un rerun por cambiar de
+# pestaña o abrir un expander no repite ningún cálculo. Las pestañas no deben modificarlas in-place.
+
+# Máximo de integrantes en riesgo que se pueden analizar en detalle
+RIESGO_MAX_DETALLE = 100
+
+# Las tendencias se agrupan en períodos según el rango de fechas (hasta ~60 puntos por serie) y
+# solo se grafican las series con más evaluaciones; el resto se suma en "Otros".
+GRANULARIDADES_TENDENCIA = [
+    # (días máximos del rango, frecuencia pandas, nombre)
+    (62, 'D', 'día'),
+    (400, 'W', 'semana'),
+    (1900, 'M', 'mes'),
+    (None, 'Q', 'trimestre'),
+]
+TENDENCIA_MAX_SERIES = 10
+
+def granularidad_tendencia(fechas):
+    fechas = pd.to_datetime(fechas)
+    dias = (fechas.max() - fechas.min()).days if len(fechas) else 0
+    for maximo, frecuencia, nombre in GRANULARIDADES_TENDENCIA:
+        if maximo is None or dias <= maximo:
+            return frecuencia, nombre
+
+# Id de la serie que agrupa a las que no se grafican por separado
+SERIE_OTROS_ID = -1
+
+def limitar_series(df, serie, etiqueta, maximo=TENDENCIA_MAX_SERIES):
+    # Deja las 'maximo' series (por id) con más evaluaciones y suma el resto en "Otros (n)"
+    totales = df.groupby(serie, observed=True)['cantidad'].sum()
+    if len(totales) <= maximo:
+        return df
+    principales = totales.nlargest(maximo).index
+    df = df.copy()
+    df[etiqueta] = df[etiqueta].astype(object)
+    otros = ~df[serie].isin(principales)
+    df.loc[otros, serie] = SERIE_OTROS_ID
+    df.loc[otros, etiqueta] = f"Otros ({len(totales) - maximo})"
+    return df
+
+def agrupar_tendencia(df, frecuencia, serie=None, etiqueta=None):
+    # Suma las métricas por período (y serie) y recalcula los promedios. La serie se agrupa por su
+    # id; la etiqueta (el nombre) solo acompaña, así dos personas con el mismo nombre no se mezclan.
+    df = df.assign(
+        fecha_evaluacion=pd.to_datetime(df['fecha_evaluacion']).dt.to_period(frecuencia).dt.start_time
+    )
+    claves = ['fecha_evaluacion'] + [col for col in (serie, etiqueta) if col]
+    agrupado = df.groupby(claves, observed=True, as_index=False)[METRICAS_AGREGACION].sum()
+    return agregar_promedios(agrupado).sort_values(claves, ignore_index=True)
+
+@cache_consulta('evaluaciones', 'integrantes', 'kpis', 'equipos')
+def obtener_vistas_reporte(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None):
+    agregados = obtener_agregados_reporte(
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        equipo_id=equipo_id,
+        tipo_kpi=tipo_kpi
+    )
+    vistas = dict(agregados)
+    if agregados['total']['cantidad'].sum() == 0:
+        return vistas
+    
+    vistas['dist_calificacion'] = agregados['calificacion'].set_index('calificacion')['cantidad']
+    vistas['resumen_tipo'] = agregados['tipo'].set_index('kpi_tipo')
+    
+    integrantes = agregados['integrante'].sort_values('puntuacion_invertida', ascending=False, kind='stable').reset_index(drop=True)
+    integrantes['posicion'] = np.arange(1, len(integrantes) + 1)
+    integrantes['posicion_equipo'] = integrantes.groupby('equipo_id').cumcount() + 1
+    integrantes['desempeno'] = etiquetar_desempeno(integrantes['puntuacion_invertida'])
+    integrantes['color'] = colores_desempeno(integrantes['puntuacion_invertida'])
+    vistas['ranking_integrantes'] = integrantes
+    
+    integrantes_por_equipo = integrantes.groupby('equipo_id').size().rename('integrantes')
+    vistas['ranking_equipos'] = (
+        agregados['equipo'].join(integrantes_por_equipo, on='equipo_id')
+        .sort_values('puntuacion_invertida', ascending=False, kind='stable')
+        .reset_index(drop=True)
+    )
+    
+    kpis = agregados['kpi'].sort_values('puntuacion_invertida', ascending=False, kind='stable').reset_index(drop=True)
+    kpis['tipo_texto'] = etiquetar_categorias(kpis['kpi_tipo'], TIPOS_KPI_ICONO)
+    vistas['ranking_kpis'] = kpis
+    vistas['cumplimiento_kpis'] = (
+        kpis.loc[kpis['kpi_tipo'] == 'cuantitativo', ['kpi_nombre', 'valor_promedio']]
+        .sort_values('valor_promedio', ascending=False)
+    )
+    
+    equipo_tipo = agregados['equipo_tipo'].copy()
+    equipo_tipo['tipo_texto'] = etiquetar_categorias(equipo_tipo['kpi_tipo'], TIPOS_KPI_PLURAL)
+    vistas['equipo_tipo'] = equipo_tipo
+    
+    integrante_tipo = agregados['integrante_tipo'].copy()
+    integrante_tipo['tipo_texto'] = etiquetar_categorias(integrante_tipo['kpi_tipo'], TIPOS_KPI_CORTO)
+    vistas['integrante_tipo'] = integrante_tipo
+    
+    integrante_calificacion = agregados['integrante_calificacion'].copy()
+    integrante_calificacion['calificacion_texto'] = etiquetar_categorias(integrante_calificacion['calificacion'], CALIFICACIONES)
+    vistas['integrante_calificacion'] = integrante_calificacion
+    
+    # Matrices KPI × equipo y KPI × integrante en formato largo (solo las celdas con evaluaciones),
+    # ordenadas por equipo para graficar un equipo por vez sin armar la matriz densa
+    columnas_celda = ['equipo_id', 'equipo_nombre', 'kpi_nombre', 'puntuacion_invertida', 'cantidad']
+    vistas['matriz_kpi_equipo'] = (
+        agregados['kpi_equipo'].sort_values(['equipo_nombre', 'kpi_nombre'], kind='stable')[columnas_celda]
+        .reset_index(drop=True)
+    )
+    vistas['matriz_kpi_integrante'] = (
+        agregados['kpi_integrante'].sort_values(['equipo_id', 'integrante', 'kpi_nombre'], kind='stable')
+        [['integrante'] + columnas_celda]
+        .reset_index(drop=True)
+    )
+    
+    frecuencia, vistas['granularidad_tendencia'] = granularidad_tendencia(agregados['fecha']['fecha_evaluacion'])
+    vistas['tendencia'] = agrupar_tendencia(agregados['fecha'], frecuencia)
+    vistas['tendencia_equipo'] = agrupar_tendencia(
+        limitar_series(agregados['fecha_equipo'], 'equipo_id', 'equipo_nombre'), frecuencia, 'equipo_id', 'equipo_nombre'
+    )
+    vistas['tendencia_integrante'] = agrupar_tendencia(
+        limitar_series(agregados['fecha_integrante'], 'integrante_id', 'integrante'), frecuencia, 'integrante_id', 'integrante'
+    )
+    tendencia_tipo = agregados['fecha_tipo'].assign(
+        tipo_texto=etiquetar_categorias(agregados['fecha_tipo']['kpi_tipo'], TIPOS_KPI_CORTO)
+    )
+    vistas['tendencia_tipo'] = agrupar_tendencia(tendencia_tipo, frecuencia, 'tipo_texto')
+    
+    # Riesgos (ordenados de peor a mejor)
+    for tipo in TIPOS_KPI:
+        vistas[f'kpis_bajas_{tipo}'] = (
+            kpis[(kpis['kpi_tipo'] == tipo) & (kpis['bajas'] > 0)]
+            .sort_values('bajas', ascending=False)
+            .head(5)
+        )
+    vistas['peores_integrantes'] = integrantes.iloc[::-1].head(RIESGO_MAX_DETALLE).reset_index(drop=True)
+    return vistas
+
+@cache_consulta('evaluaciones', 'integrantes', 'kpis', 'equipos')
+def obtener_detalle_integrantes(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None, integrante_ids=()):
+    # Evaluaciones de las personas a detallar ordenadas por (integrante_id, fecha), con el rango de
+    # filas de cada una: detalle_integrante() las devuelve con un slice, sin recorrer todo el frame.
+    df = cargar_evaluaciones_df(
+        fecha_inicio=fecha_inicio,
+        fecha_fin=fecha_fin,
+        equipo_id=equipo_id,
+        tipo_kpi=tipo_kpi,
+        integrante_ids=integrante_ids
+    )
+    df = df.assign(
+        puntuacion_invertida=calcular_puntuacion_invertida(df['calificacion'].astype('float32')),
+        baja=df['calificacion'].ge(3).fillna(False).astype(bool)
+    ).sort_values(['integrante_id', 'fecha_evaluacion'], kind='stable', ignore_index=True)
+    
+    ids, inicios, cantidades = np.unique(df['integrante_id'].to_numpy(), return_index=True, return_counts=True)
+    rangos = {int(i): (int(inicio), int(inicio + cantidad)) for i, inicio, cantidad in zip(ids, inicios, cantidades)}
+    
+    bajas = df[df['baja']]
+    resumen = pd.DataFrame({
+        'evaluaciones': df.groupby('integrante_id').size(),
+        'bajas_cualitativas': bajas[bajas['kpi_tipo'] == 'cualitativo'].groupby('integrante_id').size(),
+        'bajas_cuantitativas': bajas[bajas['kpi_tipo'] == 'cuantitativo'].groupby('integrante_id').size(),
+        'ultima_evaluacion': df.groupby('integrante_id')['fecha_evaluacion'].max(),
+    })
+    conteos = ['evaluaciones', 'bajas_cualitativas', 'bajas_cuantitativas']
+    resumen[conteos] = resumen[conteos].fillna(0).astype(int)
+    return {'evaluaciones': df, 'rangos': rangos, 'resumen': resumen}
+
+def detalle_integrante(detalle, integrante_id):
+    inicio, fin = detalle['rangos'].get(int(integrante_id), (0, 0))
+    return detalle['evaluaciones'].iloc[inicio:fin]
+
+def tabla_problemas(evaluaciones, comentarios):
+    return pd.DataFrame({
+        'fecha_evaluacion': evaluaciones['fecha_evaluacion'],
+        'kpi_nombre': evaluaciones['kpi_nombre'],
+        'calificacion': etiquetar_categorias(evaluaciones['calificacion'], CALIFICACIONES),
+        'valor_cuantitativo': formatear_numeros(evaluaciones['valor_cuantitativo'], '%.1f%%'),
+        'comentario': evaluaciones['id'].map(comentarios),
+    })
+
+# ==================== GRÁFICOS ====================
+# Los gráficos por persona acotan lo que se envía al navegador: con muchos integrantes se grafican
+# solo los extremos o una muestra del ranking con bandas de percentil, en WebGL.
+RANKING_MAX_BARRAS = 60
+RANKING_EXTREMOS_DEFECTO = 15
+RANKING_MAX_PUNTOS = 2000
+RANKING_PERCENTILES = [10, 25, 50, 75, 90]
+ALTURA_MAX_GRAFICO = 1600
+# KPIs por página en las matrices de calor (con más, el eje de KPIs se pagina)
+MATRIZ_MAX_KPIS = 60
+
+def _altura_barras(filas):
+    return min(max(400, filas * 25), ALTURA_MAX_GRAFICO)
+
+def seleccionar_extremos(ranking, n):
+    # Los n primeros y los n últimos del ranking (sin repetir si se solapan)
+    if len(ranking) <= 2 * n:
+        return ranking
+    return pd.concat([ranking.head(n), ranking.tail(n)])
+
+def acotar_ranking(ranking, columna, n=RANKING_EXTREMOS_DEFECTO, maximo=RANKING_MAX_BARRAS, etiquetas_otros=None):
+    # Ranking ya ordenado de mejor a peor. Si supera 'maximo' filas quedan los n mejores, una fila
+    # "Otros (k)" con el promedio del resto (recalculado desde las sumas) y los n peores.
+    if len(ranking) <= maximo:
+        return ranking
+    resto = ranking.iloc[n:-n]
+    otros = agregar_promedios(resto[METRICAS_AGREGACION].sum().to_frame().T.astype(float))
+    otros[columna] = f"Otros ({len(resto)})"
+    for col, valor in (etiquetas_otros or {}).items():
+        otros[col] = valor
+    return pd.concat([ranking.head(n), otros, ranking.tail(n)], ignore_index=True)
+
+def agrupar_otros(df, clave, visibles, columna, etiqueta, por):
+    # Suma en una fila "etiqueta" por cada combinación de 'por' las filas cuya clave no está en visibles
+    visible = df[clave].isin(visibles)
+    if visible.all():
+        return df
+    otros = df[~visible].groupby(por, as_index=False, observed=True)[METRICAS_AGREGACION].sum()
+    otros[columna] = etiqueta
+    return pd.concat([df[visible], agregar_promedios(otros)], ignore_index=True)
+
+def figura_ranking_barras(ranking, titulo='Ranking de Desempeño (mayor puntuación = mejor)'):
+    etiquetas = '#' + ranking['posicion'].astype(str) + ' ' + ranking['integrante'].astype(str) + ' (' + ranking['equipo_nombre'].astype(str) + ')'
+    fig = go.Figure(go.Bar(
+        y=etiquetas,
+        x=ranking['puntuacion_invertida'],
+        orientation='h',
+        text=formatear_numeros(ranking['puntuacion_invertida'], '%.2f'),
+        textposition='outside',
+        marker_color=ranking['color'],
+        hovertemplate='<b>%{y}</b><br>Puntuación: %{x:.2f}<extra></extra>'
+    ))
+    fig.update_layout(
+        title=titulo,
+        xaxis_title='Puntuación (mayor es mejor)',
+        yaxis_title='',
+        yaxis=dict(autorange='reversed'),
+        height=_altura_barras(len(ranking)),
+        showlegend=False
+    )
+    return fig
+
+def figura_ranking_percentiles(ranking):
+    # Una muestra uniforme del ranking (siempre con los extremos) y líneas de percentil
+    muestra = ranking
+    if len(ranking) > RANKING_MAX_PUNTOS:
+        posiciones = np.unique(np.linspace(0, len(ranking) - 1, RANKING_MAX_PUNTOS).astype(int))
+        muestra = ranking.iloc[posiciones]
+    
+    fig = go.Figure(go.Scattergl(
+        x=muestra['posicion'],
+        y=muestra['puntuacion_invertida'],
+        mode='markers',
+        marker=dict(color=muestra['color'], size=5),
+        text=muestra['integrante'].astype(str) + ' (' + muestra['equipo_nombre'].astype(str) + ')',
+        hovertemplate='<b>%{text}</b><br>Posición: %{x}<br>Puntuación: %{y:.2f}<extra></extra>'
+    ))
+    valores = np.percentile(ranking['puntuacion_invertida'].to_numpy(dtype=float), RANKING_PERCENTILES)
+    for percentil, valor in zip(RANKING_PERCENTILES, valores):
+        fig.add_hline(
+            y=valor,
+            line_dash='dot',
+            line_color='gray',
+            annotation_text=f'P{percentil}: {valor:.2f}',
+            annotation_position='right'
+        )
+    fig.update_layout(
+        title=f'Distribución del Ranking ({len(ranking)} integrantes)',
+        xaxis_title='Posición',
+        yaxis_title='Puntuación (mayor es mejor)',
+        yaxis=dict(range=[0.5, 4.5]),
+        height=500,
+        showlegend=False
+    )
+    return fig
+
+def figura_tendencia(df, titulo, serie=None, etiqueta=None):
+    # Una traza WebGL por serie (ya limitadas y agrupadas por período en las vistas); 'etiqueta' es
+    # la columna con el nombre a mostrar cuando la serie es un id
+    fig = go.Figure()
+    grupos = df.groupby(serie, observed=True, sort=False) if serie else [(None, df)]
+    for clave, datos in grupos:
+        nombre = datos[etiqueta].iloc[0] if etiqueta else clave
+        fig.add_trace(go.Scattergl(
+            x=datos['fecha_evaluacion'],
+            y=datos['puntuacion_invertida'],
+            mode='lines+markers',
+            name=str(nombre) if serie else 'Promedio',
+            customdata=datos['cantidad'],
+            hovertemplate='%{x|%Y-%m-%d}<br>Puntuación: %{y:.2f}<br>Evaluaciones: %{customdata}<extra>%{fullData.name}</extra>'
+        ))
+    fig.update_layout(title=titulo, showlegend=serie is not None)
+    fig.update_yaxes(range=[0.5, 4.5], title='Puntuación Promedio')
+    fig.update_xaxes(title='Fecha')
+    return fig
+
+def figura_matriz(celdas, columna, titulo, etiqueta):
+    # Heatmap disperso: x, y, z en formato largo, el navegador solo recibe las celdas con evaluaciones
+    fig = go.Figure(go.Heatmap(
+        x=celdas[columna],
+        y=celdas['kpi_nombre'],
+        z=celdas['puntuacion_invertida'].round(2),
+        zmin=1,
+        zmax=4,
+        colorscale=[[0, 'red'], [1 / 3, 'orange'], [2 / 3, 'lightgreen'], [1, 'green']],
+        colorbar=dict(title='Puntuación'),
+        hoverongaps=False,
+        hovertemplate=f'{etiqueta}: %{{x}}<br>KPI: %{{y}}<br>Puntuación: %{{z:.2f}}<extra></extra>'
+    ))
+    fig.update_layout(title=titulo, height=min(max(400, celdas['kpi_nombre'].nunique() * 22), ALTURA_MAX_GRAFICO))
+    fig.update_xaxes(type='category', categoryorder='array', categoryarray=celdas[columna].unique(), title=etiqueta)
+    fig.update_yaxes(type='category', categoryorder='category descending', title='KPI')
+    return fig
+
+def buscar_en_ranking(ranking, texto):
+    coincide = ranking['integrante'].astype(str).str.contains(texto, case=False, regex=False)
+    encontrados = ranking[coincide].copy()
+    encontrados['percentil'] = (100 * (1 - (encontrados['posicion'] - 1) / len(ranking))).round(0)
+    return encontrados
+
+# ==================== CACHÉ DE FIGURAS ====================
+# Las figuras de Plotly se guardan por (nombre del gráfico, huella de los datos, parámetros), así un
+# rerun que no cambia los datos reutiliza la figura en lugar de reconstruirla (st.plotly_chart la
+# serializa igual en cada render). Se comparten entre sesiones y se desalojan por LRU cuando su
+# tamaño estimado supera FIGURAS_MAX_BYTES.
+FIGURAS_MAX_BYTES = 64 * 1024 * 1024
+# Atributos de cada traza que llevan los datos; el resto de la figura se cuenta como un fijo
+ATRIBUTOS_DATOS_FIGURA = ('x', 'y', 'z', 'text', 'customdata', 'labels', 'values')
+BYTES_FIJOS_TRAZA = 4096
+BYTES_POR_ELEMENTO_OBJETO = 32
+
+def _bytes_arreglo(valor):
+    if isinstance(valor, np.ndarray):
+        return valor.size * BYTES_POR_ELEMENTO_OBJETO if valor.dtype == object else valor.nbytes
+    if isinstance(valor, (list, tuple)):
+        return len(valor) * BYTES_POR_ELEMENTO_OBJETO
+    if isinstance(valor, str):
+        return len(valor)
+    return 0
+
+def tamano_figura(figura):
+    # Estimación de memoria a partir de los arreglos de datos de las trazas, sin serializar la figura
+    return sum(
+        BYTES_FIJOS_TRAZA + sum(_bytes_arreglo(getattr(traza, atributo, None)) for atributo in ATRIBUTOS_DATOS_FIGURA)
+        for traza in figura.data
+    ) + BYTES_FIJOS_TRAZA
+
+class CacheFiguras:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._figuras = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._figuras.get(clave)
+            if entrada is None:
+                return None
+            self._figuras.move_to_end(clave)
+            return entrada[0]
+    
+    def guardar(self, clave, figura):
+        tamano = tamano_figura(figura)
+        if tamano > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._figuras.pop(clave, None)
+            if anterior is not None:
+                self.bytes -= anterior[1]
+            self._figuras[clave] = (figura, tamano)
+            self.bytes += tamano
+            while self.bytes > self.max_bytes:
+                _, (_, liberado) = self._figuras.popitem(last=False)
+                self.bytes -= liberado
+
+@st.cache_resource
+def get_cache_figuras():
+    return CacheFiguras(FIGURAS_MAX_BYTES)
+
+def huella_datos(datos):
+    if isinstance(datos, (pd.DataFrame, pd.Series)):
+        huella = hashlib.sha1(pd.util.hash_pandas_object(datos, index=True).to_numpy().tobytes())
+        columnas = list(datos.columns) if isinstance(datos, pd.DataFrame) else [datos.name]
+        huella.update(repr(columnas).encode())
+        return huella.hexdigest()
+    return _clave_hashable(datos)
+
+def figura_cacheada(nombre, datos, *parametros, construir):
+    # Las figuras cacheadas se comparten: quien las use no debe modificarlas
+    clave = (nombre, huella_datos(datos), _clave_hashable(parametros))
+    cache = get_cache_figuras()
+    figura = cache.obtener(clave)
+    if figura is None:
+        figura = construir()
+        cache.guardar(clave, figura)
+    return figura
+
+# Tabla de alertas: clave -> (etiqueta, columna, ascendente)
+ALERTAS_POR_PAGINA = 25
+ORDENES_ALERTA = {
+    'desvio': ("Mayor desvío del umbral", 'desvio', False),
+    'detectada': ("Más recientes", 'detectada', False),
+    'nombre': ("Nombre", 'nombre', True),
+}
+
+# Columnas de la tabla de evaluaciones bajas del análisis detallado
+COLUMNAS_PROBLEMAS = {
+    "fecha_evaluacion": st.column_config.DateColumn("Fecha", format="YYYY-MM-DD"),
+    "kpi_nombre": "KPI",
+    "calificacion": "Calificación",
+    "valor_cuantitativo": "Cumplimiento",
+    "comentario": "💬 Comentario",
+}
+
+# Secciones de la página de reportes (clave: etiqueta)
+SECCIONES_REPORTE = {
+    'ranking': "🏆 Ranking General",
+    'equipo': "🏢 Por Equipo",
+    'integrante': "👥 Por Integrante",
+    'kpi': "📋 Por KPI",
+    'historico': "📅 Histórico",
+    'riesgos': "⚠️ Análisis de Riesgos",
+}
+
+# ==================== PAGINACIÓN ====================
+# El estado de cada paginador guarda la pila de claves de inicio de las páginas visitadas;
+# se reinicia cuando cambian los filtros.
+def estado_paginacion(clave, filtros):
+    estado = st.session_state.get(clave)
+    if estado is None or estado['filtros'] != filtros:
+        estado = {'filtros': filtros, 'inicios': [None]}
+        st.session_state[clave] = estado
+    return estado
+
+def controles_paginacion(clave, estado, siguiente):
+    col_ant, col_pag, col_sig = st.columns([1, 2, 1])
+    with col_ant:
+        if st.button("⬅️ Anterior", key=f"{clave}_anterior", disabled=len(estado['inicios']) == 1, use_container_width=True):
+            estado['inicios'].pop()
+            st.rerun()
+    with col_pag:
+        st.caption(f"Página {len(estado['inicios'])}")
+    with col_sig:
+        if st.button("Siguiente ➡️", key=f"{clave}_siguiente", disabled=siguiente is None, use_container_width=True):
+            estado['inicios'].append(siguiente)
+            st.rerun()
+
+# ==================== FORMULARIO DE EVALUACIÓN ====================
+# Al guardar solo se reinician los widgets de calificación, comentario y valor de cada KPI; el resto
+# de la sesión (evaluador, filtros, paginación) y las consultas cacheadas se conservan.
+PREFIJOS_FORMULARIO_EVALUACION = ('cal_', 'com_', 'val_')
+
+def limpiar_formulario_evaluacion():
+    for clave in [c for c in st.session_state if str(c).startswith(PREFIJOS_FORMULARIO_EVALUACION)]:
+        del st.session_state[clave]
+
+def siguiente_evaluacion(equipos, integrantes, equipo_id, integrante_id):
+    # (equipo_id, integrante) del que sigue; al terminar un equipo pasa al siguiente y deja su
+    # lista de integrantes cacheada para el próximo render. None si no queda nadie.
+    ids = [i['id'] for i in integrantes]
+    posicion = ids.index(integrante_id) + 1
+    if posicion < len(ids):
+        return equipo_id, integrantes[posicion]
+    ids_equipos = [e['id'] for e in equipos]
+    for siguiente_equipo in ids_equipos[ids_equipos.index(equipo_id) + 1:]:
+        integrantes_siguientes = obtener_integrantes(solo_activos=True, equipo_id=siguiente_equipo)
+        if integrantes_siguientes:
+            return siguiente_equipo, integrantes_siguientes[0]
+    return None
+
+def programar_seleccion_evaluacion(equipo_id, integrante_id):
+    # Los widgets ya creados en este run no se pueden modificar: la selección se aplica en el próximo
+    st.session_state['eval_seleccion_pendiente'] = (equipo_id, integrante_id)
+
+def aplicar_seleccion_evaluacion():
+    pendiente = st.session_state.pop('eval_seleccion_pendiente', None)
+    if pendiente:
+        st.session_state['eval_equipo'], st.session_state['eval_integrante'] = pendiente
+
+# ==================== LÍNEA DE COMANDOS ====================
+# Uso: python app.py <comando> [opciones]  (con `streamlit run app.py` se abre la interfaz)
+def _fecha_cli(texto):
+    return datetime.strptime(texto, "%Y-%m-%d").date()
+
+def _cmd_migrar(args):
+    # Las migraciones ya se aplicaron en main_cli antes de despachar el comando
+    print("✅ Esquema al día")
+    return 0
+
+def _cmd_verificar_indices(args):
+    fecha_fin = args.hasta or date.today()
+    fecha_inicio = args.desde or fecha_fin.replace(day=1)
+    
+    resultados = verificar_indices_reporte(
+        fecha_inicio, fecha_fin, args.equipo, args.tipo, simular_filas=args.simular
+    )
+    for nombre, usa_indices, accesos in resultados:
+        estado = "OK" if usa_indices else "FALLA"
+        print(f"[{estado}] {nombre}: " + ", ".join(f"{tipo} ({indice or '-'})" for tipo, indice in accesos))
+    return 0 if all(usa_indices for _, usa_indices, _ in resultados) else 1
+
+def _cmd_importar(args):
+    if args.archivo.lower().endswith(('.xlsx', '.xls')):
+        formato = 'excel'
+        archivo = open(args.archivo, 'rb')
+    else:
+        formato = 'csv'
+        archivo = open(args.archivo, encoding='utf-8-sig', newline='')
     
-    query += " ORDER BY tipo, nombre"
+    with archivo:
+        resultado = importar_datos(
+            args.entidad, archivo, formato=formato, validar_solo=args.validar, estricto=not args.parcial
+        )
     
-    cur.execute(query, params)
-    result = cur.fetchall()
-    cur.close()
-    return result
+    print(f"Filas leídas: {resultado['total']} | Insertadas: {resultado['insertadas']} | Con error: {resultado['con_error']}")
+    for linea, error in resultado['errores']:
+        print(f"  línea {linea}: {error}")
+    if resultado['con_error'] > len(resultado['errores']):
+        print(f"  ... y {resultado['con_error'] - len(resultado['errores'])} errores más")
+    return 1 if resultado['con_error'] else 0
 
-def desactivar_kpi(kpi_id):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE kpis SET activo = FALSE WHERE id = %s", (kpi_id,))
-    conn.commit()
-    cur.close()
+def _cmd_exportar(args):
+    if args.formato == 'csv':
+        if args.salida == '-':
+            filas = exportar_evaluaciones(sys.stdout, 'csv', args.desde, args.hasta, args.equipo, args.tipo)
+        else:
+            with open(args.salida, 'w', encoding='utf-8', newline='') as destino:
+                filas = exportar_evaluaciones(destino, 'csv', args.desde, args.hasta, args.equipo, args.tipo)
+    else:
+        filas = exportar_evaluaciones(args.salida, 'parquet', args.desde, args.hasta, args.equipo, args.tipo)
+    print(f"✅ {filas} evaluaciones exportadas", file=sys.stderr)
+    return 0
 
-# ==================== FUNCIONES EVALUACIONES ====================
-def agregar_evaluacion(integrante_id, kpi_id, calificacion, fecha, evaluador, comentario="", valor_cuantitativo=None):
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        """INSERT INTO evaluaciones 
-           (integrante_id, kpi_id, calificacion, fecha_evaluacion, evaluador, comentario, valor_cuantitativo) 
-           VALUES (%s, %s, %s, %s, %s, %s, %s)""",
-        (integrante_id, kpi_id, calificacion, fecha, evaluador, comentario, valor_cuantitativo)
-    )
-    conn.commit()
-    cur.close()
+def _cmd_refrescar_resumenes(args):
+    refrescar_resumenes(args.desde, args.hasta)
+    print("✅ Tablas de resumen recalculadas")
+    return 0
+
+def _cmd_snapshot(args):
+    generados = generar_snapshots(args.hasta, args.forzar)
+    for mes, filas in generados:
+        print(f"📦 {mes:%Y-%m}: {filas} evaluaciones")
+    print(f"✅ {len(generados)} mes(es) con snapshot nuevo")
+    return 0
 
-def obtener_evaluaciones(fecha_inicio=None, fecha_fin=None, equipo_id=None, tipo_kpi=None):
-    conn = get_connection()
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+def _cmd_evaluar_alertas(args):
+    resultados = evaluar_reglas_riesgo(completo=args.completo)
+    if resultados is None:
+        print("⏳ Otro proceso está evaluando las reglas; reintentar más tarde")
+        return 1
+    print(f"✅ {sum(resultados.values())} alerta(s) nueva(s) en {len(resultados)} regla(s) evaluada(s)")
+    return 0
+
+def main_cli(argv):
+    parser = argparse.ArgumentParser(prog="app.py", description="Sistema de KPIs - comandos de administración")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
     
-    query = """
-        SELECT e.*, 
-               i.nombre as integrante, 
-               i.equipo_id,
-               eq.nombre as equipo_nombre,
-               k.nombre as kpi_nombre,
-               k.tipo as kpi_tipo
-        FROM evaluaciones e
-        JOIN integrantes i ON e.integrante_id = i.id
-        JOIN kpis k ON e.kpi_id = k.id
-        JOIN equipos eq ON i.equipo_id = eq.id
-        WHERE 1=1
-    """
-    params = []
+    p_migrar = subparsers.add_parser("migrar", help="Aplica las migraciones de esquema pendientes")
+    p_migrar.set_defaults(func=_cmd_migrar)
     
-    if fecha_inicio:
-        query += " AND e.fecha_evaluacion >= %s"
-        params.append(fecha_inicio)
-    if fecha_fin:
-        query += " AND e.fecha_evaluacion <= %s"
-        params.append(fecha_fin)
-    if equipo_id:
-        query += " AND i.equipo_id = %s"
-        params.append(equipo_id)
-    if tipo_kpi:
-        query += " AND k.tipo = %s"
-        params.append(tipo_kpi)
+    p_indices = subparsers.add_parser(
+        "verificar-indices",
+        help="Verifica con EXPLAIN que la consulta de reportes use índices"
+    )
+    p_indices.add_argument("--desde", type=_fecha_cli, help="Fecha inicio (AAAA-MM-DD)")
+    p_indices.add_argument("--hasta", type=_fecha_cli, help="Fecha fin (AAAA-MM-DD)")
+    p_indices.add_argument("--equipo", type=int, help="ID de equipo a filtrar")
+    p_indices.add_argument("--tipo", choices=list(TIPOS_KPI.keys()), help="Tipo de KPI a filtrar")
+    p_indices.add_argument(
+        "--simular", type=int, default=0, metavar="FILAS",
+        help="Genera FILAS evaluaciones sintéticas (p.ej. 1000000) en una transacción descartada"
+    )
+    p_indices.set_defaults(func=_cmd_verificar_indices)
     
-    query += " ORDER BY e.fecha_evaluacion DESC"
+    p_importar = subparsers.add_parser("importar", help="Importa datos masivos desde CSV o Excel")
+    p_importar.add_argument("entidad", choices=list(IMPORTACIONES.keys()))
+    p_importar.add_argument("archivo", help="Archivo .csv (UTF-8, con encabezado) o .xlsx")
+    p_importar.add_argument("--validar", action="store_true", help="Solo valida, no guarda")
+    p_importar.add_argument(
+        "--parcial", action="store_true",
+        help="Guarda las filas válidas aunque otras tengan errores (por defecto, como en la página, "
+             "no se guarda nada si alguna fila tiene errores)"
+    )
+    p_importar.set_defaults(func=_cmd_importar)
     
-    cur.execute(query, params)
-    result = cur.fetchall()
-    cur.close()
-    return result
-
-# Mapeo de calificaciones (de MEJOR a PEOR)
-CALIFICACIONES = {
-    1: "⭐ Excelente",
-    2: "👍 Bueno", 
-    3: "⚠️ Regular",
-    4: "❌ Deficiente"
-}
-
-TIPOS_KPI = {
-    'cualitativo': '🎭 Cualitativo (Soft Skills)',
-    'cuantitativo': '📊 Cuantitativo (Objetivos)'
-}
+    p_exportar = subparsers.add_parser("exportar", help="Exporta el historial de evaluaciones a CSV o Parquet")
+    p_exportar.add_argument("salida", help="Archivo de salida ('-' para CSV por salida estándar)")
+    p_exportar.add_argument("--formato", choices=['csv', 'parquet'], default='csv')
+    p_exportar.add_argument("--desde", type=_fecha_cli, help="Fecha inicio (AAAA-MM-DD)")
+    p_exportar.add_argument("--hasta", type=_fecha_cli, help="Fecha fin (AAAA-MM-DD)")
+    p_exportar.add_argument("--equipo", type=int, help="ID de equipo a filtrar")
+    p_exportar.add_argument("--tipo", choices=list(TIPOS_KPI.keys()), help="Tipo de KPI a filtrar")
+    p_exportar.set_defaults(func=_cmd_exportar)
+    
+    p_resumenes = subparsers.add_parser(
+        "refrescar-resumenes",
+        help="Recalcula las tablas de resumen diario/mensual desde las evaluaciones"
+    )
+    p_resumenes.add_argument("--desde", type=_fecha_cli, help="Fecha inicio (AAAA-MM-DD)")
+    p_resumenes.add_argument("--hasta", type=_fecha_cli, help="Fecha fin (AAAA-MM-DD)")
+    p_resumenes.set_defaults(func=_cmd_refrescar_resumenes)
+    
+    p_snapshot = subparsers.add_parser(
+        "snapshot",
+        help="Guarda en Parquet los meses cerrados para leerlos sin consultar Postgres"
+    )
+    p_snapshot.add_argument("--hasta", type=_fecha_cli, help="Solo meses anteriores al de esta fecha (por defecto, el actual)")
+    p_snapshot.add_argument("--forzar", action="store_true", help="Regenera también los meses que ya tienen snapshot")
+    p_snapshot.set_defaults(func=_cmd_snapshot)
+    
+    p_alertas = subparsers.add_parser(
+        "evaluar-alertas",
+        help="Aplica las reglas de riesgo a las evaluaciones nuevas y guarda las alertas"
+    )
+    p_alertas.add_argument("--completo", action="store_true", help="Reevalúa todas las evaluaciones y ventanas")
+    p_alertas.set_defaults(func=_cmd_evaluar_alertas)
+    
+    args = parser.parse_args(argv)
+    aplicadas = aplicar_migraciones()
+    if aplicadas:
+        print(f"Migraciones aplicadas: {', '.join(str(v) for v in aplicadas)}")
+    return args.func(args)
 
-# Función para calcular puntuación invertida (mayor = mejor)
-def calcular_puntuacion_invertida(calificacion):
-    return 5 - calificacion
+if __name__ == "__main__" and not runtime.exists():
+    sys.exit(main_cli(sys.argv[1:]))
 
 # Inicializar base de datos
 init_db()
+if runtime.exists():
+    iniciar_evaluador_alertas()
 
 # Sidebar - Navegación
 st.sidebar.title("📊 Sistema de KPIs")
@@ -273,7 +2701,8 @@ menu = st.sidebar.radio(
         "🏢 Gestión de Equipos", 
         "👥 Gestión de Integrantes", 
         "📋 Gestión de KPIs", 
-        "📈 Reportes y Análisis"
+        "📈 Reportes y Análisis",
+        "📥 Importación Masiva"
     ]
 )
 
@@ -320,24 +2749,22 @@ if menu == "🏢 Gestión de Equipos":
         st.subheader("Equipos Registrados")
         
         mostrar_inactivos = st.checkbox("Mostrar equipos inactivos")
-        equipos = obtener_equipos(solo_activos=not mostrar_inactivos)
+        equipos = obtener_resumen_equipos(solo_activos=not mostrar_inactivos)
         
         if equipos:
             for equipo in equipos:
-                # Contar integrantes del equipo
-                integrantes_equipo = obtener_integrantes(solo_activos=True, equipo_id=equipo['id'])
-                lideres = [i for i in integrantes_equipo if i['es_lider']]
+                lideres = equipo['lideres']
                 
-                with st.expander(f"{'✅' if equipo['activo'] else '❌'} {equipo['nombre']} ({len(integrantes_equipo)} integrantes)", expanded=False):
+                with st.expander(f"{'✅' if equipo['activo'] else '❌'} {equipo['nombre']} ({equipo['total_integrantes']} integrantes)", expanded=False):
                     col1, col2 = st.columns(2)
                     
                     with col1:
                         if equipo['descripcion']:
                             st.write(f"**Descripción:** {equipo['descripcion']}")
                         st.caption(f"Creado: {equipo['fecha_creacion']}")
-                        st.write(f"**Total integrantes:** {len(integrantes_equipo)}")
+                        st.write(f"**Total integrantes:** {equipo['total_integrantes']}")
                         if lideres:
-                            st.write(f"**Líder(es):** {', '.join([l['nombre'] for l in lideres])}")
+                            st.write(f"**Líder(es):** {', '.join(lideres)}")
                     
                     with col2:
                         if equipo['activo']:
@@ -410,15 +2837,18 @@ elif menu == "👥 Gestión de Integrantes":
                 equipo_options.update({e['nombre']: e['id'] for e in equipos})
                 filtro_equipo = st.selectbox("Filtrar por equipo", options=list(equipo_options.keys()))
         
-        integrantes = obtener_integrantes(
+        filtro_equipo_id = equipo_options.get(filtro_equipo) if equipos else None
+        paginacion_integrantes = estado_paginacion('pagina_integrantes', (mostrar_inactivos, filtro_equipo_id))
+        integrantes, siguiente_integrantes = obtener_integrantes_pagina(
             solo_activos=not mostrar_inactivos, 
-            equipo_id=equipo_options.get(filtro_equipo) if equipos else None
+            equipo_id=filtro_equipo_id,
+            despues_de=paginacion_integrantes['inicios'][-1]
         )
         
         if integrantes:
             df = pd.DataFrame(integrantes)
-            df['Estado'] = df['activo'].apply(lambda x: '✅ Activo' if x else '❌ Inactivo')
-            df['Líder'] = df['es_lider'].apply(lambda x: '👑 Sí' if x else 'No')
+            df['Estado'] = etiquetar_booleano(df['activo'], '✅ Activo', '❌ Inactivo')
+            df['Líder'] = etiquetar_booleano(df['es_lider'], '👑 Sí', 'No')
             
             st.dataframe(
                 df[['nombre', 'rol', 'equipo_nombre', 'Líder', 'Estado', 'fecha_creacion']],
@@ -434,27 +2864,36 @@ elif menu == "👥 Gestión de Integrantes":
                 hide_index=True,
                 use_container_width=True
             )
+            controles_paginacion('pagina_integrantes', paginacion_integrantes, siguiente_integrantes)
             
-            st.markdown("---")
-            st.subheader("Desactivar Integrante")
-            integrantes_activos = [i for i in integrantes if i['activo']]
-            
-            if integrantes_activos:
-                integrante_options = {f"{i['nombre']} ({i['equipo_nombre']})": i['id'] for i in integrantes_activos}
-                integrante_desactivar = st.selectbox(
-                    "Seleccionar integrante a desactivar",
-                    options=list(integrante_options.keys())
-                )
-                
-                if st.button("❌ Desactivar", type="secondary"):
-                    try:
-                        desactivar_integrante(integrante_options[integrante_desactivar])
-                        st.success(f"✅ Integrante desactivado")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"❌ Error: {str(e)}")
         else:
             st.info("No hay integrantes registrados")
+        
+        # Búsqueda propia: el integrante puede estar en cualquier página de la tabla
+        st.markdown("---")
+        st.subheader("Desactivar Integrante")
+        texto_desactivar = st.text_input("Buscar integrante por nombre", key="buscar_desactivar_integrante")
+        integrantes_activos = buscar_integrantes(texto_desactivar, equipo_id=filtro_equipo_id)
+        
+        if integrantes_activos:
+            integrante_options = {i['id']: f"{i['nombre']} ({i['equipo_nombre']})" for i in integrantes_activos}
+            integrante_desactivar = st.selectbox(
+                "Seleccionar integrante a desactivar",
+                options=list(integrante_options.keys()),
+                format_func=lambda x: integrante_options[x]
+            )
+            if len(integrantes_activos) == BUSQUEDA_MAX_RESULTADOS:
+                st.caption(f"Se muestran los primeros {BUSQUEDA_MAX_RESULTADOS} resultados; escribe parte del nombre para acotar.")
+            
+            if st.button("❌ Desactivar", type="secondary"):
+                try:
+                    desactivar_integrante(integrante_desactivar)
+                    st.success(f"✅ Integrante desactivado")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"❌ Error: {str(e)}")
+        else:
+            st.info("No hay integrantes activos que coincidan")
 
 # ==================== PÁGINA: GESTIÓN DE KPIS ====================
 elif menu == "📋 Gestión de KPIs":
@@ -573,6 +3012,11 @@ elif menu == "📋 Gestión de KPIs":
 elif menu == "📝 Nueva Evaluación":
     st.title("📝 Registrar Nueva Evaluación")
     
+    mensaje_guardado = st.session_state.pop('eval_mensaje', None)
+    if mensaje_guardado:
+        st.success(mensaje_guardado)
+    aplicar_seleccion_evaluacion()
+    
     equipos = obtener_equipos()
     if not equipos:
         st.warning("⚠️ Primero debes crear al menos un equipo")
@@ -582,29 +3026,39 @@ elif menu == "📝 Nueva Evaluación":
         with col1:
             st.subheader("Datos de la Evaluación")
             
-            equipo_options = {e['nombre']: e['id'] for e in equipos}
-            equipo_seleccionado = st.selectbox("Seleccionar Equipo", options=list(equipo_options.keys()))
-            equipo_id = equipo_options[equipo_seleccionado]
+            equipo_options = {e['id']: e['nombre'] for e in equipos}
+            if st.session_state.get('eval_equipo') not in equipo_options:
+                st.session_state.pop('eval_equipo', None)
+            equipo_id = st.selectbox(
+                "Seleccionar Equipo",
+                options=list(equipo_options.keys()),
+                format_func=lambda x: equipo_options[x],
+                key="eval_equipo"
+            )
+            equipo_seleccionado = equipo_options[equipo_id]
             
             integrantes = obtener_integrantes(solo_activos=True, equipo_id=equipo_id)
             
             if not integrantes:
                 st.warning(f"⚠️ El equipo '{equipo_seleccionado}' no tiene integrantes")
             else:
-                integrante_options = {i['nombre']: i['id'] for i in integrantes}
-                integrante_seleccionado = st.selectbox(
+                integrante_options = {i['id']: i['nombre'] for i in integrantes}
+                if st.session_state.get('eval_integrante') not in integrante_options:
+                    st.session_state.pop('eval_integrante', None)
+                integrante_id = st.selectbox(
                     "Integrante a evaluar",
-                    options=list(integrante_options.keys())
+                    options=list(integrante_options.keys()),
+                    format_func=lambda x: integrante_options[x],
+                    key="eval_integrante"
                 )
+                integrante_seleccionado = integrante_options[integrante_id]
                 
                 fecha_eval = st.date_input(
                     "Fecha de evaluación",
                     value=date.today()
                 )
                 
-                evaluador = st.text_input("Evaluador", value=st.session_state.get('evaluador', ''))
-                if evaluador:
-                    st.session_state['evaluador'] = evaluador
+                evaluador = st.text_input("Evaluador", key="evaluador")
         
         with col2:
             st.subheader("KPIs a Evaluar")
@@ -720,33 +3174,35 @@ elif menu == "📝 Nueva Evaluación":
                         }
             
             st.markdown("---")
-            col_btn1, col_btn2, col_btn3 = st.columns([1, 1, 3])
+            siguiente = siguiente_evaluacion(equipos, integrantes, equipo_id, integrante_id)
+            col_btn1, col_btn2, col_btn3, _ = st.columns([1, 1, 1, 2])
             
             with col_btn1:
-                if st.button("💾 Guardar Evaluación", type="primary", use_container_width=True):
-                    try:
-                        integrante_id = integrante_options[integrante_seleccionado]
-                        for kpi_id, datos in evaluaciones_temp.items():
-                            agregar_evaluacion(
-                                integrante_id,
-                                kpi_id,
-                                datos['calificacion'],
-                                fecha_eval,
-                                evaluador,
-                                datos['comentario'],
-                                datos['valor_cuantitativo']
-                            )
-                        st.success(f"✅ Evaluación de {integrante_seleccionado} ({equipo_seleccionado}) guardada exitosamente!")
-                        st.balloons()
-                        st.session_state.clear()
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"❌ Error al guardar: {str(e)}")
+                guardar = st.button("💾 Guardar Evaluación", type="primary", use_container_width=True)
             
             with col_btn2:
+                guardar_siguiente = st.button(
+                    "⏭️ Guardar y Siguiente",
+                    use_container_width=True,
+                    disabled=siguiente is None,
+                    help=None if siguiente is None else f"Luego evaluar a {siguiente[1]['nombre']}"
+                )
+            
+            with col_btn3:
                 if st.button("🔄 Limpiar", use_container_width=True):
-                    st.session_state.clear()
+                    limpiar_formulario_evaluacion()
                     st.rerun()
+            
+            if guardar or guardar_siguiente:
+                try:
+                    agregar_evaluaciones(integrante_id, fecha_eval, evaluador, evaluaciones_temp)
+                    st.session_state['eval_mensaje'] = f"✅ Evaluación de {integrante_seleccionado} ({equipo_seleccionado}) guardada exitosamente!"
+                    limpiar_formulario_evaluacion()
+                    if guardar_siguiente:
+                        programar_seleccion_evaluacion(siguiente[0], siguiente[1]['id'])
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"❌ Error al guardar: {str(e)}")
 
 # ==================== PÁGINA: REPORTES Y ANÁLISIS ====================
 elif menu == "📈 Reportes y Análisis":
@@ -774,18 +3230,18 @@ elif menu == "📈 Reportes y Análisis":
     equipo_id_filtro = equipo_options[filtro_equipo]
     tipo_kpi_filtro = None if filtro_tipo_kpi == 'todos' else filtro_tipo_kpi
     
-    evaluaciones = obtener_evaluaciones(
+    # Todas las pestañas leen vistas ya calculadas para este conjunto de filtros
+    vistas = obtener_vistas_reporte(
         fecha_inicio=fecha_inicio, 
         fecha_fin=fecha_fin,
         equipo_id=equipo_id_filtro,
         tipo_kpi=tipo_kpi_filtro
     )
+    total_evaluaciones = int(vistas['total']['cantidad'].sum())
     
-    if evaluaciones:
-        df_eval = pd.DataFrame(evaluaciones)
-        df_eval['calificacion_texto'] = df_eval['calificacion'].map(CALIFICACIONES)
-        df_eval['puntuacion_invertida'] = df_eval['calificacion'].apply(calcular_puntuacion_invertida)
-        df_eval['tipo_kpi_texto'] = df_eval['kpi_tipo'].map(TIPOS_KPI)
+    if total_evaluaciones > 0:
+        dist_calificacion = vistas['dist_calificacion']
+        resumen_tipo = vistas['resumen_tipo']
         
         # Métricas generales
         st.subheader("📊 Resumen General")
@@ -798,84 +3254,108 @@ elif menu == "📈 Reportes y Análisis":
         col1, col2, col3, col4, col5 = st.columns(5)
         
         with col1:
-            st.metric("Total Evaluaciones", len(df_eval))
+            st.metric("Total Evaluaciones", total_evaluaciones)
         with col2:
-            promedio_invertido = df_eval['puntuacion_invertida'].mean()
+            promedio_invertido = vistas['total']['puntuacion_invertida'].iloc[0]
             st.metric("Puntuación Promedio", f"{promedio_invertido:.2f}")
         with col3:
-            excelentes = len(df_eval[df_eval['calificacion'] == 1])
+            excelentes = int(dist_calificacion.get(1, 0))
             st.metric("⭐ Excelentes", excelentes)
         with col4:
-            deficientes = len(df_eval[df_eval['calificacion'] == 4])
+            deficientes = int(dist_calificacion.get(4, 0))
             st.metric("❌ Deficientes", deficientes)
         with col5:
-            equipos_evaluados = df_eval['equipo_nombre'].nunique()
+            equipos_evaluados = len(vistas['equipo'])
             st.metric("🏢 Equipos", equipos_evaluados)
         
         st.markdown("---")
         
-        # Tabs principales
-        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-            "🏆 Ranking General",
-            "🏢 Por Equipo",
-            "👥 Por Integrante", 
-            "📋 Por KPI", 
-            "📅 Histórico",
-            "⚠️ Análisis de Riesgos"
-        ])
+        # Secciones principales: st.tabs ejecuta el contenido de todas las pestañas en cada rerun;
+        # con el selector solo se calculan y grafican las de la sección elegida (la elección
+        # queda en session_state entre reruns)
+        seccion = st.radio(
+            "Sección",
+            options=list(SECCIONES_REPORTE.keys()),
+            format_func=lambda x: SECCIONES_REPORTE[x],
+            horizontal=True,
+            label_visibility="collapsed",
+            key="seccion_reporte"
+        )
         
         # ==================== TAB 1: RANKING GENERAL ====================
-        with tab1:
+        if seccion == 'ranking':
             st.subheader("🏆 Ranking General de Desempeño")
             
             # Ranking por integrante
-            promedio_integrante = df_eval.groupby(['integrante', 'equipo_nombre']).agg({
-                'puntuacion_invertida': 'mean',
-                'calificacion': 'count'
-            }).reset_index()
-            promedio_integrante.columns = ['Integrante', 'Equipo', 'Puntuación', 'Total Evaluaciones']
-            promedio_integrante = promedio_integrante.sort_values('Puntuación', ascending=False)
-            promedio_integrante['Posición'] = range(1, len(promedio_integrante) + 1)
-            promedio_integrante['Desempeño'] = promedio_integrante['Puntuación'].apply(
-                lambda x: '⭐ Excelente' if x >= 3.5 else ('👍 Bueno' if x >= 2.5 else ('⚠️ Regular' if x >= 1.5 else '❌ Deficiente'))
-            )
+            promedio_integrante = vistas['ranking_integrantes'].rename(columns={
+                'integrante': 'Integrante',
+                'equipo_nombre': 'Equipo',
+                'puntuacion_invertida': 'Puntuación',
+                'cantidad': 'Total Evaluaciones',
+                'posicion': 'Posición',
+                'desempeno': 'Desempeño'
+            })
             
             col1, col2 = st.columns([2, 1])
             
             with col1:
-                fig_ranking = go.Figure()
+                ranking = vistas['ranking_integrantes']
                 
-                colors = promedio_integrante['Puntuación'].apply(
-                    lambda x: 'green' if x >= 3.5 else ('lightgreen' if x >= 2.5 else ('orange' if x >= 1.5 else 'red'))
-                )
-                
-                fig_ranking.add_trace(go.Bar(
-                    y=promedio_integrante['Integrante'] + ' (' + promedio_integrante['Equipo'] + ')',
-                    x=promedio_integrante['Puntuación'],
-                    orientation='h',
-                    text=promedio_integrante['Puntuación'].apply(lambda x: f'{x:.2f}'),
-                    textposition='outside',
-                    marker_color=colors,
-                    hovertemplate='<b>%{y}</b><br>Puntuación: %{x:.2f}<extra></extra>'
-                ))
+                busqueda = st.text_input("🔎 Buscar integrante", key="busqueda_ranking")
+                if busqueda:
+                    encontrados = buscar_en_ranking(ranking, busqueda)
+                    if len(encontrados) > 0:
+                        st.dataframe(
+                            encontrados[['posicion', 'integrante', 'equipo_nombre', 'puntuacion_invertida', 'percentil', 'desempeno']].head(20),
+                            column_config={
+                                "posicion": "Posición",
+                                "integrante": "Integrante",
+                                "equipo_nombre": "Equipo",
+                                "puntuacion_invertida": st.column_config.NumberColumn("Puntuación", format="%.2f"),
+                                "percentil": st.column_config.NumberColumn("Percentil", format="%d"),
+                                "desempeno": "Desempeño"
+                            },
+                            hide_index=True,
+                            use_container_width=True
+                        )
+                    else:
+                        st.info("No se encontraron integrantes con ese nombre")
                 
-                fig_ranking.update_layout(
-                    title='Ranking de Desempeño (mayor puntuación = mejor)',
-                    xaxis_title='Puntuación (mayor es mejor)',
-                    yaxis_title='',
-                    height=max(400, len(promedio_integrante) * 25),
-                    showlegend=False
-                )
+                if len(ranking) <= RANKING_MAX_BARRAS:
+                    fig_ranking = figura_cacheada('ranking_barras', ranking, construir=lambda: figura_ranking_barras(ranking))
+                else:
+                    modo_ranking = st.radio(
+                        "Vista del ranking",
+                        options=['extremos', 'percentiles'],
+                        format_func=lambda x: '🔝 Mejores y peores' if x == 'extremos' else '📈 Bandas de percentil',
+                        horizontal=True,
+                        key="modo_ranking"
+                    )
+                    if modo_ranking == 'extremos':
+                        n_extremos = st.slider(
+                            "Integrantes por extremo",
+                            min_value=5,
+                            max_value=RANKING_MAX_BARRAS // 2,
+                            value=RANKING_EXTREMOS_DEFECTO,
+                            key="extremos_ranking"
+                        )
+                        extremos = seleccionar_extremos(ranking, n_extremos)
+                        titulo_extremos = f'Los {n_extremos} mejores y los {n_extremos} peores de {len(ranking)} integrantes'
+                        fig_ranking = figura_cacheada(
+                            'ranking_extremos', extremos, titulo_extremos,
+                            construir=lambda: figura_ranking_barras(extremos, titulo=titulo_extremos)
+                        )
+                    else:
+                        fig_ranking = figura_cacheada('ranking_percentiles', ranking, construir=lambda: figura_ranking_percentiles(ranking))
                 st.plotly_chart(fig_ranking, use_container_width=True)
             
             with col2:
                 st.markdown("### 🏅 Top 5 Mejores")
                 for idx, row in promedio_integrante.head(5).iterrows():
                     emoji = "🥇" if row['Posición'] == 1 else ("🥈" if row['Posición'] == 2 else ("🥉" if row['Posición'] == 3 else "📈"))
-                    color = "green" if row['Puntuación'] >= 3.5 else ("lightgreen" if row['Puntuación'] >= 2.5 else ("orange" if row['Puntuación'] >= 1.5 else "red"))
                     
                     st.markdown(f"""
-                    <div style='background-color: {color}; padding: 10px; margin: 5px 0; border-radius: 5px; color: white;'>
+                    <div style='background-color: {row['color']}; padding: 10px; margin: 5px 0; border-radius: 5px; color: white;'>
                         {emoji} <b>{row['Posición']}. {row['Integrante']}</b><br>
                         Equipo: {row['Equipo']}<br>
                         Puntuación: {row['Puntuación']:.2f}<br>
@@ -904,110 +3384,114 @@ elif menu == "📈 Reportes y Análisis":
             col1, col2 = st.columns(2)
             
             with col1:
-                dist_general = df_eval['calificacion_texto'].value_counts()
+                dist_general = dist_calificacion.sort_values(ascending=False)
+                dist_general.index = dist_general.index.map(CALIFICACIONES)
                 
-                fig_pie = px.pie(
-                    values=dist_general.values,
-                    names=dist_general.index,
-                    title='Proporción de Calificaciones',
-                    color=dist_general.index,
-                    color_discrete_map={
-                        '⭐ Excelente': 'green',
-                        '👍 Bueno': 'lightgreen',
-                        '⚠️ Regular': 'orange',
-                        '❌ Deficiente': 'red'
-                    },
-                    hole=0.4
-                )
-                fig_pie.update_traces(textposition='inside', textinfo='percent+label')
+                fig_pie = figura_cacheada('pie_calificaciones', dist_general, construir=lambda: (
+                    px.pie(
+                        values=dist_general.values,
+                        names=dist_general.index,
+                        title='Proporción de Calificaciones',
+                        color=dist_general.index,
+                        color_discrete_map={
+                            '⭐ Excelente': 'green',
+                            '👍 Bueno': 'lightgreen',
+                            '⚠️ Regular': 'orange',
+                            '❌ Deficiente': 'red'
+                        },
+                        hole=0.4
+                    )
+                    .update_traces(textposition='inside', textinfo='percent+label')
+                ))
                 st.plotly_chart(fig_pie, use_container_width=True)
             
             with col2:
-                dist_tipo = df_eval['tipo_kpi_texto'].value_counts()
+                dist_tipo = resumen_tipo['cantidad'].sort_values(ascending=False)
+                dist_tipo.index = dist_tipo.index.map(TIPOS_KPI)
                 
-                fig_pie_tipo = px.pie(
-                    values=dist_tipo.values,
-                    names=dist_tipo.index,
-                    title='Evaluaciones por Tipo de KPI',
-                    hole=0.4
-                )
-                fig_pie_tipo.update_traces(textposition='inside', textinfo='percent+label')
+                fig_pie_tipo = figura_cacheada('pie_tipos', dist_tipo, construir=lambda: (
+                    px.pie(
+                        values=dist_tipo.values,
+                        names=dist_tipo.index,
+                        title='Evaluaciones por Tipo de KPI',
+                        hole=0.4
+                    )
+                    .update_traces(textposition='inside', textinfo='percent+label')
+                ))
                 st.plotly_chart(fig_pie_tipo, use_container_width=True)
         
         # ==================== TAB 2: POR EQUIPO ====================
-        with tab2:
+        if seccion == 'equipo':
             st.subheader("🏢 Desempeño por Equipo")
             
             # Ranking de equipos
-            promedio_equipo = df_eval.groupby('equipo_nombre').agg({
-                'puntuacion_invertida': 'mean',
-                'calificacion': 'count',
-                'integrante': 'nunique'
-            }).reset_index()
-            promedio_equipo.columns = ['Equipo', 'Puntuación', 'Total Evaluaciones', 'Integrantes']
-            promedio_equipo = promedio_equipo.sort_values('Puntuación', ascending=False)
-            
-            fig_equipos = px.bar(
-                promedio_equipo,
-                x='Puntuación',
-                y='Equipo',
-                orientation='h',
-                title='Ranking de Equipos (mayor = mejor)',
-                text='Puntuación',
-                color='Puntuación',
-                color_continuous_scale=['red', 'orange', 'lightgreen', 'green'],
-                hover_data=['Total Evaluaciones', 'Integrantes']
-            )
-            fig_equipos.update_traces(texttemplate='%{text:.2f}', textposition='outside')
-            fig_equipos.update_layout(height=400)
+            promedio_equipo = vistas['ranking_equipos'].rename(columns={
+                'equipo_nombre': 'Equipo',
+                'puntuacion_invertida': 'Puntuación',
+                'cantidad': 'Total Evaluaciones',
+                'integrantes': 'Integrantes'
+            })
+            
+            fig_equipos = figura_cacheada('ranking_equipos', promedio_equipo, construir=lambda: (
+                px.bar(
+                    promedio_equipo,
+                    x='Puntuación',
+                    y='Equipo',
+                    orientation='h',
+                    title='Ranking de Equipos (mayor = mejor)',
+                    text='Puntuación',
+                    color='Puntuación',
+                    color_continuous_scale=['red', 'orange', 'lightgreen', 'green'],
+                    hover_data=['Total Evaluaciones', 'Integrantes']
+                )
+                .update_traces(texttemplate='%{text:.2f}', textposition='outside')
+                .update_layout(height=400)
+            ))
             st.plotly_chart(fig_equipos, use_container_width=True)
             
             # Comparación por tipo de KPI
             st.markdown("---")
             st.subheader("📊 Comparación: Cualitativos vs Cuantitativos por Equipo")
             
-            df_tipo_equipo = df_eval.groupby(['equipo_nombre', 'kpi_tipo']).agg({
-                'puntuacion_invertida': 'mean'
-            }).reset_index()
-            df_tipo_equipo['tipo_texto'] = df_tipo_equipo['kpi_tipo'].apply(
-                lambda x: 'Cualitativos' if x == 'cualitativo' else 'Cuantitativos'
-            )
+            df_tipo_equipo = vistas['equipo_tipo']
             
-            fig_comp = px.bar(
-                df_tipo_equipo,
-                x='equipo_nombre',
-                y='puntuacion_invertida',
-                color='tipo_texto',
-                title='Puntuación por Equipo y Tipo de KPI',
-                barmode='group',
-                labels={'puntuacion_invertida': 'Puntuación', 'equipo_nombre': 'Equipo'}
-            )
+            fig_comp = figura_cacheada('equipos_por_tipo', df_tipo_equipo, construir=lambda: (
+                px.bar(
+                    df_tipo_equipo,
+                    x='equipo_nombre',
+                    y='puntuacion_invertida',
+                    color='tipo_texto',
+                    title='Puntuación por Equipo y Tipo de KPI',
+                    barmode='group',
+                    labels={'puntuacion_invertida': 'Puntuación', 'equipo_nombre': 'Equipo'}
+                )
+            ))
             st.plotly_chart(fig_comp, use_container_width=True)
             
             # Desglose por equipo
             st.markdown("---")
             st.subheader("📋 Desglose Detallado por Equipo")
             
-            for equipo in promedio_equipo['Equipo']:
-                df_equipo = df_eval[df_eval['equipo_nombre'] == equipo]
+            for _, fila_equipo in promedio_equipo.iterrows():
+                equipo = fila_equipo['Equipo']
                 
-                with st.expander(f"🏢 {equipo} - Puntuación: {promedio_equipo[promedio_equipo['Equipo']==equipo]['Puntuación'].values[0]:.2f}", expanded=False):
+                with st.expander(f"🏢 {equipo} - Puntuación: {fila_equipo['Puntuación']:.2f}", expanded=False):
                     col1, col2, col3 = st.columns(3)
                     
                     with col1:
-                        st.metric("Total Evaluaciones", len(df_equipo))
+                        st.metric("Total Evaluaciones", int(fila_equipo['Total Evaluaciones']))
                     with col2:
-                        integrantes_evaluados = df_equipo['integrante'].nunique()
-                        st.metric("Integrantes Evaluados", integrantes_evaluados)
+                        st.metric("Integrantes Evaluados", int(fila_equipo['Integrantes']))
                     with col3:
-                        promedio_equipo_val = df_equipo['puntuacion_invertida'].mean()
-                        st.metric("Puntuación Promedio", f"{promedio_equipo_val:.2f}")
+                        st.metric("Puntuación Promedio", f"{fila_equipo['Puntuación']:.2f}")
                     
                     # Mini ranking del equipo
                     st.write("**Ranking interno del equipo:**")
-                    rank_interno = df_equipo.groupby('integrante')['puntuacion_invertida'].mean().sort_values(ascending=False).reset_index()
-                    rank_interno.columns = ['Integrante', 'Puntuación']
-                    rank_interno['Posición'] = range(1, len(rank_interno) + 1)
+                    ranking = vistas['ranking_integrantes']
+                    rank_interno = ranking.loc[
+                        ranking['equipo_id'] == fila_equipo['equipo_id'],
+                        ['integrante', 'puntuacion_invertida', 'posicion_equipo']
+                    ].rename(columns={'integrante': 'Integrante', 'puntuacion_invertida': 'Puntuación', 'posicion_equipo': 'Posición'})
                     
                     st.dataframe(
                         rank_interno,
@@ -1016,280 +3500,370 @@ elif menu == "📈 Reportes y Análisis":
                     )
         
         # ==================== TAB 3: POR INTEGRANTE ====================
-        with tab3:
+        if seccion == 'integrante':
             st.subheader("👥 Desempeño por Integrante")
             
-            promedio_integrante = df_eval.groupby(['integrante', 'equipo_nombre']).agg({
-                'puntuacion_invertida': 'mean',
-                'calificacion': 'count'
-            }).reset_index()
-            promedio_integrante.columns = ['Integrante', 'Equipo', 'Puntuación', 'Evaluaciones']
-            promedio_integrante = promedio_integrante.sort_values('Puntuación', ascending=False)
-            
-            fig = px.bar(
-                promedio_integrante,
-                x='Puntuación',
-                y='Integrante',
-                orientation='h',
-                title='Puntuación por Integrante (mayor = mejor)',
-                text='Puntuación',
-                color='Puntuación',
-                color_continuous_scale=['red', 'orange', 'lightgreen', 'green'],
-                hover_data=['Equipo', 'Evaluaciones']
-            )
-            fig.update_traces(texttemplate='%{text:.2f}', textposition='outside')
-            fig.update_layout(height=max(400, len(promedio_integrante) * 25))
+            # Con muchos integrantes se grafican los mejores y peores; el resto va en "Otros"
+            ranking_integrantes = vistas['ranking_integrantes']
+            integrantes_acotados = acotar_ranking(ranking_integrantes, 'integrante')
+            visibles = integrantes_acotados['integrante_id'].dropna()
+            etiqueta_otros = f"Otros ({len(ranking_integrantes) - len(visibles)})"
+            if len(visibles) < len(ranking_integrantes):
+                st.caption(
+                    f"Se muestran los {RANKING_EXTREMOS_DEFECTO} mejores y los {RANKING_EXTREMOS_DEFECTO} peores "
+                    f"de {len(ranking_integrantes)} integrantes; el resto se agrupa en \"Otros\"."
+                )
+            
+            promedio_integrante = integrantes_acotados.rename(columns={
+                'integrante': 'Integrante',
+                'equipo_nombre': 'Equipo',
+                'puntuacion_invertida': 'Puntuación',
+                'cantidad': 'Evaluaciones'
+            })
+            
+            fig = figura_cacheada('puntuacion_integrantes', promedio_integrante, construir=lambda: (
+                px.bar(
+                    promedio_integrante,
+                    x='Puntuación',
+                    y='Integrante',
+                    orientation='h',
+                    title='Puntuación por Integrante (mayor = mejor)',
+                    text='Puntuación',
+                    color='Puntuación',
+                    color_continuous_scale=['red', 'orange', 'lightgreen', 'green'],
+                    hover_data=['Equipo', 'Evaluaciones']
+                )
+                .update_traces(texttemplate='%{text:.2f}', textposition='outside')
+                .update_layout(height=_altura_barras(len(promedio_integrante)))
+            ))
             st.plotly_chart(fig, use_container_width=True)
             
             # Distribución de calificaciones por integrante
             st.markdown("---")
-            dist_cal = df_eval.groupby(['integrante', 'calificacion_texto']).size().reset_index(name='count')
-            fig2 = px.bar(
-                dist_cal,
-                x='integrante',
-                y='count',
-                color='calificacion_texto',
-                title='Distribución de Calificaciones por Integrante',
-                barmode='stack',
-                color_discrete_map={
-                    '⭐ Excelente': 'green',
-                    '👍 Bueno': 'lightgreen',
-                    '⚠️ Regular': 'orange',
-                    '❌ Deficiente': 'red'
-                }
-            )
+            dist_cal = agrupar_otros(
+                vistas['integrante_calificacion'], 'integrante_id', visibles, 'integrante', etiqueta_otros,
+                ['calificacion', 'calificacion_texto']
+            ).rename(columns={'cantidad': 'count'})
+            fig2 = figura_cacheada('calificaciones_integrantes', dist_cal, construir=lambda: (
+                px.bar(
+                    dist_cal,
+                    x='integrante',
+                    y='count',
+                    color='calificacion_texto',
+                    title='Distribución de Calificaciones por Integrante',
+                    barmode='stack',
+                    color_discrete_map={
+                        '⭐ Excelente': 'green',
+                        '👍 Bueno': 'lightgreen',
+                        '⚠️ Regular': 'orange',
+                        '❌ Deficiente': 'red'
+                    }
+                )
+            ))
             st.plotly_chart(fig2, use_container_width=True)
             
             # Comparación Cualitativos vs Cuantitativos
             st.markdown("---")
             st.subheader("🎭 vs 📊 Comparación por Tipo de KPI")
             
-            df_tipo_int = df_eval.groupby(['integrante', 'kpi_tipo']).agg({
-                'puntuacion_invertida': 'mean'
-            }).reset_index()
-            df_tipo_int['tipo_texto'] = df_tipo_int['kpi_tipo'].apply(
-                lambda x: 'Soft Skills' if x == 'cualitativo' else 'Objetivos'
+            df_tipo_int = agrupar_otros(
+                vistas['integrante_tipo'], 'integrante_id', visibles, 'integrante', etiqueta_otros,
+                ['kpi_tipo', 'tipo_texto']
             )
             
-            fig_comp_int = px.bar(
-                df_tipo_int,
-                x='integrante',
-                y='puntuacion_invertida',
-                color='tipo_texto',
-                title='Puntuación: Soft Skills vs Objetivos por Integrante',
-                barmode='group',
-                labels={'puntuacion_invertida': 'Puntuación', 'integrante': 'Integrante'}
-            )
+            fig_comp_int = figura_cacheada('integrantes_por_tipo', df_tipo_int, construir=lambda: (
+                px.bar(
+                    df_tipo_int,
+                    x='integrante',
+                    y='puntuacion_invertida',
+                    color='tipo_texto',
+                    title='Puntuación: Soft Skills vs Objetivos por Integrante',
+                    barmode='group',
+                    labels={'puntuacion_invertida': 'Puntuación', 'integrante': 'Integrante'}
+                )
+            ))
             st.plotly_chart(fig_comp_int, use_container_width=True)
         
         # ==================== TAB 4: POR KPI ====================
-        with tab4:
+        if seccion == 'kpi':
             st.subheader("📋 Desempeño por KPI")
             
-            promedio_kpi = df_eval.groupby(['kpi_nombre', 'kpi_tipo']).agg({
-                'puntuacion_invertida': 'mean',
-                'calificacion': 'count'
-            }).reset_index()
-            promedio_kpi.columns = ['KPI', 'Tipo', 'Puntuación', 'Evaluaciones']
-            promedio_kpi = promedio_kpi.sort_values('Puntuación', ascending=False)
-            promedio_kpi['Tipo_texto'] = promedio_kpi['Tipo'].apply(
-                lambda x: '🎭 Cualitativo' if x == 'cualitativo' else '📊 Cuantitativo'
-            )
+            promedio_kpi = acotar_ranking(
+                vistas['ranking_kpis'], 'kpi_nombre', etiquetas_otros={'tipo_texto': 'Otros'}
+            ).rename(columns={
+                'kpi_nombre': 'KPI',
+                'kpi_tipo': 'Tipo',
+                'puntuacion_invertida': 'Puntuación',
+                'cantidad': 'Evaluaciones',
+                'tipo_texto': 'Tipo_texto'
+            })
             
-            fig = px.bar(
-                promedio_kpi,
-                x='Puntuación',
-                y='KPI',
-                orientation='h',
-                title='Puntuación por KPI (mayor = mejor)',
-                text='Puntuación',
-                color='Tipo_texto',
-                hover_data=['Evaluaciones']
-            )
-            fig.update_traces(texttemplate='%{text:.2f}', textposition='outside')
-            fig.update_layout(height=max(400, len(promedio_kpi) * 25))
+            fig = figura_cacheada('puntuacion_kpis', promedio_kpi, construir=lambda: (
+                px.bar(
+                    promedio_kpi,
+                    x='Puntuación',
+                    y='KPI',
+                    orientation='h',
+                    title='Puntuación por KPI (mayor = mejor)',
+                    text='Puntuación',
+                    color='Tipo_texto',
+                    hover_data=['Evaluaciones']
+                )
+                .update_traces(texttemplate='%{text:.2f}', textposition='outside')
+                .update_layout(height=_altura_barras(len(promedio_kpi)))
+            ))
             st.plotly_chart(fig, use_container_width=True)
             
             # Matriz de calor
             st.markdown("---")
             st.subheader("📊 Matriz: KPI vs Integrante")
             
-            pivot_data = df_eval.pivot_table(
-                values='puntuacion_invertida',
-                index='kpi_nombre',
-                columns='integrante',
-                aggfunc='mean'
-            ).round(2)
-            
-            fig_heatmap = px.imshow(
-                pivot_data,
-                labels=dict(x="Integrante", y="KPI", color="Puntuación"),
-                title="Mapa de Calor: Puntuación Promedio (mayor = mejor)",
-                color_continuous_scale=['red', 'orange', 'lightgreen', 'green'],
-                aspect='auto'
+            # Vista general por equipo; al elegir un equipo se ve el detalle de sus integrantes
+            matriz_equipos = vistas['matriz_kpi_equipo']
+            equipos_matriz = dict(zip(matriz_equipos['equipo_id'], matriz_equipos['equipo_nombre']))
+            opciones_matriz = ([None] if len(equipos_matriz) > 1 else []) + list(equipos_matriz)
+            zoom_equipo = st.selectbox(
+                "Ver",
+                options=opciones_matriz,
+                format_func=lambda x: "🏢 Todos los equipos" if x is None else f"👥 Integrantes de {equipos_matriz[x]}",
+                key="matriz_zoom_equipo"
             )
-            fig_heatmap.update_xaxes(side="bottom")
+            
+            if zoom_equipo is None:
+                celdas_matriz = matriz_equipos
+            else:
+                matriz_integrantes = vistas['matriz_kpi_integrante']
+                celdas_matriz = matriz_integrantes[matriz_integrantes['equipo_id'] == zoom_equipo]
+            
+            # Con muchos KPIs se muestran de a MATRIZ_MAX_KPIS, en orden alfabético
+            kpis_matriz = sorted(celdas_matriz['kpi_nombre'].unique())
+            if len(kpis_matriz) > MATRIZ_MAX_KPIS:
+                paginas_kpis = [kpis_matriz[i:i + MATRIZ_MAX_KPIS] for i in range(0, len(kpis_matriz), MATRIZ_MAX_KPIS)]
+                pagina_kpis = st.selectbox(
+                    "KPIs",
+                    options=range(len(paginas_kpis)),
+                    format_func=lambda p: f"{paginas_kpis[p][0]} … {paginas_kpis[p][-1]} ({len(paginas_kpis[p])})",
+                    key="matriz_pagina_kpis"
+                )
+                celdas_matriz = celdas_matriz[celdas_matriz['kpi_nombre'].isin(paginas_kpis[pagina_kpis])]
+            
+            if zoom_equipo is None:
+                fig_heatmap = figura_cacheada('matriz_kpi_equipo', celdas_matriz, construir=lambda: figura_matriz(
+                    celdas_matriz, 'equipo_nombre', "Mapa de Calor por Equipo: Puntuación Promedio (mayor = mejor)", "Equipo"
+                ))
+            else:
+                fig_heatmap = figura_cacheada('matriz_kpi_integrante', celdas_matriz, construir=lambda: figura_matriz(
+                    celdas_matriz, 'integrante', f"Mapa de Calor: {equipos_matriz[zoom_equipo]} (mayor = mejor)", "Integrante"
+                ))
             st.plotly_chart(fig_heatmap, use_container_width=True)
             
             # Análisis de KPIs Cuantitativos
-            df_cuantitativo = df_eval[df_eval['kpi_tipo'] == 'cuantitativo']
-            if len(df_cuantitativo) > 0:
+            if len(vistas['cumplimiento_kpis']) > 0:
                 st.markdown("---")
                 st.subheader("📊 Análisis de KPIs Cuantitativos (% de Cumplimiento)")
                 
-                promedio_cumplimiento = df_cuantitativo.groupby('kpi_nombre')['valor_cuantitativo'].mean().reset_index()
-                promedio_cumplimiento.columns = ['KPI', 'Cumplimiento Promedio (%)']
-                promedio_cumplimiento = promedio_cumplimiento.sort_values('Cumplimiento Promedio (%)', ascending=False)
+                promedio_cumplimiento = vistas['cumplimiento_kpis'].rename(columns={
+                    'kpi_nombre': 'KPI',
+                    'valor_promedio': 'Cumplimiento Promedio (%)'
+                })
                 
-                fig_cumpl = px.bar(
-                    promedio_cumplimiento,
-                    x='Cumplimiento Promedio (%)',
-                    y='KPI',
-                    orientation='h',
-                    title='Cumplimiento Promedio de Objetivos (%)',
-                    text='Cumplimiento Promedio (%)',
-                    color='Cumplimiento Promedio (%)',
-                    color_continuous_scale=['red', 'orange', 'lightgreen', 'green']
-                )
-                fig_cumpl.update_traces(texttemplate='%{text:.1f}%', textposition='outside')
+                fig_cumpl = figura_cacheada('cumplimiento_kpis', promedio_cumplimiento, construir=lambda: (
+                    px.bar(
+                        promedio_cumplimiento,
+                        x='Cumplimiento Promedio (%)',
+                        y='KPI',
+                        orientation='h',
+                        title='Cumplimiento Promedio de Objetivos (%)',
+                        text='Cumplimiento Promedio (%)',
+                        color='Cumplimiento Promedio (%)',
+                        color_continuous_scale=['red', 'orange', 'lightgreen', 'green']
+                    )
+                    .update_traces(texttemplate='%{text:.1f}%', textposition='outside')
+                ))
                 st.plotly_chart(fig_cumpl, use_container_width=True)
         
         # ==================== TAB 5: HISTÓRICO ====================
-        with tab5:
+        if seccion == 'historico':
             st.subheader("📅 Tendencia Histórica")
             
-            df_eval['fecha_evaluacion'] = pd.to_datetime(df_eval['fecha_evaluacion'])
+            st.caption(
+                f"Puntos agrupados por {vistas['granularidad_tendencia']}; "
+                f"por equipo e integrante se muestran las {TENDENCIA_MAX_SERIES} series con más evaluaciones"
+            )
             
             # Tendencia general
-            tendencia = df_eval.groupby('fecha_evaluacion')['puntuacion_invertida'].mean().reset_index()
-            
-            fig = px.line(
-                tendencia,
-                x='fecha_evaluacion',
-                y='puntuacion_invertida',
-                title='Tendencia de Puntuación Promedio (mayor = mejor)',
-                markers=True
-            )
-            fig.update_yaxes(range=[0.5, 4.5], title='Puntuación Promedio')
-            fig.update_xaxes(title='Fecha')
+            fig = figura_cacheada('tendencia', vistas['tendencia'], construir=lambda: figura_tendencia(
+                vistas['tendencia'], 'Tendencia de Puntuación Promedio (mayor = mejor)'
+            ))
             st.plotly_chart(fig, use_container_width=True)
             
             # Tendencia por equipo
             st.markdown("---")
             st.subheader("📈 Evolución por Equipo")
             
-            tendencia_equipo = df_eval.groupby(['fecha_evaluacion', 'equipo_nombre'])['puntuacion_invertida'].mean().reset_index()
-            
-            fig_tend_eq = px.line(
-                tendencia_equipo,
-                x='fecha_evaluacion',
-                y='puntuacion_invertida',
-                color='equipo_nombre',
-                title='Evolución de Puntuación por Equipo (mayor = mejor)',
-                markers=True
-            )
-            fig_tend_eq.update_yaxes(range=[0.5, 4.5], title='Puntuación Promedio')
-            fig_tend_eq.update_xaxes(title='Fecha')
+            fig_tend_eq = figura_cacheada('tendencia_equipo', vistas['tendencia_equipo'], construir=lambda: figura_tendencia(
+                vistas['tendencia_equipo'], 'Evolución de Puntuación por Equipo (mayor = mejor)', 'equipo_id', 'equipo_nombre'
+            ))
             st.plotly_chart(fig_tend_eq, use_container_width=True)
             
             # Tendencia por integrante
             st.markdown("---")
             st.subheader("📈 Evolución por Integrante")
             
-            tendencia_int = df_eval.groupby(['fecha_evaluacion', 'integrante'])['puntuacion_invertida'].mean().reset_index()
-            
-            fig_tend_int = px.line(
-                tendencia_int,
-                x='fecha_evaluacion',
-                y='puntuacion_invertida',
-                color='integrante',
-                title='Evolución de Puntuación por Integrante (mayor = mejor)',
-                markers=True
-            )
-            fig_tend_int.update_yaxes(range=[0.5, 4.5], title='Puntuación Promedio')
-            fig_tend_int.update_xaxes(title='Fecha')
+            fig_tend_int = figura_cacheada('tendencia_integrante', vistas['tendencia_integrante'], construir=lambda: figura_tendencia(
+                vistas['tendencia_integrante'], 'Evolución de Puntuación por Integrante (mayor = mejor)', 'integrante_id', 'integrante'
+            ))
             st.plotly_chart(fig_tend_int, use_container_width=True)
             
             # Tendencia Cualitativos vs Cuantitativos
             st.markdown("---")
             st.subheader("🎭 vs 📊 Evolución por Tipo de KPI")
             
-            tendencia_tipo = df_eval.groupby(['fecha_evaluacion', 'kpi_tipo'])['puntuacion_invertida'].mean().reset_index()
-            tendencia_tipo['tipo_texto'] = tendencia_tipo['kpi_tipo'].apply(
-                lambda x: 'Soft Skills' if x == 'cualitativo' else 'Objetivos'
-            )
-            
-            fig_tend_tipo = px.line(
-                tendencia_tipo,
-                x='fecha_evaluacion',
-                y='puntuacion_invertida',
-                color='tipo_texto',
-                title='Evolución: Soft Skills vs Objetivos',
-                markers=True
-            )
-            fig_tend_tipo.update_yaxes(range=[0.5, 4.5], title='Puntuación Promedio')
-            fig_tend_tipo.update_xaxes(title='Fecha')
+            fig_tend_tipo = figura_cacheada('tendencia_tipo', vistas['tendencia_tipo'], construir=lambda: figura_tendencia(
+                vistas['tendencia_tipo'], 'Evolución: Soft Skills vs Objetivos', 'tipo_texto'
+            ))
             st.plotly_chart(fig_tend_tipo, use_container_width=True)
         
         # ==================== TAB 6: ANÁLISIS DE RIESGOS ====================
-        with tab6:
+        if seccion == 'riesgos':
             st.subheader("⚠️ Análisis de Riesgos y Alertas")
             
-            # Alertas por equipo
-            st.markdown("### 🚨 Alertas por Equipo")
-            
-            promedio_equipo_riesgo = df_eval.groupby('equipo_nombre')['puntuacion_invertida'].mean().reset_index()
-            equipos_riesgo = promedio_equipo_riesgo[promedio_equipo_riesgo['puntuacion_invertida'] < 2.5]
-            
-            if len(equipos_riesgo) > 0:
-                st.error(f"⚠️ **{len(equipos_riesgo)} equipo(s) con desempeño bajo**")
-                for _, row in equipos_riesgo.iterrows():
-                    st.warning(f"🏢 **{row['equipo_nombre']}** - Puntuación: {row['puntuacion_invertida']:.2f}")
-            else:
-                st.success("✅ Todos los equipos tienen buen desempeño")
-            
-            st.markdown("---")
-            
-            # Integrantes en riesgo
-            st.markdown("### 🚨 Integrantes que Necesitan Atención")
+            # Alertas precalculadas por el evaluador de reglas en segundo plano
+            st.markdown("### 🚨 Alertas")
+            st.caption(
+                "Las alertas de evaluaciones siguen todos los filtros del reporte. Las de integrantes, "
+                "equipos y KPIs se calculan sobre la ventana de días de cada regla y con todos los tipos "
+                "de KPI: ignoran el rango de fechas y el tipo, y las de KPI tampoco se filtran por equipo."
+            )
             
-            promedio_integrante_riesgo = df_eval.groupby(['integrante', 'equipo_nombre'])['puntuacion_invertida'].mean().reset_index()
-            integrantes_riesgo = promedio_integrante_riesgo[promedio_integrante_riesgo['puntuacion_invertida'] < 2.0]
+            alertas = obtener_alertas(
+                fecha_inicio=fecha_inicio,
+                fecha_fin=fecha_fin,
+                equipo_id=equipo_id_filtro,
+                tipo_kpi=tipo_kpi_filtro
+            )
             
-            if len(integrantes_riesgo) > 0:
-                st.error(f"⚠️ **{len(integrantes_riesgo)} integrante(s) con desempeño bajo**")
+            if len(alertas) > 0:
+                conteo_alertas = alertas['nivel'].value_counts()
+                st.error("⚠️ " + " · ".join(f"{nivel}: **{cantidad}**" for nivel, cantidad in conteo_alertas.items()))
+                
+                col_niveles, col_orden = st.columns(2)
+                with col_niveles:
+                    niveles_alerta = st.multiselect(
+                        "Mostrar",
+                        options=list(conteo_alertas.index),
+                        default=list(conteo_alertas.index),
+                        key="alertas_niveles"
+                    )
+                with col_orden:
+                    orden_alerta = st.selectbox(
+                        "Ordenar por",
+                        options=list(ORDENES_ALERTA.keys()),
+                        format_func=lambda x: ORDENES_ALERTA[x][0],
+                        key="alertas_orden"
+                    )
+                _, columna_orden, ascendente = ORDENES_ALERTA[orden_alerta]
+                alertas_visibles = alertas[alertas['nivel'].isin(niveles_alerta)].sort_values(
+                    columna_orden, ascending=ascendente, kind='stable'
+                )
                 
-                for _, row in integrantes_riesgo.iterrows():
-                    calificacion_original = 5 - row['puntuacion_invertida']
-                    st.warning(f"🔴 **{row['integrante']}** ({row['equipo_nombre']}) - Puntuación: {row['puntuacion_invertida']:.2f}")
+                paginacion_alertas = estado_paginacion(
+                    'pagina_alertas',
+                    (fecha_inicio, fecha_fin, equipo_id_filtro, tipo_kpi_filtro, tuple(niveles_alerta), orden_alerta)
+                )
+                inicio_alertas = paginacion_alertas['inicios'][-1] or 0
+                fin_alertas = inicio_alertas + ALERTAS_POR_PAGINA
+                st.dataframe(
+                    alertas_visibles.iloc[inicio_alertas:fin_alertas],
+                    column_config={
+                        "nivel": "Tipo",
+                        "nombre": "Nombre",
+                        "contexto": "Contexto",
+                        "regla": "Regla",
+                        "condicion": "Condición",
+                        "valor": st.column_config.NumberColumn("Valor", format="%.2f"),
+                        "desvio": st.column_config.NumberColumn("Desvío", format="%.2f"),
+                        "fecha_evaluacion": st.column_config.DateColumn("Fecha", format="YYYY-MM-DD"),
+                        "detectada": st.column_config.DatetimeColumn("Detectada", format="YYYY-MM-DD HH:mm")
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
+                controles_paginacion(
+                    'pagina_alertas',
+                    paginacion_alertas,
+                    fin_alertas if fin_alertas < len(alertas_visibles) else None
+                )
             else:
-                st.success("✅ No hay integrantes en zona de riesgo crítico")
+                st.success("✅ Sin alertas para las reglas activas")
+            
+            with st.expander("⚙️ Reglas de riesgo"):
+                st.caption(
+                    "Las reglas se evalúan en segundo plano sobre las evaluaciones nuevas. Las de integrante, "
+                    "equipo y KPI usan los últimos 'Ventana' días; al cambiar una regla se recalculan sus alertas. "
+                    "Desde aquí se editan la comparación, el umbral, la ventana y si cada regla está activa; "
+                    "las reglas nuevas se agregan con una migración."
+                )
+                reglas = pd.DataFrame(obtener_reglas_riesgo())
+                reglas_editadas = st.data_editor(
+                    reglas,
+                    column_config={
+                        "id": None,
+                        "descripcion": "Regla",
+                        "nivel": "Nivel",
+                        "metrica": "Métrica",
+                        "comparacion": st.column_config.SelectboxColumn("Comparación", options=COMPARACIONES_REGLA, required=True),
+                        "umbral": st.column_config.NumberColumn("Umbral", format="%.2f", required=True),
+                        "ventana_dias": st.column_config.NumberColumn("Ventana (días)", min_value=1, step=1, required=True),
+                        "activa": "Activa"
+                    },
+                    disabled=["nivel", "metrica"],
+                    hide_index=True,
+                    use_container_width=True,
+                    key="editor_reglas_riesgo"
+                )
+                if st.button("💾 Guardar reglas", key="guardar_reglas_riesgo"):
+                    try:
+                        modificadas = guardar_reglas_riesgo(reglas_editadas.to_dict('records'))
+                        if modificadas:
+                            with st.spinner("Evaluando reglas..."):
+                                evaluar_reglas_riesgo()
+                            st.success(f"✅ {len(modificadas)} regla(s) actualizada(s)")
+                        else:
+                            st.info("Sin cambios en las reglas")
+                    except Exception as e:
+                        st.error(f"❌ Error: {str(e)}")
+                    else:
+                        if modificadas:
+                            st.rerun()
             
             st.markdown("---")
             
             # KPIs problemáticos
             st.markdown("### 📉 KPIs con Bajo Rendimiento")
             
-            promedio_kpi_riesgo = df_eval.groupby(['kpi_nombre', 'kpi_tipo'])['puntuacion_invertida'].mean().reset_index()
-            kpis_riesgo = promedio_kpi_riesgo[promedio_kpi_riesgo['puntuacion_invertida'] < 2.5]
+            umbral_kpi = umbral_regla('kpi', 'puntuacion_invertida')
+            ranking_kpis = vistas['ranking_kpis']
+            kpis_riesgo = (
+                ranking_kpis[ranking_kpis['puntuacion_invertida'] < umbral_kpi].iloc[::-1]
+                if umbral_kpi is not None else ranking_kpis.iloc[0:0]
+            ).rename(columns={'tipo_texto': 'Tipo_texto'})
             
             if len(kpis_riesgo) > 0:
-                kpis_riesgo = kpis_riesgo.sort_values('puntuacion_invertida', ascending=True)
-                kpis_riesgo['Tipo_texto'] = kpis_riesgo['kpi_tipo'].apply(
-                    lambda x: '🎭 Cualitativo' if x == 'cualitativo' else '📊 Cuantitativo'
-                )
                 
-                fig_riesgo_kpi = px.bar(
-                    kpis_riesgo,
-                    x='puntuacion_invertida',
-                    y='kpi_nombre',
-                    orientation='h',
-                    title='KPIs que Requieren Atención (menor puntuación = peor)',
-                    text='puntuacion_invertida',
-                    color='Tipo_texto',
-                    hover_data=['Tipo_texto']
-                )
-                fig_riesgo_kpi.update_traces(texttemplate='%{text:.2f}', textposition='outside')
+                fig_riesgo_kpi = figura_cacheada('kpis_riesgo', kpis_riesgo, construir=lambda: (
+                    px.bar(
+                        kpis_riesgo,
+                        x='puntuacion_invertida',
+                        y='kpi_nombre',
+                        orientation='h',
+                        title='KPIs que Requieren Atención (menor puntuación = peor)',
+                        text='puntuacion_invertida',
+                        color='Tipo_texto',
+                        hover_data=['Tipo_texto']
+                    )
+                    .update_traces(texttemplate='%{text:.2f}', textposition='outside')
+                ))
                 st.plotly_chart(fig_riesgo_kpi, use_container_width=True)
             else:
                 st.success("✅ Todos los KPIs tienen buen desempeño")
@@ -1301,17 +3875,17 @@ elif menu == "📈 Reportes y Análisis":
             
             with col1:
                 st.markdown("### 🎭 Riesgos en Soft Skills")
-                df_cualitativo = df_eval[df_eval['kpi_tipo'] == 'cualitativo']
-                if len(df_cualitativo) > 0:
-                    riesgo_cualitativo = df_cualitativo[df_cualitativo['calificacion'] >= 3]
-                    if len(riesgo_cualitativo) > 0:
-                        st.warning(f"⚠️ {len(riesgo_cualitativo)} evaluaciones bajas en soft skills")
-                        
-                        kpis_cual_problema = riesgo_cualitativo.groupby('kpi_nombre').size().reset_index(name='cantidad')
-                        kpis_cual_problema = kpis_cual_problema.sort_values('cantidad', ascending=False).head(5)
+                if 'cualitativo' in resumen_tipo.index:
+                    riesgo_cualitativo = int(resumen_tipo.loc['cualitativo', 'bajas'])
+                    if riesgo_cualitativo > 0:
+                        st.warning(f"⚠️ {riesgo_cualitativo} evaluaciones bajas en soft skills")
                         
-                        for _, row in kpis_cual_problema.iterrows():
-                            st.write(f"- **{row['kpi_nombre']}**: {row['cantidad']} evaluaciones bajas")
+                        st.dataframe(
+                            vistas['kpis_bajas_cualitativo'][['kpi_nombre', 'bajas']],
+                            column_config={"kpi_nombre": "KPI", "bajas": "Evaluaciones bajas"},
+                            hide_index=True,
+                            use_container_width=True
+                        )
                     else:
                         st.success("✅ Sin problemas en soft skills")
                 else:
@@ -1319,18 +3893,20 @@ elif menu == "📈 Reportes y Análisis":
             
             with col2:
                 st.markdown("### 📊 Riesgos en Objetivos")
-                df_cuantitativo = df_eval[df_eval['kpi_tipo'] == 'cuantitativo']
-                if len(df_cuantitativo) > 0:
-                    riesgo_cuantitativo = df_cuantitativo[df_cuantitativo['calificacion'] >= 3]
-                    if len(riesgo_cuantitativo) > 0:
-                        st.warning(f"⚠️ {len(riesgo_cuantitativo)} objetivos no cumplidos")
-                        
-                        kpis_cuant_problema = riesgo_cuantitativo.groupby('kpi_nombre').size().reset_index(name='cantidad')
-                        kpis_cuant_problema = kpis_cuant_problema.sort_values('cantidad', ascending=False).head(5)
+                if 'cuantitativo' in resumen_tipo.index:
+                    riesgo_cuantitativo = int(resumen_tipo.loc['cuantitativo', 'bajas'])
+                    if riesgo_cuantitativo > 0:
+                        st.warning(f"⚠️ {riesgo_cuantitativo} objetivos no cumplidos")
                         
-                        for _, row in kpis_cuant_problema.iterrows():
-                            promedio_cumpl = df_cuantitativo[df_cuantitativo['kpi_nombre']==row['kpi_nombre']]['valor_cuantitativo'].mean()
-                            st.write(f"- **{row['kpi_nombre']}**: {promedio_cumpl:.1f}% cumplimiento promedio")
+                        st.dataframe(
+                            vistas['kpis_bajas_cuantitativo'][['kpi_nombre', 'valor_promedio']],
+                            column_config={
+                                "kpi_nombre": "KPI",
+                                "valor_promedio": st.column_config.NumberColumn("Cumplimiento promedio", format="%.1f%%")
+                            },
+                            hide_index=True,
+                            use_container_width=True
+                        )
                     else:
                         st.success("✅ Todos los objetivos cumplidos")
                 else:
@@ -1341,14 +3917,57 @@ elif menu == "📈 Reportes y Análisis":
             # Análisis detallado de personas en riesgo
             st.markdown("### 🔍 Análisis Detallado de Integrantes en Riesgo")
             
-            promedio_integrante_analisis = df_eval.groupby(['integrante', 'equipo_nombre']).agg({
-                'puntuacion_invertida': 'mean'
-            }).reset_index()
-            peores_3 = promedio_integrante_analisis.sort_values('puntuacion_invertida', ascending=True).head(3)
+            total_peores = len(vistas['peores_integrantes'])
+            cantidad_peores = st.slider(
+                "Integrantes a analizar (peores puntuaciones)",
+                min_value=1,
+                max_value=total_peores,
+                value=min(3, total_peores),
+                key="cantidad_peores"
+            ) if total_peores > 1 else total_peores
+            peores = vistas['peores_integrantes'].head(cantidad_peores)
+            
+            # Solo se traen las evaluaciones individuales de las personas a detallar, indexadas por integrante
+            detalle_riesgo = obtener_detalle_integrantes(
+                fecha_inicio=fecha_inicio,
+                fecha_fin=fecha_fin,
+                equipo_id=equipo_id_filtro,
+                tipo_kpi=tipo_kpi_filtro,
+                integrante_ids=tuple(int(i) for i in peores['integrante_id'])
+            )
+            resumen_peores = peores[['integrante_id', 'integrante', 'equipo_nombre', 'puntuacion_invertida']].join(
+                detalle_riesgo['resumen'], on='integrante_id'
+            )
+            st.dataframe(
+                resumen_peores.drop(columns='integrante_id'),
+                column_config={
+                    "integrante": "Integrante",
+                    "equipo_nombre": "Equipo",
+                    "puntuacion_invertida": st.column_config.NumberColumn("Puntuación", format="%.2f"),
+                    "evaluaciones": "Evaluaciones",
+                    "bajas_cualitativas": "🎭 Soft skills bajas",
+                    "bajas_cuantitativas": "📊 Objetivos no cumplidos",
+                    "ultima_evaluacion": st.column_config.DateColumn("Última evaluación", format="YYYY-MM-DD")
+                },
+                hide_index=True,
+                use_container_width=True
+            )
+            
+            posicion_detalle = st.selectbox(
+                "Ver detalle de",
+                options=list(range(len(peores))),
+                format_func=lambda i: f"{peores.iloc[i]['integrante']} ({peores.iloc[i]['equipo_nombre']}) - Puntuación: {peores.iloc[i]['puntuacion_invertida']:.2f}",
+                key="detalle_riesgo"
+            ) if len(peores) > 0 else None
             
-            for idx, row in peores_3.iterrows():
-                with st.expander(f"📋 {row['integrante']} ({row['equipo_nombre']}) - Puntuación: {row['puntuacion_invertida']:.2f}", expanded=idx==0):
-                    df_integrante = df_eval[df_eval['integrante'] == row['integrante']]
+            if posicion_detalle is not None:
+                row = peores.iloc[posicion_detalle]
+                with st.expander(f"📋 {row['integrante']} ({row['equipo_nombre']}) - Puntuación: {row['puntuacion_invertida']:.2f}", expanded=True):
+                    df_integrante = detalle_integrante(detalle_riesgo, row['integrante_id'])
+                    # Comentarios solo de las evaluaciones bajas que se listan
+                    comentarios_riesgo = obtener_comentarios(
+                        tuple(df_integrante.loc[df_integrante['baja'], 'id'].tolist())
+                    )
                     
                     col1, col2 = st.columns(2)
                     
@@ -1356,12 +3975,14 @@ elif menu == "📈 Reportes y Análisis":
                         st.markdown("**🎭 Soft Skills:**")
                         df_cual = df_integrante[df_integrante['kpi_tipo'] == 'cualitativo']
                         if len(df_cual) > 0:
-                            problemas_cual = df_cual[df_cual['calificacion'] >= 3]
+                            problemas_cual = df_cual[df_cual['baja']]
                             if len(problemas_cual) > 0:
-                                for _, eval_row in problemas_cual.iterrows():
-                                    st.write(f"❌ {eval_row['kpi_nombre']}: {CALIFICACIONES[eval_row['calificacion']]}")
-                                    if eval_row['comentario']:
-                                        st.caption(f"💬 {eval_row['comentario']}")
+                                st.dataframe(
+                                    tabla_problemas(problemas_cual, comentarios_riesgo),
+                                    column_config=COLUMNAS_PROBLEMAS,
+                                    hide_index=True,
+                                    use_container_width=True
+                                )
                             else:
                                 st.success("✅ Soft skills OK")
                         else:
@@ -1371,30 +3992,34 @@ elif menu == "📈 Reportes y Análisis":
                         st.markdown("**📊 Objetivos:**")
                         df_cuant = df_integrante[df_integrante['kpi_tipo'] == 'cuantitativo']
                         if len(df_cuant) > 0:
-                            problemas_cuant = df_cuant[df_cuant['calificacion'] >= 3]
+                            problemas_cuant = df_cuant[df_cuant['baja']]
                             if len(problemas_cuant) > 0:
-                                for _, eval_row in problemas_cuant.iterrows():
-                                    st.write(f"❌ {eval_row['kpi_nombre']}: {eval_row['valor_cuantitativo']:.1f}% - {CALIFICACIONES[eval_row['calificacion']]}")
-                                    if eval_row['comentario']:
-                                        st.caption(f"💬 {eval_row['comentario']}")
+                                st.dataframe(
+                                    tabla_problemas(problemas_cuant, comentarios_riesgo),
+                                    column_config=COLUMNAS_PROBLEMAS,
+                                    hide_index=True,
+                                    use_container_width=True
+                                )
                             else:
                                 st.success("✅ Objetivos OK")
                         else:
                             st.info("Sin evaluaciones")
                     
-                    # Evolución temporal
+                    # Evolución temporal (el detalle ya está ordenado por fecha)
                     st.markdown("**📈 Evolución temporal:**")
-                    df_evo = df_integrante.sort_values('fecha_evaluacion')
+                    df_evo = df_integrante
                     if len(df_evo) > 1:
-                        fig_evo = px.line(
-                            df_evo, 
-                            x='fecha_evaluacion', 
-                            y='puntuacion_invertida',
-                            title=f'Evolución de {row["integrante"]}',
-                            markers=True
-                        )
-                        fig_evo.update_yaxes(range=[0.5, 4.5], title='Puntuación (mayor = mejor)')
-                        fig_evo.update_xaxes(title='Fecha')
+                        fig_evo = figura_cacheada('evolucion_integrante', df_evo, row['integrante'], construir=lambda: (
+                            px.line(
+                                df_evo, 
+                                x='fecha_evaluacion', 
+                                y='puntuacion_invertida',
+                                title=f'Evolución de {row["integrante"]}',
+                                markers=True
+                            )
+                            .update_yaxes(range=[0.5, 4.5], title='Puntuación (mayor = mejor)')
+                            .update_xaxes(title='Fecha')
+                        ))
                         st.plotly_chart(fig_evo, use_container_width=True)
                     else:
                         st.info("Se necesitan más evaluaciones para ver la evolución")
@@ -1407,8 +4032,8 @@ elif menu == "📈 Reportes y Análisis":
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                total_deficiente = len(df_eval[df_eval['calificacion'] == 4])
-                pct_deficiente = (total_deficiente / len(df_eval) * 100) if len(df_eval) > 0 else 0
+                total_deficiente = int(dist_calificacion.get(4, 0))
+                pct_deficiente = (total_deficiente / total_evaluaciones * 100) if total_evaluaciones > 0 else 0
                 st.metric(
                     "❌ Evaluaciones Deficientes",
                     f"{total_deficiente}",
@@ -1417,8 +4042,8 @@ elif menu == "📈 Reportes y Análisis":
                 )
             
             with col2:
-                total_regular = len(df_eval[df_eval['calificacion'] == 3])
-                pct_regular = (total_regular / len(df_eval) * 100) if len(df_eval) > 0 else 0
+                total_regular = int(dist_calificacion.get(3, 0))
+                pct_regular = (total_regular / total_evaluaciones * 100) if total_evaluaciones > 0 else 0
                 st.metric(
                     "⚠️ Evaluaciones Regulares",
                     f"{total_regular}",
@@ -1428,7 +4053,7 @@ elif menu == "📈 Reportes y Análisis":
             
             with col3:
                 riesgo_total = total_deficiente + total_regular
-                pct_riesgo = (riesgo_total / len(df_eval) * 100) if len(df_eval) > 0 else 0
+                pct_riesgo = (riesgo_total / total_evaluaciones * 100) if total_evaluaciones > 0 else 0
                 st.metric(
                     "🚨 Total en Riesgo",
                     f"{riesgo_total}",
@@ -1438,9 +4063,10 @@ elif menu == "📈 Reportes y Análisis":
             
             with col4:
                 # Objetivos no cumplidos (<75%)
-                if len(df_cuantitativo) > 0:
-                    obj_no_cumplidos = len(df_cuantitativo[df_cuantitativo['valor_cuantitativo'] < 75])
-                    pct_obj = (obj_no_cumplidos / len(df_cuantitativo) * 100) if len(df_cuantitativo) > 0 else 0
+                if 'cuantitativo' in resumen_tipo.index:
+                    total_cuantitativo = int(resumen_tipo.loc['cuantitativo', 'cantidad'])
+                    obj_no_cumplidos = int(resumen_tipo.loc['cuantitativo', 'valor_bajo_75'])
+                    pct_obj = (obj_no_cumplidos / total_cuantitativo * 100) if total_cuantitativo > 0 else 0
                     st.metric(
                         "📉 Objetivos <75%",
                         f"{obj_no_cumplidos}",
@@ -1453,7 +4079,24 @@ elif menu == "📈 Reportes y Análisis":
         st.markdown("---")
         st.subheader("📋 Últimas Evaluaciones")
         
-        df_display = df_eval[[
+        paginacion_detalle = estado_paginacion(
+            'pagina_detalle_evaluaciones',
+            (fecha_inicio, fecha_fin, equipo_id_filtro, tipo_kpi_filtro)
+        )
+        df_detalle, siguiente_detalle = obtener_evaluaciones_pagina(
+            fecha_inicio=fecha_inicio,
+            fecha_fin=fecha_fin,
+            equipo_id=equipo_id_filtro,
+            tipo_kpi=tipo_kpi_filtro,
+            antes_de=paginacion_detalle['inicios'][-1]
+        )
+        df_ultimas = df_detalle.assign(
+            comentario=df_detalle['id'].map(obtener_comentarios(tuple(df_detalle['id'].tolist())))
+        )
+        df_ultimas['calificacion_texto'] = etiquetar_categorias(df_ultimas['calificacion'], CALIFICACIONES)
+        df_ultimas['tipo_kpi_texto'] = etiquetar_categorias(df_ultimas['kpi_tipo'], TIPOS_KPI)
+        
+        df_display = df_ultimas[[
             'fecha_evaluacion', 
             'equipo_nombre',
             'integrante', 
@@ -1463,17 +4106,15 @@ elif menu == "📈 Reportes y Análisis":
             'valor_cuantitativo',
             'evaluador', 
             'comentario'
-        ]].head(30)
+        ]].copy()
         
         # Formatear valor cuantitativo
-        df_display['valor_cuantitativo'] = df_display['valor_cuantitativo'].apply(
-            lambda x: f"{x:.1f}%" if pd.notna(x) else "-"
-        )
+        df_display['valor_cuantitativo'] = formatear_numeros(df_display['valor_cuantitativo'], '%.1f%%')
         
         st.dataframe(
             df_display,
             column_config={
-                "fecha_evaluacion": "Fecha",
+                "fecha_evaluacion": st.column_config.DateColumn("Fecha", format="YYYY-MM-DD"),
                 "equipo_nombre": "Equipo",
                 "integrante": "Integrante",
                 "kpi_nombre": "KPI",
@@ -1486,9 +4127,137 @@ elif menu == "📈 Reportes y Análisis":
             hide_index=True,
             use_container_width=True
         )
+        controles_paginacion('pagina_detalle_evaluaciones', paginacion_detalle, siguiente_detalle)
+        
+        # Exportación completa con los mismos filtros del reporte
+        with st.expander("⬇️ Exportar evaluaciones del período", expanded=False):
+            formatos_exportacion = ['csv'] + (['parquet'] if pa is not None else [])
+            formato_exportacion = st.radio(
+                "Formato",
+                options=formatos_exportacion,
+                format_func=str.upper,
+                horizontal=True
+            )
+            st.caption(
+                f"💡 Desde aquí el archivo se arma en memoria (hasta {EXPORTACION_MAX_FILAS_PAGINA:,} evaluaciones). "
+                "Para más filas usar `python app.py exportar`, que escribe en disco con memoria constante"
+            )
+            
+            if total_evaluaciones > EXPORTACION_MAX_FILAS_PAGINA:
+                st.warning(
+                    f"⚠️ El período tiene {total_evaluaciones:,} evaluaciones. Acotar los filtros o exportar con "
+                    f"`python app.py exportar salida.{formato_exportacion} --formato {formato_exportacion}` "
+                    "y las mismas opciones --desde/--hasta/--equipo/--tipo"
+                )
+            elif st.button("📦 Preparar archivo"):
+                try:
+                    with st.spinner("Exportando..."):
+                        archivo_exportacion = io.BytesIO()
+                        if formato_exportacion == 'csv':
+                            destino = io.TextIOWrapper(archivo_exportacion, encoding='utf-8', newline='')
+                            filas_exportadas = exportar_evaluaciones(
+                                destino, 'csv', fecha_inicio, fecha_fin, equipo_id_filtro, tipo_kpi_filtro
+                            )
+                            destino.flush()
+                            destino.detach()
+                        else:
+                            filas_exportadas = exportar_evaluaciones(
+                                archivo_exportacion, 'parquet', fecha_inicio, fecha_fin, equipo_id_filtro, tipo_kpi_filtro
+                            )
+                        archivo_exportacion.seek(0)
+                    
+                    st.download_button(
+                        f"⬇️ Descargar {filas_exportadas} evaluaciones",
+                        data=archivo_exportacion,
+                        file_name=f"evaluaciones_{fecha_inicio}_{fecha_fin}.{formato_exportacion}",
+                        mime="text/csv" if formato_exportacion == 'csv' else "application/octet-stream",
+                        type="primary"
+                    )
+                except Exception as e:
+                    st.error(f"❌ Error al exportar: {str(e)}")
     else:
         st.info("📭 No hay evaluaciones registradas en el período seleccionado")
 
+# ==================== PÁGINA: IMPORTACIÓN MASIVA ====================
+elif menu == "📥 Importación Masiva":
+    st.title("📥 Importación Masiva")
+    st.caption("También disponible por línea de comandos: `python app.py importar <entidad> <archivo>`")
+    
+    nombres_entidad = {
+        'equipos': '🏢 Equipos',
+        'integrantes': '👥 Integrantes',
+        'kpis': '📋 KPIs',
+        'evaluaciones': '📝 Evaluaciones'
+    }
+    entidad = st.selectbox(
+        "Datos a importar",
+        options=list(IMPORTACIONES.keys()),
+        format_func=lambda x: nombres_entidad[x]
+    )
+    config_importacion = IMPORTACIONES[entidad]
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.info(
+            f"📄 **Columnas:** {', '.join(config_importacion['columnas'])}  \n"
+            f"**Obligatorias:** {', '.join(config_importacion['obligatorias'])}"
+        )
+    with col2:
+        st.download_button(
+            "⬇️ Plantilla CSV",
+            data=",".join(config_importacion['columnas']) + "\n",
+            file_name=f"plantilla_{entidad}.csv",
+            mime="text/csv",
+            use_container_width=True
+        )
+    
+    archivo_importacion = st.file_uploader("Archivo CSV o Excel", type=['csv', 'xlsx', 'xls'])
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        validar_solo = st.checkbox("Solo validar (no guardar)")
+    with col2:
+        estricto = st.checkbox("No guardar nada si alguna fila tiene errores", value=True)
+    
+    if archivo_importacion and st.button("📥 Importar", type="primary"):
+        try:
+            with st.spinner("Importando..."):
+                if archivo_importacion.name.lower().endswith(('.xlsx', '.xls')):
+                    resultado = importar_datos(
+                        entidad, archivo_importacion, formato='excel',
+                        validar_solo=validar_solo, estricto=estricto
+                    )
+                else:
+                    resultado = importar_datos(
+                        entidad, io.TextIOWrapper(archivo_importacion, encoding='utf-8-sig', newline=''),
+                        validar_solo=validar_solo, estricto=estricto
+                    )
+            
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Filas leídas", resultado['total'])
+            with col2:
+                st.metric("✅ Insertadas", resultado['insertadas'])
+            with col3:
+                st.metric("❌ Con error", resultado['con_error'])
+            
+            if resultado['errores']:
+                if estricto and not validar_solo:
+                    st.error("❌ No se guardó ninguna fila porque el archivo tiene errores")
+                st.dataframe(
+                    pd.DataFrame(resultado['errores'], columns=['Línea', 'Error']),
+                    hide_index=True,
+                    use_container_width=True
+                )
+                if resultado['con_error'] > len(resultado['errores']):
+                    st.caption(f"Se muestran los primeros {len(resultado['errores'])} errores")
+            elif resultado['insertadas']:
+                st.success(f"✅ {resultado['insertadas']} filas importadas exitosamente!")
+            else:
+                st.success("✅ El archivo es válido")
+        except Exception as e:
+            st.error(f"❌ Error: {str(e)}")
+
 st.sidebar.markdown("---")
 st.sidebar.caption("💡 Sistema de KPIs")
 st.sidebar.caption(f"📅 {datetime.now().strftime('%d/%m/%Y')}")
\ No newline at end of file
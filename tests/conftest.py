@@ -0,0 +1,89 @@
+import os
+import sys
+
+import pytest
+
+# Las pruebas corren contra un Postgres real. Usan una base descartable (se vacían sus tablas antes
+# de cada prueba), indicada en KPI_TEST_DATABASE; el resto de la conexión sale de KPI_DB_HOST,
+# KPI_DB_PORT, KPI_DB_USER y KPI_DB_PASSWORD. Ejemplo:
+#   createdb kpi_test && KPI_TEST_DATABASE=kpi_test python -m pytest -q
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TABLAS = [
+    'alertas', 'snapshots_evaluaciones', 'evaluaciones_mensuales', 'evaluaciones_diarias',
+    'evaluaciones', 'integrantes', 'kpis', 'equipos',
+]
+
+
+@pytest.fixture(scope="session")
+def app():
+    base = os.environ.get("KPI_TEST_DATABASE")
+    if not base:
+        pytest.skip("Definir KPI_TEST_DATABASE (una base descartable) para correr las pruebas contra Postgres")
+    for modulo in ("streamlit", "pandas", "psycopg2", "plotly"):
+        pytest.importorskip(modulo)
+
+    os.environ["KPI_DB_NAME"] = base
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    # Importar app aplica las migraciones (init_db) sobre la base de pruebas
+    import app as modulo
+    return modulo
+
+
+@pytest.fixture
+def db(app):
+    with app.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(f"TRUNCATE {', '.join(TABLAS)} RESTART IDENTITY CASCADE")
+        cur.execute("UPDATE reglas_riesgo SET ultimo_evaluacion_id = 0, evaluada_el = NULL")
+        cur.close()
+    app.invalidar_cache(*TABLAS, 'reglas_riesgo')
+    return app
+
+
+def _insertar(app, query, params):
+    with app.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(query, params)
+        nuevo_id = cur.fetchone()[0]
+        cur.close()
+    return nuevo_id
+
+
+@pytest.fixture
+def datos(db):
+    # Un equipo con dos integrantes, un KPI de cada tipo y un segundo equipo sin evaluaciones
+    equipo = _insertar(db, "INSERT INTO equipos (nombre) VALUES (%s) RETURNING id", ("Plataforma",))
+    otro_equipo = _insertar(db, "INSERT INTO equipos (nombre) VALUES (%s) RETURNING id", ("Ventas",))
+    ana = _insertar(
+        db, "INSERT INTO integrantes (nombre, equipo_id) VALUES (%s, %s) RETURNING id", ("Ana", equipo)
+    )
+    beto = _insertar(
+        db, "INSERT INTO integrantes (nombre, equipo_id) VALUES (%s, %s) RETURNING id", ("Beto", equipo)
+    )
+    comunicacion = _insertar(
+        db, "INSERT INTO kpis (nombre, tipo) VALUES (%s, %s) RETURNING id", ("Comunicación", "cualitativo")
+    )
+    entregas = _insertar(
+        db, "INSERT INTO kpis (nombre, tipo) VALUES (%s, %s) RETURNING id", ("Entregas", "cuantitativo")
+    )
+    db.invalidar_cache('equipos', 'integrantes', 'kpis')
+    return {
+        'equipo': equipo,
+        'otro_equipo': otro_equipo,
+        'ana': ana,
+        'beto': beto,
+        'comunicacion': comunicacion,
+        'entregas': entregas,
+    }
+
+
+@pytest.fixture
+def evaluar(db):
+    # Registra una evaluación por el mismo camino que la página (actualiza los resúmenes)
+    def registrar(integrante_id, fecha, kpi_id, calificacion, valor=None):
+        db.agregar_evaluaciones(integrante_id, fecha, "pruebas", {
+            kpi_id: {'calificacion': calificacion, 'comentario': "", 'valor_cuantitativo': valor}
+        })
+    return registrar
@@ -0,0 +1,90 @@
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture
+def historial(datos, evaluar):
+    # Rango de prueba 2024-01-15..2024-03-10: febrero sale del resumen mensual y los bordes de
+    # enero y marzo del diario; las evaluaciones del 10/01 y 20/03 quedan fuera.
+    evaluar(datos['ana'], date(2024, 1, 10), datos['comunicacion'], 4)
+    evaluar(datos['ana'], date(2024, 1, 20), datos['comunicacion'], 1)
+    evaluar(datos['ana'], date(2024, 2, 15), datos['entregas'], 2, valor=80)
+    evaluar(datos['beto'], date(2024, 2, 1), datos['comunicacion'], 4)
+    evaluar(datos['beto'], date(2024, 3, 5), datos['entregas'], 3, valor=60)
+    evaluar(datos['beto'], date(2024, 3, 20), datos['comunicacion'], 1)
+    return datos
+
+
+def test_agregados_reporte_combina_resumen_mensual_y_diario(db, historial):
+    agregados = db.obtener_agregados_reporte(fecha_inicio=date(2024, 1, 15), fecha_fin=date(2024, 3, 10))
+
+    assert set(agregados) == set(db.CONJUNTOS_AGREGACION)
+    total = agregados['total'].iloc[0]
+    assert total['cantidad'] == 4
+    assert total['puntuacion_invertida'] == pytest.approx(2.5)
+    assert total['bajas'] == 2
+
+    integrantes = agregados['integrante'].set_index('integrante')['puntuacion_invertida']
+    assert integrantes['Ana'] == pytest.approx(3.5)
+    assert integrantes['Beto'] == pytest.approx(1.5)
+
+    cuantitativo = agregados['tipo'].set_index('kpi_tipo').loc['cuantitativo']
+    assert cuantitativo['valor_promedio'] == pytest.approx(70)
+    assert cuantitativo['valor_bajo_75'] == 1
+
+    assert len(agregados['kpi_integrante']) == 4
+    assert sorted(agregados['fecha']['fecha_evaluacion']) == [
+        date(2024, 1, 20), date(2024, 2, 1), date(2024, 2, 15), date(2024, 3, 5)
+    ]
+
+
+def test_agregados_reporte_filtra_por_equipo_y_tipo(db, historial):
+    sin_datos = db.obtener_agregados_reporte(equipo_id=historial['otro_equipo'])
+    assert sin_datos['total']['cantidad'].sum() == 0
+
+    cualitativos = db.obtener_agregados_reporte(equipo_id=historial['equipo'], tipo_kpi='cualitativo')
+    assert cualitativos['total'].iloc[0]['cantidad'] == 4
+    assert set(cualitativos['kpi']['kpi_nombre']) == {'Comunicación'}
+
+
+def test_vistas_reporte_se_calculan_sobre_los_agregados(db, historial):
+    vistas = db.obtener_vistas_reporte(fecha_inicio=date(2024, 1, 1), fecha_fin=date(2024, 12, 31))
+
+    assert list(vistas['ranking_integrantes']['integrante']) == ['Ana', 'Beto']
+    assert vistas['tendencia']['cantidad'].sum() == 6
+
+
+def test_motor_duckdb_devuelve_lo_mismo_que_postgres(db, historial, monkeypatch):
+    pytest.importorskip("duckdb")
+    filtros = dict(fecha_inicio=date(2024, 1, 15), fecha_fin=date(2024, 3, 10))
+    postgres = db._agregados_postgres(**filtros)
+    monkeypatch.setattr(db, 'MOTOR_ANALITICO', 'duckdb')
+    assert db.motor_analitico() == 'duckdb'
+    duck = db._agregados_duckdb(**filtros)
+
+    for nombre in ('total', 'integrante', 'kpi_integrante', 'fecha'):
+        esperado = postgres[postgres['conjunto'] == nombre]
+        obtenido = duck[duck['conjunto'] == nombre]
+        assert obtenido['cantidad'].sum() == esperado['cantidad'].sum()
+        assert obtenido['suma_puntuacion'].sum() == esperado['suma_puntuacion'].sum()
+        assert len(obtenido) == len(esperado)
+
+
+def test_tendencia_no_mezcla_integrantes_con_el_mismo_nombre(db, datos, evaluar):
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO integrantes (nombre, equipo_id) VALUES ('Ana', %s) RETURNING id", (datos['otro_equipo'],)
+        )
+        otra_ana = cur.fetchone()[0]
+        cur.close()
+    db.invalidar_cache('integrantes')
+    evaluar(datos['ana'], date(2024, 2, 1), datos['comunicacion'], 1)
+    evaluar(otra_ana, date(2024, 2, 1), datos['comunicacion'], 4)
+
+    tendencia = db.obtener_vistas_reporte()['tendencia_integrante']
+    por_integrante = tendencia.set_index('integrante_id')['puntuacion_invertida']
+    assert por_integrante[datos['ana']] == pytest.approx(4)
+    assert por_integrante[otra_ana] == pytest.approx(1)
+    assert set(tendencia['integrante']) == {'Ana'}
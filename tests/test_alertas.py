@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+
+
+def _alertas(app):
+    with app.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT r.descripcion, a.entidad_id, a.evaluacion_id, a.detectada
+            FROM alertas a JOIN reglas_riesgo r ON r.id = a.regla_id
+            ORDER BY r.id, a.entidad_id
+        """)
+        filas = cur.fetchall()
+        cur.close()
+    return filas
+
+
+def _reglas(app):
+    return {r['descripcion']: r for r in app.obtener_reglas_riesgo()}
+
+
+@pytest.fixture
+def evaluacion_baja(datos, evaluar):
+    # Calificación 4 y 60% del objetivo: cumple las dos reglas por evaluación y deja a Ana, a su
+    # equipo y al KPI Entregas con puntuación invertida 1
+    evaluar(datos['ana'], date.today(), datos['entregas'], 4, valor=60)
+    return datos
+
+
+def test_evaluar_reglas_genera_alertas_por_evaluacion_y_agregadas(db, evaluacion_baja):
+    assert sum(db.evaluar_reglas_riesgo().values()) == 5
+
+    entidades = {descripcion: entidad for descripcion, entidad, _, _ in _alertas(db)}
+    assert entidades == {
+        'Equipo con puntuación baja': evaluacion_baja['equipo'],
+        'Integrante con puntuación baja': evaluacion_baja['ana'],
+        'KPI con puntuación baja': evaluacion_baja['entregas'],
+        'Evaluación con calificación baja': evaluacion_baja['ana'],
+        'Objetivo no cumplido': evaluacion_baja['ana'],
+    }
+    # Sin evaluaciones nuevas en el mismo día no hay nada que reevaluar
+    assert db.evaluar_reglas_riesgo() == {}
+
+
+def test_pasada_completa_no_cuenta_alertas_existentes(db, evaluacion_baja, capsys):
+    db.evaluar_reglas_riesgo()
+    antes = _alertas(db)
+
+    assert db.main_cli(["evaluar-alertas", "--completo"]) == 0
+    assert "✅ 0 alerta(s) nueva(s)" in capsys.readouterr().out
+    # Las alertas vigentes se actualizan en su lugar: conservan la fecha de detección
+    assert _alertas(db) == antes
+
+
+def test_alertas_agregadas_se_resuelven_con_evaluaciones_nuevas(db, evaluacion_baja, evaluar):
+    db.evaluar_reglas_riesgo()
+    evaluar(evaluacion_baja['ana'], date.today(), evaluacion_baja['comunicacion'], 1)
+
+    # Ana y su equipo suben a 2.5; Entregas sigue en 1
+    assert sum(db.evaluar_reglas_riesgo().values()) == 0
+    assert {descripcion for descripcion, _, _, _ in _alertas(db)} == {
+        'KPI con puntuación baja', 'Evaluación con calificación baja', 'Objetivo no cumplido'
+    }
+
+
+def test_la_ventana_se_desliza_sin_evaluaciones_nuevas(db, evaluacion_baja):
+    db.evaluar_reglas_riesgo()
+    # Simula que pasó un día y la evaluación quedó justo fuera de la ventana de 90 días
+    with db.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE evaluaciones_diarias SET fecha_evaluacion = CURRENT_DATE - 90")
+        cur.execute("UPDATE reglas_riesgo SET evaluada_el = CURRENT_DATE - 1")
+        cur.close()
+
+    db.evaluar_reglas_riesgo()
+    assert {descripcion for descripcion, _, _, _ in _alertas(db)} == {
+        'Evaluación con calificación baja', 'Objetivo no cumplido'
+    }
+
+
+def test_modificar_una_regla_la_reevalua_desde_cero(db, evaluacion_baja):
+    db.evaluar_reglas_riesgo()
+    regla = dict(_reglas(db)['Objetivo no cumplido'])
+    try:
+        assert db.guardar_reglas_riesgo([dict(regla, umbral=50)]) == [regla['id']]
+        assert 'Objetivo no cumplido' not in {descripcion for descripcion, _, _, _ in _alertas(db)}
+
+        db.evaluar_reglas_riesgo()
+        assert 'Objetivo no cumplido' not in {descripcion for descripcion, _, _, _ in _alertas(db)}
+    finally:
+        db.guardar_reglas_riesgo([regla])
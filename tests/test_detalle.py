@@ -0,0 +1,41 @@
+from datetime import date
+
+
+def _accesos_evaluaciones(app, query, params):
+    with app.get_connection() as conn:
+        cur = conn.cursor()
+        # Con tablas chicas el planificador prefiere Seq Scan; se desactiva para ver si el índice es usable
+        cur.execute("SET LOCAL enable_seqscan = off")
+        cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        plan = cur.fetchone()[0][0]['Plan']
+        cur.close()
+    return [
+        (nodo['Node Type'], app._indice_de_acceso(nodo))
+        for nodo in app._nodos_plan(plan)
+        if nodo.get('Relation Name') == 'evaluaciones'
+    ]
+
+
+def test_detalle_por_integrante_usa_el_indice_aunque_lleguen_floats(db, datos, evaluar):
+    evaluar(datos['ana'], date(2024, 2, 1), datos['comunicacion'], 3)
+    ids_de_pandas = [float(datos['ana']), float(datos['beto'])]
+
+    query, params = db._consulta_evaluaciones(integrante_ids=ids_de_pandas)
+    accesos = _accesos_evaluaciones(db, query, params)
+
+    assert accesos
+    assert all(tipo != 'Seq Scan' for tipo, _ in accesos)
+    # También con Bitmap Heap Scan se informa el índice (está en el nodo hijo)
+    assert all(indice for _, indice in accesos)
+
+
+def test_ids_de_los_agregados_son_enteros(db, datos, evaluar):
+    evaluar(datos['ana'], date(2024, 2, 1), datos['comunicacion'], 3)
+    agregados = db.obtener_agregados_reporte()
+
+    assert agregados['integrante']['integrante_id'].dtype == 'int64'
+    assert agregados['kpi_integrante']['kpi_id'].dtype == 'int64'
+    detalle = db.obtener_detalle_integrantes(
+        integrante_ids=tuple(int(i) for i in agregados['integrante']['integrante_id'])
+    )
+    assert len(db.detalle_integrante(detalle, datos['ana'])) == 1
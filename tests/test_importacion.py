@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+
+CSV_EQUIPOS = (
+    'nombre,descripcion\n'
+    'Alpha,"primera línea\n'
+    'segunda línea"\n'
+    ',sin nombre\n'
+    'Beta,ok\n'
+)
+
+
+def _equipos(app):
+    with app.get_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT nombre, descripcion FROM equipos ORDER BY id")
+        filas = cur.fetchall()
+        cur.close()
+    return filas
+
+
+def test_importacion_estricta_por_defecto_no_guarda_nada(db):
+    resultado = db.importar_datos('equipos', io.StringIO(CSV_EQUIPOS))
+
+    assert resultado['total'] == 3
+    assert resultado['con_error'] == 1
+    assert resultado['insertadas'] == 0
+    # El campo entre comillas ocupa las líneas 2 y 3: la fila con error es la línea 4
+    assert resultado['errores'] == [(4, "nombre es obligatorio")]
+    assert _equipos(db) == []
+
+
+def test_importacion_parcial_guarda_las_filas_validas(db):
+    resultado = db.importar_datos('equipos', io.StringIO(CSV_EQUIPOS), estricto=False)
+
+    assert resultado['insertadas'] == 2
+    assert _equipos(db) == [("Alpha", "primera línea\nsegunda línea"), ("Beta", "ok")]
+
+
+def test_filas_con_campos_de_mas_o_de_menos_se_informan_por_linea(db):
+    csv_irregular = io.StringIO(
+        'nombre,descripcion\n'
+        'Alpha,ok\n'
+        'Beta,ok,de más\n'
+        'Gamma\n'
+        'Delta,ok\n'
+    )
+    resultado = db.importar_datos('equipos', csv_irregular, estricto=False)
+
+    assert resultado['total'] == 4
+    assert resultado['errores'] == [
+        (3, "La fila tiene 3 campos y el encabezado 2"),
+        (4, "La fila tiene 1 campos y el encabezado 2"),
+    ]
+    assert [nombre for nombre, _ in _equipos(db)] == ["Alpha", "Delta"]
+
+
+def test_importacion_de_evaluaciones_actualiza_los_resumenes(db, datos):
+    csv_evaluaciones = io.StringIO(
+        'integrante,equipo,kpi,calificacion,valor_cuantitativo,fecha_evaluacion,evaluador\n'
+        'Ana,Plataforma,Entregas,2,80,2024-02-15,pruebas\n'
+        'Ana,Plataforma,Entregas,5,80,2024-02-16,pruebas\n'
+        'Nadie,Plataforma,Entregas,1,95,2024-02-17,pruebas\n'
+    )
+    resultado = db.importar_datos('evaluaciones', csv_evaluaciones, estricto=False)
+
+    assert resultado['insertadas'] == 1
+    assert [linea for linea, _ in resultado['errores']] == [3, 4]
+    total = db.obtener_agregados_reporte()['total'].iloc[0]
+    assert total['cantidad'] == 1
+    assert total['valor_promedio'] == pytest.approx(80)
+
+
+def test_cli_importar_usa_el_mismo_modo_estricto(db, tmp_path):
+    archivo = tmp_path / "equipos.csv"
+    archivo.write_text(CSV_EQUIPOS, encoding="utf-8")
+
+    assert db.main_cli(["importar", "equipos", str(archivo)]) == 1
+    assert _equipos(db) == []
+
+    assert db.main_cli(["importar", "equipos", str(archivo), "--parcial"]) == 1
+    assert [nombre for nombre, _ in _equipos(db)] == ["Alpha", "Beta"]